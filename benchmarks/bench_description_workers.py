@@ -0,0 +1,50 @@
+# Measures how description fetching throughput scales with the number of browser workers.
+# python benchmarks/bench_description_workers.py --jobs 40 --workers 1 2 4 --browser firefox
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_tools import DatabaseTools  # noqa: E402
+from description_workers import DescriptionWorkerPool  # noqa: E402
+from fixture_server import start_fixture_server  # noqa: E402
+from rate_control import shared_rate_controller  # noqa: E402
+
+BENCHMARK_DB = 'benchmark.db'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the description worker pool against local fixtures.')
+    parser.add_argument('--jobs', type=int, default=40, help='Number of job pages to fetch per run.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Worker counts to try.')
+    parser.add_argument('--browser', type=str, default='firefox', help='Browser to run the workers with.')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    # The workers' rate control decisions go to the benchmark database too
+    shared_rate_controller(db_name=BENCHMARK_DB)
+    server, base_url = start_fixture_server()
+    postings = [(f'job_{n}', f'{base_url}/job_detail.html?jk={n}') for n in range(args.jobs)]
+    results = []
+    try:
+        for workers in args.workers:
+            pool = DescriptionWorkerPool(
+                workers=workers,
+                browser=args.browser,
+                database_factory=lambda: DatabaseTools(db_name=BENCHMARK_DB)
+            )
+            stats = pool.run(postings)
+            results.append((workers, stats['fetched'] / stats['seconds']))
+    finally:
+        server.shutdown()
+        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), BENCHMARK_DB)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    print('workers  jobs/sec')
+    for workers, rate in results:
+        print(f'{workers:>7}  {rate:8.2f}')
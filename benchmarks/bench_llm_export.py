@@ -0,0 +1,102 @@
+# Compares remove_links_from_markdown with the LLM export normalization: throughput, and tokens left per document.
+# python benchmarks/bench_llm_export.py --documents 2000 --processes 1 4
+# python benchmarks/bench_llm_export.py --db indeed.db  # real descriptions instead of the fixture pages
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import indeed_parsers  # noqa: E402
+import llm_export  # noqa: E402
+import markdown_pipeline  # noqa: E402
+from fixture_server import FIXTURES_PATH  # noqa: E402
+
+DETAIL_PAGES = ['job_detail.html', 'job_detail_external.html']
+
+
+def fixture_descriptions():
+    descriptions = []
+    for name in DETAIL_PAGES:
+        with open(os.path.join(FIXTURES_PATH, name), 'r', encoding='utf-8') as f:
+            page = f.read()
+        descriptions.append(markdown_pipeline.html_to_markdown(indeed_parsers.extract_job_component(page) or page))
+    return descriptions
+
+
+def database_descriptions(db_name, limit):
+    from database_tools import DatabaseTools
+    db = DatabaseTools(setup=False, db_name=db_name)
+    return [description for (description,) in db.iter_query('''
+        SELECT job_description FROM job_postings_full
+        WHERE description_status = 'done' AND duplicate_of IS NULL
+        ORDER BY id DESC LIMIT ?
+    ''', (limit,))]
+
+
+def boilerplate_of(descriptions, min_documents):
+    """What LlmExporter.boilerplate would return after counting these descriptions."""
+    counts = Counter(key for keys in llm_export.line_keys_batch([(0, None, None, None, None, d) for d in set(descriptions)])
+                     for key in keys)
+    return frozenset(key for key, n in counts.items() if n >= min_documents)
+
+
+def bench(function, descriptions):
+    """Returns (docs/sec, MB/sec, outputs) of function over descriptions."""
+    started = time.perf_counter()
+    outputs = [function(description) for description in descriptions]
+    elapsed = time.perf_counter() - started
+    n_bytes = sum(len(description.encode('utf-8')) for description in descriptions)
+    return len(descriptions) / elapsed, n_bytes / 1024 ** 2 / elapsed, outputs
+
+
+def bench_parallel(descriptions, boilerplate, processes, batch_size):
+    """normalize_batch over a process pool, token counting included. Returns (docs/sec, MB/sec, tokens)."""
+    rows = [(i, None, None, None, None, description) for i, description in enumerate(descriptions)]
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+    started = time.perf_counter()
+    tokens = 0
+    for _, records in llm_export.map_in_order(llm_export.normalize_batch, batches, processes, boilerplate):
+        tokens += sum(record['tokens'] for _, record in records)
+    elapsed = time.perf_counter() - started
+    n_bytes = sum(len(description.encode('utf-8')) for description in descriptions)
+    return len(descriptions) / elapsed, n_bytes / 1024 ** 2 / elapsed, tokens
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the LLM export normalization.')
+    parser.add_argument('--documents', type=int, default=2000, help='Number of descriptions to run over.')
+    parser.add_argument('--db', type=str, default=None, help='Read descriptions from this database (next to the code) instead of the fixtures.')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4], help='Process counts to try for the export pipeline.')
+    parser.add_argument('--batch_size', type=int, default=200, help='Descriptions per worker batch.')
+    parser.add_argument('--boilerplate_documents', type=int, default=5, help='Lines shared by this many descriptions are boilerplate.')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.db:
+        descriptions = database_descriptions(args.db, args.documents)
+    else:
+        # The fixture pages over and over. They share no boilerplate, so only the cleaning shows up in the tokens.
+        pages = fixture_descriptions()
+        descriptions = [pages[i % len(pages)] for i in range(args.documents)]
+    boilerplate = boilerplate_of(descriptions, args.boilerplate_documents)
+    raw_tokens = sum(map(llm_export.count_tokens, descriptions))
+    print(f'{len(descriptions)} descriptions, {raw_tokens} tokens, {len(boilerplate)} boilerplate lines')
+
+    print(f'{"function":<32}{"docs/sec":>12}{"MB/sec":>10}{"tokens":>12}{"reduction":>11}')
+    functions = {
+        'remove_links_from_markdown': markdown_pipeline.remove_links_from_markdown,
+        'normalize_description': lambda description: llm_export.normalize_description(description, boilerplate),
+    }
+    for name, function in functions.items():
+        docs_per_sec, mb_per_sec, outputs = bench(function, descriptions)
+        tokens = sum(map(llm_export.count_tokens, outputs))
+        print(f'{name:<32}{docs_per_sec:>12.0f}{mb_per_sec:>10.1f}{tokens:>12}{1 - tokens / raw_tokens:>11.1%}')
+    for processes in args.processes:
+        docs_per_sec, mb_per_sec, tokens = bench_parallel(descriptions, boilerplate, processes, args.batch_size)
+        name = f'export pipeline, {processes} processes'
+        print(f'{name:<32}{docs_per_sec:>12.0f}{mb_per_sec:>10.1f}{tokens:>12}{1 - tokens / raw_tokens:>11.1%}')
@@ -0,0 +1,71 @@
+# Measures the offline parsers over the saved pages in fixtures/, for each available BeautifulSoup backend.
+# python benchmarks/bench_parsers.py --seconds 2
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import indeed_parsers  # noqa: E402
+from fixture_server import FIXTURES_PATH  # noqa: E402
+
+SEARCH_PAGES = ['search_results.html']
+DETAIL_PAGES = ['job_detail.html', 'job_detail_external.html', 'job_detail_verification.html', 'job_detail_javascript.html']
+
+
+def records(result):
+    """Number of records a parser produced from one page."""
+    if isinstance(result, list):
+        return len(result)
+    return 0 if result is None else 1
+
+
+PARSERS = {
+    'parse_job_cards': (indeed_parsers.parse_job_cards, SEARCH_PAGES),
+    # No BeautifulSoup, the backend argument is ignored
+    'parse_mosaic_job_cards': (lambda html, parser: indeed_parsers.parse_mosaic_job_cards(html), SEARCH_PAGES),
+    'parse_filter_items': (indeed_parsers.parse_filter_items, SEARCH_PAGES),
+    'parse_job_detail': (indeed_parsers.parse_job_detail, DETAIL_PAGES),
+    'extract_job_component': (indeed_parsers.extract_job_component, DETAIL_PAGES),
+}
+
+
+def load_pages(names):
+    pages = []
+    for name in names:
+        with open(os.path.join(FIXTURES_PATH, name), 'r', encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+
+def bench(function, pages, backend, seconds):
+    """Runs function over the pages for about `seconds`. Returns (pages/sec, records/sec)."""
+    n_pages = 0
+    n_records = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        for html in pages:
+            n_records += records(function(html, parser=backend))
+            n_pages += 1
+    elapsed = time.perf_counter() - started
+    return n_pages / elapsed, n_records / elapsed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the offline Indeed parsers.')
+    parser.add_argument('--seconds', type=float, default=2, help='Time to spend on each parser and backend.')
+    parser.add_argument('--backends', type=str, nargs='+', default=['html.parser', 'lxml'], help='BeautifulSoup backends to compare.')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    backends = [b for b in args.backends if b == 'html.parser' or importlib.util.find_spec(b) is not None]
+    print(f'{"parser":<24}{"backend":<14}{"pages/sec":>12}{"records/sec":>14}')
+    for name, (function, page_names) in PARSERS.items():
+        pages = load_pages(page_names)
+        for backend in backends:
+            pages_per_sec, records_per_sec = bench(function, pages, backend, args.seconds)
+            print(f'{name:<24}{backend:<14}{pages_per_sec:>12.1f}{records_per_sec:>14.1f}')
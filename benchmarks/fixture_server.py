@@ -0,0 +1,29 @@
+# Serves the saved pages in fixtures/ over HTTP so the scrapers can be exercised without touching Indeed.
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server(port: int = 0):
+    """Starts the fixture server on a background thread. Returns (server, base_url); call server.shutdown() when done."""
+    handler = functools.partial(QuietHandler, directory=FIXTURES_PATH)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    server, base_url = start_fixture_server(8000)
+    print(f'Serving {FIXTURES_PATH} at {base_url}. Press Ctrl+C to stop.')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
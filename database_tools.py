@@ -1,26 +1,143 @@
+import atexit
 import os
+import queue
+import re
 import sqlite3
+from contextlib import contextmanager
 import pandas as pd
 
 import logging
-logging.basicConfig(filename=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.log'), level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+from logging.handlers import QueueHandler, QueueListener
+
+from description_store import DescriptionStore
+from metrics import LatencyHistogram
+
+LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.log')
+
+
+def setup_logging(level=None):
+    """Sends log records through a queue to a background thread that writes database.log.
+
+    Logging calls only enqueue the record, so the scraper threads never wait on the file. The level defaults
+    to INFO, set INDEED_LOG_LEVEL=DEBUG to also log every markdown body.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    root.setLevel(level or os.environ.get('INDEED_LOG_LEVEL', 'INFO').upper())
+    file_handler = logging.FileHandler(LOG_PATH)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    # Flushes whatever is still queued when the program exits
+    atexit.register(listener.stop)
+
+
+setup_logging()
+
+
+# Pages that came back as a bot check or a "please enable JavaScript" shell rather than a job description.
+PLACEHOLDER_DESCRIPTION = re.compile(r'^Verify.* you are human$|nable JavaScript', re.IGNORECASE | re.DOTALL)
+
+
+def description_status(description):
+    """Returns 'done' for a usable description, or 'pending' if it still needs to be fetched."""
+    if not description or PLACEHOLDER_DESCRIPTION.search(description):
+        return 'pending'
+    return 'done'
+
+
+def posting_key(job_title, employer, job_location):
+    """Normalized title|employer|location of a job card, the same for reposts of a role. None without title and employer."""
+    if not job_title or not employer:
+        return None
+    return '|'.join(' '.join(re.sub(r'[^\w\s]', ' ', value or '').lower().split())
+                    for value in (job_title, employer, job_location))
+
+
+# Card fields saved to job_card_data, when the search captured any of them
+CARD_DATA_COLUMNS = ['salary_text', 'salary_min', 'salary_max', 'salary_period', 'employment_type', 'snippet',
+                     'company_rating', 'remote', 'posted_at']
 
 
 class DatabaseTools:
-    def __init__(self):
-        self.db_name = 'indeed.db'
+    # Applied to every new connection. WAL lets readers run alongside the writer, and
+    # synchronous=NORMAL only fsyncs at checkpoints, which is safe in WAL mode.
+    PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 268435456,  # 256 MB
+        'cache_size': -65536,  # negative means KiB, so 64 MB
+        'temp_store': 'MEMORY',
+    }
+    # Migrations that need a newer SQLite than Python may ship with: ALTER TABLE ... DROP COLUMN is 3.35+
+    MIN_SQLITE_VERSIONS = {
+        12: (3, 35, 0),
+        18: (3, 35, 0),
+    }
+
+    def __init__(self, setup: bool = True, db_name: str = 'indeed.db'):
+        self.db_name = db_name
         self.current_directory = os.path.dirname(os.path.abspath(__file__))
         self.database_path = os.path.join(self.current_directory, self.db_name)
         self.ddl_path = os.path.join(self.current_directory, 'ddl.sql')
+        self.migrations_path = os.path.join(self.current_directory, 'migrations')
         self.ddl = None
-        self.setup()
+        # One long-lived connection per instance, opened lazily by connect().
+        self.conn = None
+        self.cursor = None
+        # How long each kind of write takes, see transaction()
+        self.latency = LatencyHistogram()
+        # Compressed descriptions, see description_store.py
+        self.descriptions = DescriptionStore(self)
+        if setup:
+            self.setup()
         logging.log(logging.INFO, '-'*50)
         logging.log(logging.INFO, f'DatabaseTools initialized with database: {self.database_path}')
-        
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def connect(self):
-        self.conn = sqlite3.connect(self.database_path)
-        self.cursor = self.conn.cursor()
-    
+        """Opens the shared connection the first time it is needed and reuses it afterwards."""
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.database_path, timeout=30)
+            self.cursor = self.conn.cursor()
+            for pragma, value in self.PRAGMAS.items():
+                self.cursor.execute(f'PRAGMA {pragma} = {value}')
+            # The migrations, the search index sync and the job_postings_full view call these
+            self.descriptions.register(self.conn)
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            self.cursor = None
+
+    @contextmanager
+    def transaction(self, immediate: bool = False, stage: str = 'db_write'):
+        """Runs the enclosed statements in a single transaction, rolling back on error.
+
+        immediate=True takes the write lock up front, so a read-then-write can't race another process.
+        The time from start to commit is recorded under stage in self.latency.
+        """
+        self.connect()
+        with self.latency.time(stage):
+            if immediate:
+                self.cursor.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.cursor
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
     def setup(self, force_update=True):
         def create_new():
             logging.info(f'Reading DDL file: {self.ddl_path}')
@@ -34,10 +151,13 @@ class DatabaseTools:
             logging.info(f'Setting up database: {self.database_path}')
             try:
                 self.connect()
-                self.cursor.executescript(self.ddl) 
-                self.conn.commit()
+                if self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'job_postings'").fetchone() is None:
+                    # ddl.sql is the latest schema, a new database starts there instead of replaying the migrations
+                    latest_version = max([version for version, _ in self.migrations()], default=0)
+                    self.cursor.executescript(f'BEGIN;\n{self.ddl}\nPRAGMA user_version = {latest_version};\nCOMMIT;')
+                self.migrate()
             except sqlite3.Error as e:
-                logging.ERROR(f'Error setting up database: {e}')
+                logging.error(f'Error setting up database: {e}')
                 exit()
         # First check if the database already exists.
         if force_update:
@@ -49,12 +169,40 @@ class DatabaseTools:
             create_new()
             logging.info(f'Database created: {self.database_path}')
     
+    def migrations(self):
+        """The numbered scripts in migrations/, as sorted (version, file_name) pairs."""
+        return sorted((int(file_name.split('_')[0]), file_name)
+                      for file_name in os.listdir(self.migrations_path) if file_name.endswith('.sql'))
+
+    def migrate(self):
+        """Applies the numbered scripts in migrations/ that are newer than the database's user_version."""
+        self.connect()
+        current_version = self.cursor.execute('PRAGMA user_version').fetchone()[0]
+        for version, file_name in self.migrations():
+            if version <= current_version:
+                continue
+            required = self.MIN_SQLITE_VERSIONS.get(version)
+            if required is not None and sqlite3.sqlite_version_info < required:
+                raise RuntimeError(f"Migration {file_name} needs SQLite {'.'.join(map(str, required))} or newer, this "
+                                   f"Python uses SQLite {sqlite3.sqlite_version}. Upgrade Python (or its sqlite3 library) "
+                                   f"and run again, the database is left at version {current_version}.")
+            logging.info(f'Applying migration {file_name}')
+            with open(os.path.join(self.migrations_path, file_name), 'r') as f:
+                script = f.read()
+            try:
+                # user_version is part of the database header, so it is bumped in the same transaction
+                self.cursor.executescript(f'BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;')
+            except sqlite3.Error:
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                raise
+            current_version = version
+
     def run_sql(self, sql): 
         self.connect()
         self.cursor.execute(sql)
         tables = self.cursor.fetchall()
         self.conn.commit()
-        self.conn.close()
         return tables
               
     def list_tables(self):
@@ -62,22 +210,62 @@ class DatabaseTools:
         self.connect()
         self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
         tables = self.cursor.fetchall()
-        self.conn.close()
         try:
             return [x[0] for x in tables]
         except IndexError:
             raise Exception('No tables found in database.')
         
-    def sql_to_df(self, sql):
+    def sql_to_df(self, sql, params=(), chunksize=None):
+        """Runs sql and returns a DataFrame. With chunksize, returns a generator of DataFrames of up to chunksize rows."""
+        if chunksize is not None:
+            return self._iter_dfs(sql, params, chunksize)
         self.connect()
-        self.cursor.execute(sql)
+        self.cursor.execute(sql, params)
         data = self.cursor.fetchall()
         columns = [column[0] for column in self.cursor.description]
-        self.conn.close()
         try:
             return pd.DataFrame(data, columns=columns)
         except ValueError:
             raise Exception('No data found.')
+
+    def _iter_dfs(self, sql, params, chunksize):
+        cursor = self.connect().cursor()
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        try:
+            while True:
+                data = cursor.fetchmany(chunksize)
+                if not data:
+                    break
+                yield pd.DataFrame(data, columns=columns)
+        finally:
+            # Also when the caller stops early, or the generator is garbage collected
+            cursor.close()
+
+    def iter_query(self, sql, params=(), arraysize=1000):
+        """Yields the rows of sql one at a time, fetching arraysize rows from SQLite at once.
+
+        Uses its own cursor, so other statements can run on this connection while iterating. Writing to
+        the table being read while iterating is not safe in SQLite though, use keyset paging for that.
+        """
+        cursor = self.connect().cursor()
+        cursor.arraysize = arraysize
+        cursor.execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def iter_rows(self, table_name, columns, where='', params=(), arraysize=1000):
+        """Yields only the given columns of table_name as tuples, e.g. iter_rows('job_postings', ['job_unique_id', 'job_link'])."""
+        sql = f'SELECT {", ".join(columns)} FROM {table_name}'
+        if where:
+            sql = f'{sql} WHERE {where}'
+        return self.iter_query(sql, params, arraysize)
         
     def insert_record(self, table_name, data):
         """Inserts a record into any table based on the provided data dictionary."""
@@ -85,50 +273,136 @@ class DatabaseTools:
         placeholders = ', '.join(['?' for _ in data])
         sql = f'INSERT INTO {table_name} ({columns}) VALUES ({placeholders})'
         
-        self.connect()
         try:
-            self.cursor.execute(sql, tuple(data.values()))
-            self.conn.commit()
+            with self.transaction() as cursor:
+                cursor.execute(sql, tuple(data.values()))
             print(f"Record successfully inserted into {table_name}.")
         except sqlite3.Error as e:
             print(f'Error inserting record into {table_name}:', e)
-        finally:
-            self.conn.close()
 
         
-    def start_new_session(self, terms, location, filter_tags='', n_pages=None):
-        """Starts a new search session with given parameters and saves it to the database."""
+    def start_new_session(self, terms, location, filter_tags='', n_pages=None, search_params=None):
+        """Starts a new search session with given parameters and saves it to the database.
+
+        search_params is the JSON of the search's query parameters, used to find the session again to resume it.
+        """
         ended_at = None  # This can be updated when the session ends.
         
         try:
-            self.connect()
-            self.cursor.execute(
-                "INSERT INTO search_sessions (terms, location, filter_tags, n_pages, ended_at) VALUES (?, ?, ?, ?, ?)",
-                (terms, location, filter_tags, n_pages, ended_at)
-            )
-            self.conn.commit()
+            with self.transaction(stage='db_session') as cursor:
+                cursor.execute(
+                    "INSERT INTO search_sessions (terms, location, filter_tags, n_pages, ended_at, search_params) VALUES (?, ?, ?, ?, ?, ?)",
+                    (terms, location, filter_tags, n_pages, ended_at, search_params)
+                )
             session_id = self.cursor.lastrowid
             print(f"New session started with ID: {session_id}")
             return session_id
         except sqlite3.Error as e:
             print('Error starting new session:', e)
-        finally:
-            self.conn.close()
+
+    def find_resumable_session(self, search_params, max_age='-1 day'):
+        """Returns (session_id, pages_fetched, new_postings, seen_postings) of the latest unfinished session of the
+        same search started within max_age, or None. Older results pages have moved on too far to pick up from."""
+        self.connect()
+        self.cursor.execute('''
+            SELECT id, pages_fetched, new_postings, seen_postings FROM search_sessions
+            WHERE search_params = ? AND ended_at IS NULL AND started_at > datetime('now', ?)
+            ORDER BY id DESC LIMIT 1
+        ''', (search_params, max_age))
+        return self.cursor.fetchone()
+
+    def end_session(self, session_id):
+        """Sets ended_at on a search session once its search has finished."""
+        with self.transaction(stage='db_session') as cursor:
+            cursor.execute('UPDATE search_sessions SET ended_at = CURRENT_TIMESTAMP WHERE id = ?', (session_id,))
+
+    def save_rate_decision(self, domain, decision, reason, concurrency, delay_seconds, challenge_rate, error_rate):
+        with self.transaction(stage='db_rate_decision') as cursor:
+            cursor.execute('''
+                INSERT INTO rate_decisions (domain, decision, reason, concurrency, delay_seconds, challenge_rate, error_rate)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (domain, decision, reason, concurrency, delay_seconds, challenge_rate, error_rate))
+
+    def save_run_metrics(self, run_name, session_id, summary, seconds, pages=0, jobs=0):
+        """Saves a LatencyHistogram summary to run_metrics, plus a 'run' row with the run's duration and counts."""
+        rows = [(run_name, session_id, stage, stats['count'], stats['total'], stats['p50'], stats['p95'], stats['max'],
+                 None, None) for stage, stats in summary.items()]
+        rows.append((run_name, session_id, 'run', 1, seconds, None, None, None, pages, jobs))
+        with self.transaction(stage='db_metrics') as cursor:
+            cursor.executemany('''
+                INSERT INTO run_metrics (run_name, session_id, stage, count, total_seconds, p50_seconds, p95_seconds,
+                    max_seconds, pages, jobs)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
     
     def update_job_postings(self, obj):
         obj_id = obj['job_unique_id']
         print(f'Updating job postings with id: {obj_id}')
+        self.insert_job_postings([obj])
+
+    def insert_job_postings(self, objs):
+        """Inserts a whole page of job cards in one transaction. Already known job ids are ignored.
+
+        Cards that carry more than the card text (see indeed_parsers.mosaic_job_cards) also update job_card_data.
+        Returns the number of postings that were new.
+        """
+        rows = [(obj['job_unique_id'], obj['job_title'], obj['job_link'], obj['session_id'],
+                 obj.get('employer'), obj.get('job_location'),
+                 posting_key(obj['job_title'], obj.get('employer'), obj.get('job_location'))) for obj in objs]
+        if not rows:
+            return 0
+        with self.transaction(stage='db_insert_postings') as cursor:
+            cursor.executemany('''
+                INSERT OR IGNORE INTO job_postings (
+                    job_unique_id, 
+                    job_title, 
+                    job_link, 
+                    session_id,
+                    employer,
+                    job_location,
+                    posting_key
+                    )
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            # executemany sums the rows changed, so the ignored duplicates aren't counted
+            inserted = cursor.rowcount
+            card_data = [[obj['job_unique_id'], obj.get('source')] + [obj.get(column) for column in CARD_DATA_COLUMNS]
+                         for obj in objs
+                         if obj['job_unique_id'] is not None and any(obj.get(column) is not None for column in CARD_DATA_COLUMNS)]
+            if card_data:
+                cursor.executemany(f'''
+                    INSERT INTO job_card_data (job_unique_id, source, {', '.join(CARD_DATA_COLUMNS)})
+                    VALUES ({', '.join(['?' for _ in range(len(CARD_DATA_COLUMNS) + 2)])})
+                    ON CONFLICT(job_unique_id) DO UPDATE SET
+                        source = CASE WHEN job_card_data.source = 'mosaic' THEN 'mosaic' ELSE excluded.source END,
+                        {', '.join(f'{column} = COALESCE(excluded.{column}, job_card_data.{column})' for column in CARD_DATA_COLUMNS)},
+                        captured_at = CURRENT_TIMESTAMP
+                ''', card_data)
+        logging.info(f'Inserted {inserted} new of a batch of {len(rows)} job postings.')
+        return inserted
+
+    def known_job_ids(self, job_unique_ids):
+        """Returns the subset of job_unique_ids that are already in job_postings."""
+        job_unique_ids = [x for x in job_unique_ids if x is not None]
+        if not job_unique_ids:
+            return set()
+        placeholders = ', '.join(['?' for _ in job_unique_ids])
         self.connect()
-        self.cursor.execute('''
-            INSERT OR IGNORE INTO job_postings (
-                job_unique_id, 
-                job_title, 
-                job_link, 
-                session_id
-                )
-            VALUES (?, ?, ?, ?)
-        ''', (obj['job_unique_id'], obj['job_title'], obj['job_link'], obj['session_id']))
-        self.conn.commit()
+        self.cursor.execute(f'SELECT job_unique_id FROM job_postings WHERE job_unique_id IN ({placeholders})', job_unique_ids)
+        return {row[0] for row in self.cursor.fetchall()}
+
+    def update_session_counts(self, session_id, pages_fetched, new_postings, seen_postings, last_url=None):
+        """Records how many pages a search session has fetched and how many of its cards were new vs. already known.
+
+        This is also the session's checkpoint: a resumed search carries on from the page after pages_fetched.
+        """
+        with self.transaction(stage='db_session_counts') as cursor:
+            cursor.execute('''
+                UPDATE search_sessions
+                SET pages_fetched = ?, new_postings = ?, seen_postings = ?, last_url = COALESCE(?, last_url),
+                    checkpoint_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (pages_fetched, new_postings, seen_postings, last_url, session_id))
         
     def get_postings_by_session(self, session_id):
         sql = f'''
@@ -136,21 +410,140 @@ class DatabaseTools:
             WHERE session_id = {session_id}
         '''
         return self.sql_to_df(sql)
-    
-    def update_job_posting_description(self, job_unique_id, description):
+
+    def search(self, query, limit=20, session_id=None):
+        """Full-text search over job titles, employers, locations, descriptions and job_details, best matches first.
+
+        query uses FTS5 syntax: words are ANDed, "quoted phrases", OR, NOT, prefix* and column filters such as
+        job_title:engineer. Returns a DataFrame with a snippet of the best matching text, [highlighted].
+        """
+        self.sync_search_index()
+        # bm25 is lower for better matches, a title hit counts 10x a description hit. Setting it as the rank
+        # function lets FTS5 return rows already sorted, so snippet() only decompresses the rows returned.
+        sql = '''
+            SELECT p.job_unique_id, p.job_title, p.employer, p.job_location, p.job_link, p.session_id,
+                snippet(job_search, -1, '[', ']', '...', 24) AS snippet,
+                job_search.rank AS rank
+            FROM job_search
+            JOIN job_postings p ON p.id = job_search.rowid
+            WHERE job_search MATCH ? AND job_search.rank MATCH 'bm25(0.0, 10.0, 5.0, 2.0, 1.0, 1.0)'
+        '''
+        params = [query]
+        if session_id is not None:
+            sql += ' AND p.session_id = ?'
+            params.append(session_id)
+        sql += ' ORDER BY job_search.rank LIMIT ?'
+        params.append(limit)
+        return self.sql_to_df(sql, params)
+
+    def sync_search_index(self):
+        """Brings job_search up to date with the postings the triggers queued in job_search_queue. Returns how many.
+
+        Each queued posting is removed from the index with the values it was indexed with, then added back as it
+        is now, unless it was deleted. The triggers don't need description_text(), this does.
+        """
         self.connect()
-        self.cursor.execute('''
+        if self.cursor.execute('SELECT 1 FROM job_search_queue LIMIT 1').fetchone() is None:
+            return 0
+        with self.transaction(immediate=True, stage='db_sync_search') as cursor:
+            cursor.execute('''
+                INSERT INTO job_search (job_search, rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+                SELECT 'delete', q.posting_id, q.job_unique_id, q.job_title, q.employer, q.job_location,
+                    description_text(d.compressed, d.dictionary_id), q.details
+                FROM job_search_queue q LEFT JOIN job_descriptions d ON d.content_hash = q.description_hash
+                WHERE q.indexed
+            ''')
+            cursor.execute('''
+                INSERT INTO job_search (rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+                SELECT s.id, s.job_unique_id, s.job_title, s.employer, s.job_location, s.job_description, s.details
+                FROM job_search_queue q JOIN job_search_source s ON s.id = q.posting_id
+            ''')
+            n_synced = cursor.execute('DELETE FROM job_search_queue').rowcount
+        logging.info(f'Synced {n_synced} postings to the search index.')
+        return n_synced
+
+    def get_pending_descriptions(self):
+        """Returns the postings that still need a description. Served from the partial index on description_status."""
+        return self.sql_to_df('''
+            SELECT job_unique_id, job_link FROM job_postings
+            WHERE description_status = 'pending' AND job_link IS NOT NULL
+        ''')
+
+    def count_pending_descriptions(self):
+        return self.run_sql('''
+            SELECT COUNT(*) FROM job_postings
+            WHERE description_status = 'pending' AND job_link IS NOT NULL
+        ''')[0][0]
+
+    def iter_pending_descriptions(self, chunk_size=500):
+        """Yields (job_unique_id, job_link) for postings that still need a description, chunk_size rows per query.
+
+        Pages on id rather than holding a cursor open, so descriptions can be written while iterating.
+        """
+        last_id = 0
+        while True:
+            self.connect()
+            self.cursor.execute('''
+                SELECT id, job_unique_id, job_link FROM job_postings
+                WHERE description_status = 'pending' AND job_link IS NOT NULL AND id > ?
+                ORDER BY id LIMIT ?
+            ''', (last_id, chunk_size))
+            rows = self.cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            for _, job_unique_id, job_link in rows:
+                yield job_unique_id, job_link
+
+    def update_job_posting_description(self, job_unique_id, description):
+        self.update_job_posting_descriptions([(job_unique_id, description)])
+
+    def update_job_posting_descriptions(self, descriptions):
+        """Writes a batch of (job_unique_id, description) pairs in one transaction.
+
+        The text goes to the description store, job_postings only gets its hash.
+        """
+        descriptions = list(descriptions)
+        if not descriptions:
+            return
+        # Immediate, so unreferenced description cleanup can't delete a stored text between put_many's check and the update
+        with self.transaction(immediate=True, stage='db_update_descriptions') as cursor:
+            self.write_job_posting_descriptions(cursor, descriptions)
+
+    def write_job_posting_descriptions(self, cursor, descriptions):
+        """update_job_posting_descriptions inside the caller's transaction."""
+        descriptions = list(descriptions)
+        if not descriptions:
+            return
+        hashes = self.descriptions.put_many(cursor, [description for _, description in descriptions])
+        cursor.executemany('''
             UPDATE job_postings
-            SET job_description = ?
+            SET description_hash = ?, description_status = ?
             WHERE job_unique_id = ?
-        ''', (description, job_unique_id))
-        self.conn.commit()
-        self.conn.close()
+        ''', [(content_hash, description_status(description), job_unique_id)
+              for (job_unique_id, description), content_hash in zip(descriptions, hashes)])
+        logging.info(f'Updated a batch of {len(descriptions)} job descriptions.')
+
+    def get_descriptions(self, job_unique_ids):
+        """Returns {job_unique_id: description} for the given postings that have one, decompressing only those."""
+        job_unique_ids = [x for x in job_unique_ids if x is not None]
+        hashes = {}
+        for i in range(0, len(job_unique_ids), 500):
+            chunk = job_unique_ids[i:i + 500]
+            placeholders = ', '.join(['?' for _ in chunk])
+            hashes.update(self.iter_query(f'''
+                SELECT job_unique_id, description_hash FROM job_postings
+                WHERE job_unique_id IN ({placeholders}) AND description_hash IS NOT NULL
+            ''', chunk))
+        texts = self.descriptions.get_many(hashes.values())
+        return {job_unique_id: texts[h] for job_unique_id, h in hashes.items() if h in texts}
+
+    def get_description(self, job_unique_id):
+        return self.get_descriptions([job_unique_id]).get(job_unique_id)
         
     def insert_job_detail(self, job_detail):
         """Inserts a job detail record into the job_details table from a dictionary."""
         print(f'Inserting job id {job_detail["job_unique_id"]} into job_details table.')
-        self.connect()
         try:
             # Convert lists to comma-separated strings
             for key, value in job_detail.items():
@@ -163,25 +556,28 @@ class DatabaseTools:
             
             # Build and execute the SQL statement
             sql = f'INSERT INTO job_details ({columns}) VALUES ({placeholders})'
-            self.cursor.execute(sql, tuple(job_detail.values()))
-            self.conn.commit()
+            with self.transaction() as cursor:
+                cursor.execute(sql, tuple(job_detail.values()))
             print("Job details successfully inserted.")
         except sqlite3.Error as e:
             print('Error inserting job detail:', e)
-        finally:
-            self.conn.close()
-            
-    def list_tables(self):
-        print(f'Listing tables in database: {self.database_path}')
-        self.connect()
-        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = self.cursor.fetchall()
-        self.conn.close()
-        try:
-            return [x[0] for x in tables]
-        except IndexError:
-            raise Exception('No tables found in database.')
 
-    
-    
-        
+    def upsert_job_details(self, job_details):
+        """Writes a batch of job_details records (dicts with the same keys) in one transaction.
+
+        Existing rows are updated, but a None never overwrites a value that is already there.
+        """
+        if not job_details:
+            return
+        columns = list(job_details[0].keys())
+        updates = ', '.join(f'{column} = COALESCE(excluded.{column}, job_details.{column})'
+                            for column in columns if column != 'job_unique_id')
+        rows = [tuple(', '.join(value) if isinstance(value, list) else value for value in (detail[column] for column in columns))
+                for detail in job_details]
+        with self.transaction(stage='db_upsert_details') as cursor:
+            cursor.executemany(f'''
+                INSERT INTO job_details ({', '.join(columns)}, extracted_at)
+                VALUES ({', '.join(['?' for _ in columns])}, CURRENT_TIMESTAMP)
+                ON CONFLICT(job_unique_id) DO UPDATE SET {updates}, extracted_at = CURRENT_TIMESTAMP
+            ''', rows)
+        logging.info(f'Upserted a batch of {len(rows)} job details.')
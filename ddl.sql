@@ -1,4 +1,8 @@
-/**/
+/* The full schema of a new database, at the version of the last script in migrations/. DatabaseTools.setup runs
+   it on a database without tables and sets user_version to that version. Existing databases only get the
+   migrations, so a change goes in a new migration and here. */
+
+/* Searches */
 CREATE TABLE IF NOT EXISTS search_sessions (
     id INTEGER PRIMARY KEY,
     terms TEXT,
@@ -6,21 +10,50 @@ CREATE TABLE IF NOT EXISTS search_sessions (
     filter_tags TEXT,
     n_pages INTEGER,
     ended_at DATETIME,
-    started_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    -- How many cards each search session found that were new vs. already in job_postings
+    pages_fetched INTEGER DEFAULT 0,
+    new_postings INTEGER DEFAULT 0,
+    seen_postings INTEGER DEFAULT 0,
+    -- Where the search got to, so an interrupted search can pick up after its last completed page
+    search_params TEXT,
+    last_url TEXT,
+    checkpoint_at DATETIME,
+    -- See the Parquet export below
+    changed_at REAL,
+    exported INTEGER NOT NULL DEFAULT 0
 );
 
-/**/
+/* Only unfinished sessions can be resumed */
+CREATE INDEX IF NOT EXISTS idx_search_sessions_resumable ON search_sessions(search_params) WHERE ended_at IS NULL;
+
+/* Postings. The description itself is in job_descriptions, see job_postings_full. */
 CREATE TABLE IF NOT EXISTS job_postings (
     id INTEGER PRIMARY KEY,
     session_id INTEGER,
     job_unique_id TEXT UNIQUE,
     job_title TEXT,
     job_link TEXT,
-    job_description TEXT,
     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+    description_status TEXT DEFAULT 'pending',
+    -- Card fields used to spot reposts before their page is fetched, and the posting a duplicate was matched to
+    employer TEXT,
+    job_location TEXT,
+    posting_key TEXT,
+    duplicate_of TEXT,
+    description_hash TEXT,
+    changed_at REAL,
+    exported INTEGER NOT NULL DEFAULT 0,
     FOREIGN KEY (session_id) REFERENCES search_sessions(id)
 );
 
+/* Only the pending rows are indexed, so the backfill lookup is O(pending) */
+CREATE INDEX IF NOT EXISTS idx_job_postings_pending ON job_postings(id) WHERE description_status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_job_postings_session_id ON job_postings(session_id);
+CREATE INDEX IF NOT EXISTS idx_job_postings_timestamp ON job_postings(timestamp);
+CREATE INDEX IF NOT EXISTS idx_job_postings_posting_key ON job_postings(posting_key) WHERE posting_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_job_postings_description_hash ON job_postings(description_hash);
+
 CREATE TABLE IF NOT EXISTS job_details (
     id INTEGER PRIMARY KEY,
     job_unique_id INTEGER UNIQUE,
@@ -38,5 +71,308 @@ CREATE TABLE IF NOT EXISTS job_details (
     application_deadline TEXT,
     industry TEXT,
     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+    -- Salary parsed into numbers, in the pay period the posting uses (hour, day, week, month or year)
+    salary_min REAL,
+    salary_max REAL,
+    salary_period TEXT,
+    -- When the rule-based extractor last filled the row
+    extracted_at DATETIME,
+    changed_at REAL,
+    exported INTEGER NOT NULL DEFAULT 0,
     FOREIGN KEY (job_unique_id) REFERENCES job_postings(job_unique_id)
 );
+
+/* What the search results captured about each posting beyond its card text: the inline JSON
+   (mosaic-provider-jobcards) or, when a page doesn't have it, the salary and job type shown on the card */
+CREATE TABLE IF NOT EXISTS job_card_data (
+    job_unique_id TEXT PRIMARY KEY,
+    source TEXT,  -- mosaic or dom
+    salary_text TEXT,
+    salary_min REAL,
+    salary_max REAL,
+    salary_period TEXT,
+    employment_type TEXT,
+    snippet TEXT,
+    company_rating REAL,
+    remote INTEGER,
+    posted_at DATETIME,
+    captured_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+/* Descriptions, zstd-compressed once per distinct text (see description_store.py) */
+CREATE TABLE IF NOT EXISTS description_dictionaries (
+    id INTEGER PRIMARY KEY,
+    dictionary BLOB NOT NULL,
+    samples INTEGER,  -- descriptions it was trained on
+    trained_on INTEGER,  -- descriptions stored at the time
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS job_descriptions (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,  -- sha256 of the markdown
+    dictionary_id INTEGER,  -- NULL when compressed without a dictionary
+    size INTEGER NOT NULL,  -- bytes of markdown before compression
+    compressed BLOB NOT NULL,
+    FOREIGN KEY (dictionary_id) REFERENCES description_dictionaries(id)
+);
+
+CREATE VIEW IF NOT EXISTS job_postings_full AS
+SELECT p.id, p.session_id, p.job_unique_id, p.job_title, p.job_link,
+    description_text(d.compressed, d.dictionary_id) AS job_description,
+    p.timestamp, p.description_status, p.employer, p.job_location, p.posting_key, p.duplicate_of, p.description_hash,
+    p.changed_at, p.exported
+FROM job_postings p LEFT JOIN job_descriptions d ON d.content_hash = p.description_hash;
+
+/* Durable work queue for the description backfill. Times are unix epoch seconds. */
+CREATE TABLE IF NOT EXISTS description_tasks (
+    job_unique_id TEXT PRIMARY KEY,
+    job_link TEXT,
+    state TEXT NOT NULL DEFAULT 'pending', /* pending, leased, done or failed */
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (job_unique_id) REFERENCES job_postings(job_unique_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_description_tasks_claim ON description_tasks(state, next_attempt_at);
+
+/* New postings are queued as soon as the search saves them */
+CREATE TRIGGER IF NOT EXISTS enqueue_description_task
+AFTER INSERT ON job_postings
+WHEN new.job_unique_id IS NOT NULL AND new.job_link IS NOT NULL
+BEGIN
+    INSERT OR IGNORE INTO description_tasks (job_unique_id, job_link) VALUES (new.job_unique_id, new.job_link);
+END;
+
+/* MinHash signature of each stored description (num_perm uint32 values) */
+CREATE TABLE IF NOT EXISTS minhash_signatures (
+    job_unique_id TEXT PRIMARY KEY,
+    signature BLOB NOT NULL,
+    indexed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+/* LSH buckets: descriptions sharing any (band, bucket) are candidate near-duplicates */
+CREATE TABLE IF NOT EXISTS minhash_bands (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    job_unique_id TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, job_unique_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_minhash_bands_job ON minhash_bands(job_unique_id);
+
+/* Full-text search. job_search reads its text from job_search_source, the triggers only queue the postings that
+   changed and DatabaseTools.sync_search_index applies the queue before every search. */
+CREATE VIEW IF NOT EXISTS job_details_text AS
+SELECT job_unique_id,
+    COALESCE(position_summary, '') || ' ' || COALESCE(salary, '') || ' ' || COALESCE(location, '') || ' ' ||
+    COALESCE(employer, '') || ' ' || COALESCE(education, '') || ' ' || COALESCE(key_skills, '') || ' ' ||
+    COALESCE(employment_type, '') || ' ' || COALESCE(work_environment, '') || ' ' ||
+    COALESCE(experience_level, '') || ' ' || COALESCE(responsibilities, '') || ' ' ||
+    COALESCE(benefits, '') || ' ' || COALESCE(industry, '') AS details
+FROM job_details;
+
+CREATE VIEW IF NOT EXISTS job_search_source AS
+SELECT p.id, p.job_unique_id, p.job_title, p.employer, p.job_location,
+    description_text(d.compressed, d.dictionary_id) AS job_description, t.details
+FROM job_postings p
+LEFT JOIN job_descriptions d ON d.content_hash = p.description_hash
+LEFT JOIN job_details_text t ON t.job_unique_id = p.job_unique_id;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS job_search USING fts5(
+    job_unique_id UNINDEXED,
+    job_title,
+    employer,
+    job_location,
+    job_description,
+    details,
+    content = 'job_search_source',
+    content_rowid = 'id',
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+
+/* A posting is queued once until the next sync, with the values it was indexed with. indexed is 0 for a posting
+   that isn't in the index yet. */
+CREATE TABLE IF NOT EXISTS job_search_queue (
+    posting_id INTEGER PRIMARY KEY,
+    indexed INTEGER NOT NULL,
+    job_unique_id TEXT,
+    job_title TEXT,
+    employer TEXT,
+    job_location TEXT,
+    description_hash TEXT,  -- the old description stays in job_descriptions until the queue is synced
+    details TEXT
+);
+
+CREATE TRIGGER IF NOT EXISTS job_search_insert
+AFTER INSERT ON job_postings
+BEGIN
+    INSERT INTO job_search_queue (posting_id, indexed)
+    SELECT new.id, 0 WHERE NOT EXISTS (SELECT 1 FROM job_search_queue WHERE posting_id = new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_update
+BEFORE UPDATE OF job_unique_id, job_title, employer, job_location, description_hash ON job_postings
+BEGIN
+    INSERT INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT old.id, 1, old.job_unique_id, old.job_title, old.employer, old.job_location, old.description_hash,
+        (SELECT details FROM job_details_text WHERE job_unique_id = old.job_unique_id)
+    WHERE NOT EXISTS (SELECT 1 FROM job_search_queue WHERE posting_id = old.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_delete
+BEFORE DELETE ON job_postings
+BEGIN
+    INSERT INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT old.id, 1, old.job_unique_id, old.job_title, old.employer, old.job_location, old.description_hash,
+        (SELECT details FROM job_details_text WHERE job_unique_id = old.job_unique_id)
+    WHERE NOT EXISTS (SELECT 1 FROM job_search_queue WHERE posting_id = old.id);
+END;
+
+/* job_details is upserted, which fires the update triggers when the row exists, so these run before the change
+   and read the details text as it was indexed */
+CREATE TRIGGER IF NOT EXISTS job_search_details_insert
+BEFORE INSERT ON job_details
+BEGIN
+    INSERT INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT p.id, 1, p.job_unique_id, p.job_title, p.employer, p.job_location, p.description_hash,
+        (SELECT t.details FROM job_details_text t WHERE t.job_unique_id = p.job_unique_id)
+    FROM job_postings p WHERE p.job_unique_id = new.job_unique_id
+        AND NOT EXISTS (SELECT 1 FROM job_search_queue q WHERE q.posting_id = p.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_details_update
+BEFORE UPDATE OF job_unique_id, position_summary, salary, location, employer, education, key_skills, employment_type,
+    work_environment, experience_level, responsibilities, benefits, industry ON job_details
+BEGIN
+    INSERT INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT p.id, 1, p.job_unique_id, p.job_title, p.employer, p.job_location, p.description_hash,
+        (SELECT t.details FROM job_details_text t WHERE t.job_unique_id = p.job_unique_id)
+    FROM job_postings p WHERE p.job_unique_id IN (old.job_unique_id, new.job_unique_id)
+        AND NOT EXISTS (SELECT 1 FROM job_search_queue q WHERE q.posting_id = p.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_details_delete
+BEFORE DELETE ON job_details
+BEGIN
+    INSERT INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT p.id, 1, p.job_unique_id, p.job_title, p.employer, p.job_location, p.description_hash,
+        (SELECT t.details FROM job_details_text t WHERE t.job_unique_id = p.job_unique_id)
+    FROM job_postings p WHERE p.job_unique_id = old.job_unique_id
+        AND NOT EXISTS (SELECT 1 FROM job_search_queue q WHERE q.posting_id = p.id);
+END;
+
+/* Exports. The Parquet export follows each row: changed_at is when the row was last inserted or updated (unix
+   seconds), exported is cleared by every change and set once the row is written to Parquet. The update triggers
+   skip the exporter's own updates, which only set exported. */
+CREATE INDEX IF NOT EXISTS idx_search_sessions_unexported ON search_sessions(id) WHERE exported = 0;
+CREATE INDEX IF NOT EXISTS idx_job_postings_unexported ON job_postings(id) WHERE exported = 0;
+CREATE INDEX IF NOT EXISTS idx_job_details_unexported ON job_details(id) WHERE exported = 0;
+
+CREATE TRIGGER IF NOT EXISTS search_sessions_changed_insert
+AFTER INSERT ON search_sessions
+BEGIN
+    UPDATE search_sessions SET changed_at = (julianday('now') - 2440587.5) * 86400.0 WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_sessions_changed_update
+AFTER UPDATE ON search_sessions
+WHEN new.exported IS old.exported AND new.changed_at IS old.changed_at
+BEGIN
+    UPDATE search_sessions
+    SET changed_at = MAX((julianday('now') - 2440587.5) * 86400.0, COALESCE(old.changed_at, 0) + 0.001), exported = 0
+    WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_postings_changed_insert
+AFTER INSERT ON job_postings
+BEGIN
+    UPDATE job_postings SET changed_at = (julianday('now') - 2440587.5) * 86400.0 WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_postings_changed_update
+AFTER UPDATE ON job_postings
+WHEN new.exported IS old.exported AND new.changed_at IS old.changed_at
+BEGIN
+    UPDATE job_postings
+    SET changed_at = MAX((julianday('now') - 2440587.5) * 86400.0, COALESCE(old.changed_at, 0) + 0.001), exported = 0
+    WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_details_changed_insert
+AFTER INSERT ON job_details
+BEGIN
+    UPDATE job_details SET changed_at = (julianday('now') - 2440587.5) * 86400.0 WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_details_changed_update
+AFTER UPDATE ON job_details
+WHEN new.exported IS old.exported AND new.changed_at IS old.changed_at
+BEGIN
+    UPDATE job_details
+    SET changed_at = MAX((julianday('now') - 2440587.5) * 86400.0, COALESCE(old.changed_at, 0) + 0.001), exported = 0
+    WHERE id = new.id;
+END;
+
+/* Rows exported by each export, and when it last ran */
+CREATE TABLE IF NOT EXISTS export_watermarks (
+    table_name TEXT PRIMARY KEY,
+    rows_exported INTEGER NOT NULL DEFAULT 0,
+    exported_at DATETIME
+);
+
+/* How many descriptions each long line appears in, for the LLM export's boilerplate filter */
+CREATE TABLE IF NOT EXISTS description_lines (
+    line_hash INTEGER PRIMARY KEY,
+    documents INTEGER NOT NULL
+);
+
+/* The LLM export's state per posting: the description its lines were counted from and the one it was exported with */
+CREATE TABLE IF NOT EXISTS llm_export_rows (
+    posting_id INTEGER PRIMARY KEY,
+    counted_hash TEXT,  -- description_hash whose lines are in description_lines
+    exported_hash TEXT,  -- description_hash last written to a shard
+    FOREIGN KEY (posting_id) REFERENCES job_postings(id)
+);
+
+/* Metrics */
+CREATE TABLE IF NOT EXISTS run_metrics (
+    id INTEGER PRIMARY KEY,
+    run_name TEXT NOT NULL,
+    session_id INTEGER,
+    stage TEXT NOT NULL,
+    count INTEGER,
+    total_seconds REAL,
+    p50_seconds REAL,
+    p95_seconds REAL,
+    max_seconds REAL,
+    pages INTEGER,
+    jobs INTEGER,
+    recorded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (session_id) REFERENCES search_sessions(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_run_metrics_session ON run_metrics(session_id);
+
+CREATE TABLE IF NOT EXISTS rate_decisions (
+    id INTEGER PRIMARY KEY,
+    domain TEXT NOT NULL,
+    decision TEXT NOT NULL,  -- increase, decrease, pause or resume
+    reason TEXT,
+    concurrency INTEGER,
+    delay_seconds REAL,
+    challenge_rate REAL,
+    error_rate REAL,
+    decided_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_decisions_domain ON rate_decisions(domain, decided_at);
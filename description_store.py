@@ -0,0 +1,231 @@
+# Packages
+import hashlib
+import logging
+import os
+import time
+import zstandard
+
+
+def content_hash(text: str):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class DescriptionStore:
+    """Job descriptions stored once per content hash and zstd compressed (the job_descriptions table).
+
+    job_postings only keeps the hash, so listing and filtering queries never read description text. Text is
+    decompressed on demand, by get_many or by the description_text() SQL function every DatabaseTools
+    connection registers. Once enough descriptions are stored a zstd dictionary is trained on a sample of
+    them, which is where most of the saving on many short, similar texts comes from.
+    """
+
+    def __init__(self, db, level: int = 10):
+        self.db = db
+        self.level = level
+        self.dictionaries = {}  # dictionary id -> ZstdCompressionDict
+        self.compressors = {}  # dictionary id (None without one) -> ZstdCompressor
+        self.decompressors = {}
+
+    def register(self, conn):
+        """Adds the functions migrations, triggers and views use to a new connection."""
+        conn.create_function('description_text', 2, self._sql_text, deterministic=True)
+        conn.create_function('description_hash', 1, lambda text: None if text is None else content_hash(text),
+                             deterministic=True)
+        conn.create_function('description_compress', 1, self._sql_compress, deterministic=True)
+
+    """Compression"""
+
+    def _dictionary(self, dictionary_id):
+        if dictionary_id not in self.dictionaries:
+            row = self.db.conn.execute('SELECT dictionary FROM description_dictionaries WHERE id = ?',
+                                       (dictionary_id,)).fetchone()
+            if row is None:
+                raise KeyError(f'Unknown description dictionary {dictionary_id}')
+            self.dictionaries[dictionary_id] = zstandard.ZstdCompressionDict(row[0])
+        return self.dictionaries[dictionary_id]
+
+    def _compressor(self, dictionary_id):
+        if dictionary_id not in self.compressors:
+            dict_data = None if dictionary_id is None else self._dictionary(dictionary_id)
+            self.compressors[dictionary_id] = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+        return self.compressors[dictionary_id]
+
+    def _decompressor(self, dictionary_id):
+        if dictionary_id not in self.decompressors:
+            dict_data = None if dictionary_id is None else self._dictionary(dictionary_id)
+            self.decompressors[dictionary_id] = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return self.decompressors[dictionary_id]
+
+    def decompress(self, compressed, dictionary_id):
+        if compressed is None:
+            return None
+        return self._decompressor(dictionary_id).decompress(compressed).decode('utf-8')
+
+    def _sql_text(self, compressed, dictionary_id):
+        return self.decompress(compressed, dictionary_id)
+
+    def _sql_compress(self, text):
+        return None if text is None else self._compressor(None).compress(text.encode('utf-8'))
+
+    """Main Functions"""
+
+    def put_many(self, cursor, texts):
+        """Stores the texts that aren't stored yet, inside the caller's transaction. Returns their hashes, in order."""
+        hashes = [None if text is None else content_hash(text) for text in texts]
+        new = {h: text for h, text in zip(hashes, texts) if h is not None}
+        if not new:
+            return hashes
+        placeholders = ', '.join(['?' for _ in new])
+        cursor.execute(f'SELECT content_hash FROM job_descriptions WHERE content_hash IN ({placeholders})', list(new))
+        for (stored,) in cursor.fetchall():
+            del new[stored]
+        # New text is compressed with the newest dictionary, which may have been trained by another process
+        dictionary_id = cursor.execute('SELECT MAX(id) FROM description_dictionaries').fetchone()[0]
+        compressor = self._compressor(dictionary_id)
+        rows = []
+        for h, text in new.items():
+            data = text.encode('utf-8')
+            rows.append((h, dictionary_id, len(data), compressor.compress(data)))
+        cursor.executemany('''
+            INSERT OR IGNORE INTO job_descriptions (content_hash, dictionary_id, size, compressed)
+            VALUES (?, ?, ?, ?)
+        ''', rows)
+        return hashes
+
+    def get_many(self, content_hashes):
+        """Returns {content_hash: text} for the stored ones among content_hashes."""
+        content_hashes = [h for h in set(content_hashes) if h is not None]
+        texts = {}
+        for i in range(0, len(content_hashes), 500):
+            chunk = content_hashes[i:i + 500]
+            placeholders = ', '.join(['?' for _ in chunk])
+            for h, compressed, dictionary_id in self.db.iter_query(f'''
+                SELECT content_hash, compressed, dictionary_id FROM job_descriptions
+                WHERE content_hash IN ({placeholders})
+            ''', chunk):
+                texts[h] = self.decompress(compressed, dictionary_id)
+        return texts
+
+    def get(self, content_hash):
+        return self.get_many([content_hash]).get(content_hash)
+
+    def delete_unreferenced(self):
+        """Deletes the descriptions no posting points to any more (the search index sync may still need a queued one),
+        and the dictionaries nothing is compressed with but the newest. Returns the number of descriptions deleted.
+        """
+        with self.db.transaction(immediate=True, stage='db_delete_unreferenced_descriptions') as cursor:
+            cursor.execute('''
+                DELETE FROM job_descriptions
+                WHERE NOT EXISTS (SELECT 1 FROM job_postings p WHERE p.description_hash = job_descriptions.content_hash)
+                AND NOT EXISTS (SELECT 1 FROM job_search_queue q WHERE q.description_hash = job_descriptions.content_hash)
+            ''')
+            n_deleted = cursor.rowcount
+            cursor.execute('''
+                DELETE FROM description_dictionaries
+                WHERE id < (SELECT MAX(id) FROM description_dictionaries)
+                AND id NOT IN (SELECT dictionary_id FROM job_descriptions WHERE dictionary_id IS NOT NULL)
+            ''')
+            n_dictionaries = cursor.rowcount
+            kept = {dictionary_id for (dictionary_id,) in cursor.execute('SELECT id FROM description_dictionaries')}
+        for cache in (self.dictionaries, self.compressors, self.decompressors):
+            for dictionary_id in [d for d in cache if d is not None and d not in kept]:
+                del cache[dictionary_id]
+        logging.info(f'Deleted {n_deleted} unreferenced descriptions and {n_dictionaries} unused dictionaries.')
+        return n_deleted
+
+    def stats(self):
+        n_descriptions, raw_bytes, stored_bytes = self.db.run_sql('''
+            SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length(compressed)), 0) FROM job_descriptions
+        ''')[0]
+        return {'descriptions': n_descriptions, 'raw_bytes': raw_bytes, 'stored_bytes': stored_bytes,
+                'ratio': raw_bytes / stored_bytes if stored_bytes else 0.0}
+
+    """Dictionaries"""
+
+    def train_dictionary(self, sample_size: int = 2000, dict_size: int = 112640, min_samples: int = 100):
+        """Trains a dictionary on a random sample of the stored descriptions and recompresses every one with it.
+
+        Returns the new dictionary's id, or None when there are too few descriptions to train on.
+        """
+        started = time.perf_counter()
+        samples = [self.decompress(compressed, dictionary_id).encode('utf-8')
+                   for compressed, dictionary_id in self.db.iter_query('''
+                       SELECT compressed, dictionary_id FROM job_descriptions
+                       WHERE id IN (SELECT id FROM job_descriptions ORDER BY random() LIMIT ?)
+                   ''', (sample_size,))]
+        if len(samples) < min_samples:
+            logging.info(f'Only {len(samples)} descriptions stored, not training a dictionary yet.')
+            return None
+        try:
+            dictionary = zstandard.train_dictionary(dict_size, samples, level=self.level)
+        except zstandard.ZstdError as e:
+            logging.warning(f'Could not train a description dictionary: {e}')
+            return None
+        n_descriptions = self.db.run_sql('SELECT COUNT(*) FROM job_descriptions')[0][0]
+        with self.db.transaction(stage='db_train_dictionary') as cursor:
+            cursor.execute('INSERT INTO description_dictionaries (dictionary, samples, trained_on) VALUES (?, ?, ?)',
+                           (dictionary.as_bytes(), len(samples), n_descriptions))
+            dictionary_id = cursor.lastrowid
+        logging.info(f'Trained description dictionary {dictionary_id} on {len(samples)} samples '
+                     f'in {time.perf_counter() - started:.1f}s.')
+        self.recompress(dictionary_id)
+        return dictionary_id
+
+    def train_if_needed(self, min_samples: int = 1000, growth: int = 4):
+        """Trains the first dictionary once min_samples descriptions are stored, and a new one each time the
+        number stored has grown growth times since the last. Returns the new dictionary's id or None.
+        """
+        n_descriptions, trained_on = self.db.run_sql('''
+            SELECT (SELECT COUNT(*) FROM job_descriptions),
+                (SELECT trained_on FROM description_dictionaries ORDER BY id DESC LIMIT 1)
+        ''')[0]
+        if n_descriptions < max(min_samples, growth * (trained_on or 0)):
+            return None
+        return self.train_dictionary()
+
+    def recompress(self, dictionary_id, chunk_size: int = 500):
+        """Recompresses the descriptions stored without dictionary_id, chunk_size per transaction."""
+        compressor = self._compressor(dictionary_id)
+        n_recompressed = 0
+        last_id = 0
+        while True:
+            rows = list(self.db.iter_query('''
+                SELECT id, compressed, dictionary_id FROM job_descriptions
+                WHERE id > ? AND dictionary_id IS NOT ?
+                ORDER BY id LIMIT ?
+            ''', (last_id, dictionary_id, chunk_size)))
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = [(compressor.compress(self.decompress(compressed, old_id).encode('utf-8')), dictionary_id, row_id)
+                       for row_id, compressed, old_id in rows]
+            with self.db.transaction(stage='db_recompress_descriptions') as cursor:
+                cursor.executemany('UPDATE job_descriptions SET compressed = ?, dictionary_id = ? WHERE id = ?', updates)
+            n_recompressed += len(rows)
+        logging.info(f'Recompressed {n_recompressed} descriptions with dictionary {dictionary_id}.')
+        return n_recompressed
+
+
+def compact_descriptions(db=None, force: bool = False, vacuum: bool = False):
+    """Deletes the descriptions no posting uses any more, trains a new dictionary when one is due (always with
+    force=True) and optionally VACUUMs the database, which is what gives the freed pages back to the file system.
+    """
+    from database_tools import DatabaseTools  # database_tools imports this module
+    db = db or DatabaseTools()
+    store = db.descriptions
+    db.connect()
+    # Synced first, so the queue doesn't keep old descriptions around
+    db.sync_search_index()
+    n_deleted = store.delete_unreferenced()
+    dictionary_id = store.train_dictionary() if force else store.train_if_needed()
+    stats = store.stats()
+    if dictionary_id is not None or n_deleted or force:
+        print(f"{stats['descriptions']} descriptions: {stats['raw_bytes'] / 1e6:.1f} MB of text stored in "
+              f"{stats['stored_bytes'] / 1e6:.1f} MB ({stats['ratio']:.1f}x).")
+    if vacuum:
+        size_before = os.path.getsize(db.database_path)
+        db.cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        db.cursor.execute('VACUUM')
+        size_after = os.path.getsize(db.database_path)
+        print(f'Database vacuumed: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB.')
+    return stats
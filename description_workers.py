@@ -0,0 +1,210 @@
+# Packages
+import logging
+import queue
+import threading
+import time
+from selenium.common.exceptions import WebDriverException
+
+# Custom code
+from database_tools import DatabaseTools
+from indeed_scraper import IndeedScraper
+from selenium_base import Browsers
+from task_queue import DescriptionQueue
+from markdown_pipeline import MarkdownConverter
+from metrics import LatencyHistogram, report_run
+
+
+class DescriptionWorkerPool:
+    """Fetches job descriptions with N browsers pulling from a shared queue, and one thread writing the results.
+
+    The writer converts the HTML to markdown on a process pool and saves the results through
+    DescriptionQueue.finish, so description_tasks is kept up to date and jobs that failed are retried later with backoff.
+    """
+
+    def __init__(self,
+                 workers: int = 2,
+                 browser: str = Browsers.FIREFOX,
+                 scraper_factory=None,  # callable returning a SeleniumScraper, defaults to an IndeedScraper
+                 database_factory=DatabaseTools,  # called on the writer thread, sqlite connections can't be shared
+                 max_restarts: int = 3,  # browser restarts allowed per worker before it gives up
+                 max_attempts: int = 2,  # times a single job link is tried before it is dropped
+                 batch_size: int = 25,  # descriptions per write transaction
+                 performance_profile: bool = False,  # passed to the default scrapers
+                 html_cache=None,  # shared HtmlCache for the default scrapers
+                 task_owner=None  # owner of the claimed tasks, so the writer may close and renew their leases
+                 ):
+        self.workers = workers
+        self.scraper_factory = scraper_factory or (
+            lambda: IndeedScraper(browser=browser, performance_profile=performance_profile, html_cache=html_cache))
+        self.database_factory = database_factory
+        self.max_restarts = max_restarts
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.task_owner = task_owner
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.threads = []
+        self.writer = None
+        self.stats = {'fetched': 0, 'written': 0, 'failed': 0, 'restarts': 0}
+        self.stats_lock = threading.Lock()
+        # Every worker's and the writer's timings end up here, reported once when the pool closes
+        self.latency = LatencyHistogram()
+        self.started = None
+
+    def _count(self, key, n=1):
+        with self.stats_lock:
+            self.stats[key] += n
+
+    """Workers"""
+
+    def _open_scraper(self):
+        scraper = self.scraper_factory()
+        scraper.open_browser()
+        return scraper
+
+    def _restart_scraper(self, scraper):
+        self.latency.merge(scraper.latency)
+        try:
+            scraper.close_browser()
+        except Exception:
+            pass
+        self._count('restarts')
+        return self._open_scraper()
+
+    def _work(self, worker_number):
+        name = f'worker-{worker_number}'
+        restarts = 0
+        try:
+            scraper = self._open_scraper()
+        except WebDriverException as e:
+            logging.error(f'{name}: could not open browser: {e}')
+            return
+
+        try:
+            while True:
+                task = self.tasks.get()
+                if task is None:
+                    break
+                try:
+                    self._fetch(scraper, *task)
+                except WebDriverException as e:
+                    # The browser crashed or hung. Put the job back and carry on with a fresh browser.
+                    job_unique_id, job_link, attempt = task
+                    logging.warning(f'{name}: browser error on {job_link}: {e}')
+                    if attempt + 1 < self.max_attempts:
+                        self.tasks.put((job_unique_id, job_link, attempt + 1))
+                    else:
+                        self.results.put((job_unique_id, None))
+                        self._count('failed')
+                    restarts += 1
+                    if restarts > self.max_restarts:
+                        logging.error(f'{name}: too many browser restarts, stopping worker.')
+                        return
+                    # _restart_scraper merges and closes the old scraper, so the finally below must not again
+                    old_scraper, scraper = scraper, None
+                    try:
+                        scraper = self._restart_scraper(old_scraper)
+                    except WebDriverException as e:
+                        logging.error(f'{name}: could not restart browser: {e}')
+                        return
+                except Exception as e:
+                    logging.error(f'{name}: failed to fetch {task[1]}: {e}')
+                    self.results.put((task[0], None))
+                    self._count('failed')
+                finally:
+                    self.tasks.task_done()
+        finally:
+            # Also when the worker gives up, so no driver or browser process is left behind
+            if scraper is not None:
+                try:
+                    scraper.close_browser()
+                except Exception:
+                    pass
+                self.latency.merge(scraper.latency)
+
+    def _fetch(self, scraper, job_unique_id, job_link, attempt):
+        job_html = scraper.get_job_html(job_link, job_unique_id)
+        # Raw HTML goes to the writer, which converts it to markdown on a process pool
+        self.results.put((job_unique_id, job_html))
+        self._count('failed' if job_html is None else 'fetched')
+
+    """Writer"""
+
+    def _write(self):
+        db = self.database_factory()
+        task_queue = DescriptionQueue(db, owner=self.task_owner)
+        converter = MarkdownConverter(sink=task_queue.finish, batch_size=self.batch_size, latency=self.latency)
+        try:
+            while True:
+                try:
+                    result = self.results.get(timeout=1)
+                except queue.Empty:
+                    # Workers are quiet, send off whatever we have
+                    converter.flush()
+                    continue
+                if result is None:
+                    break
+                converter.add(*result)
+        finally:
+            converter.close()
+            self._count('written', converter.converted)
+            self.latency.merge(db.latency)
+            db.close()
+
+    """Pool control"""
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.writer = threading.Thread(target=self._write, name='description-writer')
+        self.writer.start()
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(n,), name=f'description-worker-{n}')
+            thread.start()
+            self.threads.append(thread)
+
+    def _workers_alive(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    def submit(self, job_unique_id, job_link):
+        self.tasks.put((job_unique_id, job_link, 0))
+
+    def close(self):
+        """Waits for the queued jobs to finish, then stops the workers and the writer."""
+        # Retried jobs are re-queued by the workers, so wait for the queue to drain before
+        # sending the stop signals. Give up waiting if every worker has died.
+        while self.tasks.unfinished_tasks and self._workers_alive():
+            time.sleep(0.2)
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.results.put(None)
+        self.writer.join()
+        # Anything still queued was left behind by workers that gave up. Their leases are handed back, so another
+        # run can pick them up without waiting for them to expire.
+        leftover = [task[0] for task in list(self.tasks.queue) if task is not None]
+        db = self.database_factory()
+        if leftover:
+            logging.error(f'{len(leftover)} job descriptions were not fetched, all workers stopped.')
+            if self.task_owner is not None:
+                DescriptionQueue(db, owner=self.task_owner, index_duplicates=False).release(leftover)
+        report_run('descriptions', self.latency, time.perf_counter() - self.started, jobs=self.stats['written'], db=db)
+        db.close()
+        return self.stats
+
+    def run(self, postings):
+        """Fetches descriptions for an iterable of (job_unique_id, job_link) pairs and returns the run stats."""
+        started = time.perf_counter()
+        self.start()
+        for job_unique_id, job_link in postings:
+            # Don't pull (or lease) work much faster than the workers get through it
+            while self.tasks.qsize() >= self.workers * 4 and self._workers_alive():
+                time.sleep(0.1)
+            if not self._workers_alive():
+                break
+            self.submit(job_unique_id, job_link)
+        stats = self.close()
+        stats['seconds'] = time.perf_counter() - started
+        print(f"Fetched {stats['fetched']} descriptions with {self.workers} workers "
+              f"in {stats['seconds']:.1f}s ({stats['restarts']} browser restarts, {stats['failed']} failed).")
+        return stats
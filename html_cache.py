@@ -0,0 +1,204 @@
+# Packages
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zstandard
+
+
+class HtmlCache:
+    """On-disk cache of raw job page HTML, so descriptions can be regenerated without going back to Indeed.
+
+    Pages are stored once per content hash as zstd files under objects/, and an index database maps each
+    job_unique_id to its hash. Entries older than ttl_seconds count as misses and are purged every
+    expire_every puts, and the least recently used entries are evicted once the blobs take more than max_bytes.
+    """
+
+    def __init__(self,
+                 directory: str = None,  # defaults to html_cache/ next to this file
+                 max_bytes: int = 2 * 1024 ** 3,
+                 ttl_seconds: int = 30 * 24 * 60 * 60,
+                 level: int = 10,  # zstd compression level
+                 expire_every: int = 1000):  # puts between purges of expired entries
+        self.directory = directory or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'html_cache')
+        self.objects_path = os.path.join(self.directory, 'objects')
+        os.makedirs(self.objects_path, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.expire_every = expire_every
+        self.compressor = zstandard.ZstdCompressor(level=level)
+        self.decompressor = zstandard.ZstdDecompressor()
+        self.stats_counts = {'hits': 0, 'misses': 0, 'expired': 0, 'puts': 0, 'evictions': 0}
+        # The scraper threads share one index connection
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.directory, 'index.db'), check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS entries (
+                job_unique_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                content_hash TEXT PRIMARY KEY,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access);
+            CREATE INDEX IF NOT EXISTS idx_entries_content_hash ON entries(content_hash);
+            CREATE INDEX IF NOT EXISTS idx_entries_created_at ON entries(created_at);
+            -- The blobs' total size, kept by the triggers so a put doesn't have to sum every blob
+            CREATE TABLE IF NOT EXISTS totals (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            BEGIN IMMEDIATE;
+            INSERT OR IGNORE INTO totals (name, value) SELECT 'bytes', COALESCE(SUM(size), 0) FROM blobs;
+            CREATE TRIGGER IF NOT EXISTS blobs_insert AFTER INSERT ON blobs
+            BEGIN
+                UPDATE totals SET value = value + new.size WHERE name = 'bytes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS blobs_delete AFTER DELETE ON blobs
+            BEGIN
+                UPDATE totals SET value = value - old.size WHERE name = 'bytes';
+            END;
+            COMMIT;
+        ''')
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.objects_path, content_hash[:2], f'{content_hash}.zst')
+
+    def _read_blob(self, content_hash):
+        with open(self._blob_path(content_hash), 'rb') as f:
+            return self.decompressor.decompress(f.read()).decode('utf-8')
+
+    def get(self, job_unique_id):
+        """Returns the cached HTML for job_unique_id, or None on a miss."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT content_hash, created_at FROM entries WHERE job_unique_id = ?',
+                                    (job_unique_id,)).fetchone()
+            if row is None:
+                self.stats_counts['misses'] += 1
+                return None
+            content_hash, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self.stats_counts['expired'] += 1
+                self.stats_counts['misses'] += 1
+                self._delete_entries([job_unique_id])
+                self.conn.commit()
+                return None
+            try:
+                html = self._read_blob(content_hash)
+            except (OSError, zstandard.ZstdError):
+                # The file is gone or damaged, drop the entry and treat it as a miss
+                self.stats_counts['misses'] += 1
+                self._delete_entries([job_unique_id])
+                self.conn.commit()
+                return None
+            self.conn.execute('UPDATE entries SET last_access = ? WHERE job_unique_id = ?', (now, job_unique_id))
+            self.conn.commit()
+            self.stats_counts['hits'] += 1
+            return html
+
+    def put(self, job_unique_id, html: str):
+        """Caches html for job_unique_id and returns its content hash. Identical pages share one file."""
+        data = html.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self.lock:
+            known = self.conn.execute('SELECT 1 FROM blobs WHERE content_hash = ?', (content_hash,)).fetchone()
+            if known is None:
+                path = self._blob_path(content_hash)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                compressed = self.compressor.compress(data)
+                # Write then rename, so a crash never leaves a half-written blob behind
+                with open(f'{path}.tmp', 'wb') as f:
+                    f.write(compressed)
+                os.replace(f'{path}.tmp', path)
+                self.conn.execute('INSERT INTO blobs (content_hash, size) VALUES (?, ?)', (content_hash, len(compressed)))
+            old = self.conn.execute('SELECT content_hash FROM entries WHERE job_unique_id = ?', (job_unique_id,)).fetchone()
+            self.conn.execute('''
+                INSERT OR REPLACE INTO entries (job_unique_id, content_hash, created_at, last_access)
+                VALUES (?, ?, ?, ?)
+            ''', (job_unique_id, content_hash, now, now))
+            if old is not None and old[0] != content_hash:
+                self._delete_orphan_blobs([old[0]])
+            self.stats_counts['puts'] += 1
+            self._evict()
+            self.conn.commit()
+        return content_hash
+
+    def _delete_entries(self, job_unique_ids):
+        hashes = []
+        for job_unique_id in job_unique_ids:
+            row = self.conn.execute('SELECT content_hash FROM entries WHERE job_unique_id = ?', (job_unique_id,)).fetchone()
+            if row is not None:
+                hashes.append(row[0])
+                self.conn.execute('DELETE FROM entries WHERE job_unique_id = ?', (job_unique_id,))
+        self._delete_orphan_blobs(hashes)
+
+    def _delete_orphan_blobs(self, content_hashes):
+        """Removes the blobs that no entry points to any more."""
+        for content_hash in set(content_hashes):
+            if self.conn.execute('SELECT 1 FROM entries WHERE content_hash = ? LIMIT 1', (content_hash,)).fetchone():
+                continue
+            self.conn.execute('DELETE FROM blobs WHERE content_hash = ?', (content_hash,))
+            try:
+                os.remove(self._blob_path(content_hash))
+            except FileNotFoundError:
+                pass
+
+    def _total_bytes(self):
+        return self.conn.execute("SELECT value FROM totals WHERE name = 'bytes'").fetchone()[0]
+
+    def _evict(self):
+        # Expired entries every expire_every puts (they are misses anyway), then least recently used until the
+        # cache fits in max_bytes
+        if self.stats_counts['puts'] % self.expire_every == 0:
+            expired = [row[0] for row in self.conn.execute('SELECT job_unique_id FROM entries WHERE created_at < ?',
+                                                           (time.time() - self.ttl_seconds,))]
+            self._delete_entries(expired)
+            self.stats_counts['evictions'] += len(expired)
+        while self._total_bytes() > self.max_bytes:
+            oldest = [row[0] for row in self.conn.execute(
+                'SELECT job_unique_id FROM entries ORDER BY last_access LIMIT 100')]
+            if not oldest:
+                break
+            self._delete_entries(oldest)
+            self.stats_counts['evictions'] += len(oldest)
+
+    def iter_entries(self):
+        """Yields (job_unique_id, html) for every cached page that hasn't expired, without touching last_access."""
+        with self.lock:
+            rows = self.conn.execute('SELECT job_unique_id, content_hash FROM entries WHERE created_at >= ?',
+                                     (time.time() - self.ttl_seconds,)).fetchall()
+        for job_unique_id, content_hash in rows:
+            try:
+                yield job_unique_id, self._read_blob(content_hash)
+            except (OSError, zstandard.ZstdError):
+                logging.warning(f'Cached page for {job_unique_id} is missing or damaged, skipping it.')
+
+    def stats(self):
+        """Returns the hit/miss counters for this process, plus the cache's current size."""
+        with self.lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            n_bytes = self._total_bytes()
+        lookups = self.stats_counts['hits'] + self.stats_counts['misses']
+        return {
+            **self.stats_counts,
+            'hit_rate': self.stats_counts['hits'] / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': n_bytes
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(f"HTML cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate), "
+                     f"{stats['puts']} puts, {stats['evictions']} evictions, {stats['entries']} entries, "
+                     f"{stats['bytes'] / 1024 ** 2:.1f} MB")
+
+    def close(self):
+        self.conn.close()
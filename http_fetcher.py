@@ -0,0 +1,81 @@
+# Packages
+import asyncio
+import logging
+import time
+import aiohttp
+
+# Custom code
+from indeed_parsers import extract_job_component, requires_browser, VERIFICATION_MARKER
+from rate_control import shared_rate_controller
+
+# Look like the browser we would otherwise drive, Indeed serves a different page to unknown clients.
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+}
+
+
+class HttpJobFetcher:
+    """Fetches job pages over plain HTTP on a pooled keep-alive session, without opening a browser.
+
+    Pages that need JavaScript, show the human verification check, or don't contain the job
+    component are handed back so they can go through the Selenium path instead.
+    """
+
+    def __init__(self, concurrency: int = 8, timeout: int = 20, headers: dict = None, rate_controller=None):
+        self.concurrency = concurrency  # upper bound, the rate controller may allow fewer
+        self.timeout = timeout
+        self.headers = headers or DEFAULT_HEADERS
+        self.rate_controller = rate_controller or shared_rate_controller()
+
+    async def fetch_job_html(self, session, url: str):
+        """Returns the job component HTML, or None if this page needs a real browser."""
+        await self.rate_controller.acquire_async(url)
+        outcome = 'ok'
+        try:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    logging.info(f'HTTP {response.status} for {url}, falling back to the browser')
+                    # 403 and 429 are how Indeed pushes back, treat them like a verification page
+                    outcome = 'challenge' if response.status in (403, 429) else 'error'
+                    return None
+                html = await response.text()
+                # Only the bot check is pushback, a JavaScript-only page is just for the browser to read
+                if VERIFICATION_MARKER in html:
+                    outcome = 'challenge'
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.info(f'HTTP fetch failed for {url}: {e}, falling back to the browser')
+            outcome = 'error'
+            return None
+        finally:
+            self.rate_controller.release(url, outcome)
+        if requires_browser(html):
+            logging.info(f'Browser required for {url}')
+            return None
+        return extract_job_component(html)
+
+    async def fetch_all(self, postings):
+        """Fetches (job_unique_id, job_link) pairs concurrently. Returns (fetched, fallbacks)."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers) as session:
+            async def fetch_one(job_unique_id, job_link):
+                async with semaphore:
+                    return job_unique_id, job_link, await self.fetch_job_html(session, job_link)
+
+            results = await asyncio.gather(*(fetch_one(*posting) for posting in postings))
+
+        fetched = [(job_unique_id, html) for job_unique_id, _, html in results if html is not None]
+        fallbacks = [(job_unique_id, job_link) for job_unique_id, job_link, html in results if html is None]
+        return fetched, fallbacks
+
+    def run(self, postings):
+        """Synchronous entry point for fetch_all."""
+        postings = list(postings)
+        started = time.perf_counter()
+        fetched, fallbacks = asyncio.run(self.fetch_all(postings))
+        print(f'Fetched {len(fetched)} of {len(postings)} job pages over HTTP in {time.perf_counter() - started:.1f}s, '
+              f'{len(fallbacks)} need a browser.')
+        return fetched, fallbacks
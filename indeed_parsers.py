@@ -0,0 +1,213 @@
+# Pure functions that turn raw Indeed HTML into structured records, without a browser.
+# Each parser takes the page HTML and an optional BeautifulSoup backend ('html.parser' or 'lxml').
+import datetime
+import json
+import re
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+
+DEFAULT_PARSER = 'html.parser'
+
+# Text that means we got a bot check or a JavaScript shell instead of the real page.
+VERIFICATION_MARKER = 'Verifying you are human'
+JAVASCRIPT_MARKER = 'nable JavaScript'
+
+# Results pages assign their job data to this in an inline script, before any card is rendered
+MOSAIC_JOB_CARDS = 'window.mosaic.providerData["mosaic-provider-jobcards"]'
+
+# Pay period spellings (card text, mosaic extractedSalary.type, JSON-LD unitText) -> hour, day, week, month or year
+PERIODS = {'hour': 'hour', 'hourly': 'hour', 'hr': 'hour', 'day': 'day', 'daily': 'day', 'week': 'week',
+           'weekly': 'week', 'month': 'month', 'monthly': 'month', 'year': 'year', 'yearly': 'year',
+           'annum': 'year', 'annually': 'year', 'annual': 'year'}
+
+# schema.org employmentType values -> the names job_details uses
+EMPLOYMENT_TYPES = {'FULL_TIME': 'Full-time', 'PART_TIME': 'Part-time', 'CONTRACTOR': 'Contract',
+                    'TEMPORARY': 'Temporary', 'INTERN': 'Internship', 'PER_DIEM': 'Casual'}
+
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+
+def requires_browser(html: str):
+    """True if the page can only be read in a real browser (human verification or JavaScript required)."""
+    return VERIFICATION_MARKER in html or JAVASCRIPT_MARKER in html
+
+
+def _text(element):
+    return element.get_text(' ', strip=True) if element is not None else None
+
+
+def inline_json(html: str, marker: str):
+    """Returns the JSON value assigned right after marker in an inline script, or None if it isn't there."""
+    start = html.find(marker)
+    if start == -1:
+        return None
+    start = html.find('{', start + len(marker))
+    try:
+        return json.JSONDecoder().raw_decode(html, start)[0]
+    except ValueError:
+        return None
+
+
+"""Search results pages"""
+
+
+def parse_job_cards(html: str, base_url: str = 'https://www.indeed.com', parser: str = DEFAULT_PARSER):
+    """Returns the id, title, link, employer and location of every job card (cardOutline) in a search results page."""
+    soup = BeautifulSoup(html, parser)
+    cards = []
+    for card in soup.select('.cardOutline'):
+        title_link = card.select_one('.jobTitle a')
+        title = card.select_one('.jcs-JobTitle')
+        link = card.find('a')
+        attributes = [_text(attribute) for attribute in card.select('.metadata:not(.salary-snippet-container) '
+                                                                    '[data-testid="attribute_snippet_testid"]')]
+        cards.append({
+            'job_unique_id': title_link.get('id') if title_link is not None and title_link.get('id') else None,
+            'job_title': title.get_text(strip=True) if title is not None else None,
+            'job_link': urljoin(base_url, link['href']) if link is not None and link.get('href') else None,
+            'employer': _text(card.select_one('[data-testid="company-name"]')),
+            'job_location': _text(card.select_one('[data-testid="text-location"]')),
+            'salary_text': _text(card.select_one('.salary-snippet-container')),
+            'employment_type': ', '.join(attributes) or None,
+            'source': 'dom'
+        })
+    return cards
+
+
+def mosaic_job_cards(provider_data, base_url: str = 'https://www.indeed.com'):
+    """Returns the job cards in a page's mosaic-provider-jobcards data, or None if it doesn't have the results.
+
+    Cards have the same keys as parse_job_cards, plus what the card HTML doesn't show: the structured pay,
+    job types, the summary snippet, company rating, remote flag and posting time.
+    """
+    try:
+        results = provider_data['metaData']['mosaicProviderJobCardsModel']['results']
+    except (KeyError, TypeError):
+        return None
+    cards = []
+    for result in results:
+        if not result.get('jobkey'):
+            continue
+        salary = result.get('extractedSalary') or {}
+        job_types = result.get('jobTypes') or [attribute['label'] for taxonomy in result.get('taxonomyAttributes') or []
+                                               if taxonomy.get('label') == 'job-types'
+                                               for attribute in taxonomy.get('attributes') or []]
+        published = result.get('pubDate')
+        cards.append({
+            'job_unique_id': f"job_{result['jobkey']}",  # the id of the card's title link
+            'job_title': result.get('displayTitle') or result.get('title'),
+            'job_link': urljoin(base_url, result['link']) if result.get('link') else None,
+            'employer': result.get('company'),
+            'job_location': result.get('formattedLocation'),
+            'salary_text': (result.get('salarySnippet') or {}).get('text'),
+            'salary_min': salary.get('min'),
+            'salary_max': salary.get('max'),
+            'salary_period': PERIODS.get(str(salary.get('type')).lower()),
+            'employment_type': ', '.join(job_types) or None,
+            'snippet': ' '.join(TAG_PATTERN.sub(' ', result.get('snippet') or '').split()) or None,
+            'company_rating': result.get('companyRating') or None,
+            'remote': int(bool(result['remoteLocation'])) if 'remoteLocation' in result else None,
+            'posted_at': datetime.datetime.fromtimestamp(published / 1000, datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            if published else None,
+            'source': 'mosaic'
+        })
+    return cards
+
+
+def parse_mosaic_job_cards(html: str, base_url: str = 'https://www.indeed.com'):
+    """mosaic_job_cards from a results page's inline script, or None if the page doesn't have it."""
+    return mosaic_job_cards(inline_json(html, MOSAIC_JOB_CARDS), base_url)
+
+
+def parse_filter_items(html: str, parser: str = DEFAULT_PARSER):
+    """Returns the filter pills of a search results page as [{'name': ..., 'options': [...]}].
+
+    Same shape as IndeedScraper.get_filter_items, but only sees the options already in the HTML.
+    """
+    soup = BeautifulSoup(html, parser)
+    menu_items = []
+    for dropdown in soup.select('.yosegi-FilterPill-dropdownPillContainer'):
+        button = dropdown.find('button')
+        if button is None or not button.get('id', '').startswith('filter'):
+            continue
+        menu_items.append({
+            'name': button.get_text(strip=True),
+            'options': [x.get_text(strip=True) for x in dropdown.select('.yosegi-FilterPill-dropdownListItemLink')]
+        })
+    return menu_items
+
+
+"""Job detail pages"""
+
+
+def _json_ld_scripts(soup):
+    return soup.find_all('script', type='application/ld+json')
+
+
+def job_posting_data(soup):
+    """Returns the pay, job type, deadline and other fields of the page's schema.org JobPosting (JSON-LD), or {}."""
+    for script in _json_ld_scripts(soup):
+        try:
+            data = json.loads(script.string or '')
+        except ValueError:
+            continue
+        if not isinstance(data, dict) or data.get('@type') != 'JobPosting':
+            continue
+        pay = (data.get('baseSalary') or {}).get('value') or {}
+        employment_types = data.get('employmentType') or []
+        if isinstance(employment_types, str):
+            employment_types = [employment_types]
+        address = ((data.get('jobLocation') or {}).get('address') or {}) if isinstance(data.get('jobLocation'), dict) else {}
+        return {
+            'salary_min': pay.get('minValue', pay.get('value')),
+            'salary_max': pay.get('maxValue', pay.get('value')),
+            'salary_period': PERIODS.get(str(pay.get('unitText')).lower()),
+            'employment_type': ', '.join(EMPLOYMENT_TYPES.get(value, value) for value in employment_types) or None,
+            'remote': int(data.get('jobLocationType') == 'TELECOMMUTE'),
+            'date_posted': data.get('datePosted'),
+            'valid_through': data.get('validThrough'),
+            'industry': data.get('industry'),
+            'employer': (data.get('hiringOrganization') or {}).get('name'),
+            'location': ', '.join(filter(None, [address.get('addressLocality'), address.get('addressRegion')])) or None,
+        }
+    return {}
+
+
+def extract_job_component(html: str, parser: str = DEFAULT_PARSER):
+    """Returns the innerHTML of the jobsearch-JobComponent element, or None if the page doesn't have one.
+
+    The page's JSON-LD scripts are kept after it, the same way get_job_html returns it, so the structured job
+    data ends up in the html cache with the description.
+    """
+    soup = BeautifulSoup(html, parser)
+    component = soup.find(class_='jobsearch-JobComponent')
+    if component is None:
+        return None
+    return component.decode_contents() + ''.join(str(script) for script in _json_ld_scripts(soup))
+
+
+def parse_job_detail(html: str, parser: str = DEFAULT_PARSER):
+    """Returns the header fields, JobPosting JSON-LD fields (job_posting) and description HTML of a job page.
+
+    requires_browser is set for verification and JavaScript pages, which have no job data.
+    Pages that link out to another site have no job component, so description_html is the whole body,
+    the same fallback get_job_html uses.
+    """
+    if requires_browser(html):
+        return {'requires_browser': True, 'job_title': None, 'employer': None, 'location': None,
+                'salary_and_job_type': None, 'description_html': None, 'job_posting': {}}
+    soup = BeautifulSoup(html, parser)
+    component = soup.find(class_='jobsearch-JobComponent')
+    if component is not None:
+        description_html = component.decode_contents()
+    else:
+        description_html = soup.body.decode_contents() if soup.body is not None else html
+    return {
+        'requires_browser': False,
+        'job_title': _text(soup.select_one('.jobsearch-JobInfoHeader-title')),
+        'employer': _text(soup.select_one('[data-testid="inlineHeader-companyName"]')),
+        'location': _text(soup.select_one('[data-testid="inlineHeader-companyLocation"]')),
+        'salary_and_job_type': _text(soup.select_one('#salaryInfoAndJobType')),
+        'description_html': description_html,
+        'job_posting': job_posting_data(soup)
+    }
@@ -2,22 +2,94 @@
 import logging
 import time
 import json
+import itertools
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
 import pyautogui
-from markdownify import markdownify as md
-import re
 
 # Custom code 
 from database_tools import DatabaseTools
 from selenium_base import SeleniumScraper, Browsers
+from http_fetcher import HttpJobFetcher
+from task_queue import DescriptionQueue
+from indeed_parsers import parse_job_cards, parse_mosaic_job_cards, mosaic_job_cards, requires_browser
+from html_cache import HtmlCache
+from metrics import LatencyHistogram, report_run
+import markdown_pipeline
+from near_duplicates import skip_reposts
+from description_store import compact_descriptions
+from job_details_extractor import extract_new_details
+
+# Reads every job card on a results page in one WebDriver round trip, instead of several find_element calls per card.
+EXTRACT_JOB_CARDS_JS = """
+return Array.from(document.querySelectorAll('.cardOutline')).map(function (card) {
+    var titleLink = card.querySelector('.jobTitle a');
+    var title = card.querySelector('.jcs-JobTitle');
+    var link = card.querySelector('a');
+    var employer = card.querySelector('[data-testid="company-name"]');
+    var location = card.querySelector('[data-testid="text-location"]');
+    var salary = card.querySelector('.salary-snippet-container');
+    var attributes = Array.from(card.querySelectorAll(
+        '.metadata:not(.salary-snippet-container) [data-testid="attribute_snippet_testid"]'
+    )).map(function (attribute) { return attribute.innerText.trim(); });
+    return {
+        job_unique_id: titleLink && titleLink.id ? titleLink.id : null,
+        job_title: title ? title.innerText.trim() : null,
+        job_link: link ? link.href : null,
+        employer: employer ? employer.innerText.trim() : null,
+        job_location: location ? location.innerText.trim() : null,
+        salary_text: salary ? salary.innerText.trim() : null,
+        employment_type: attributes.length ? attributes.join(', ') : null,
+        source: 'dom'
+    };
+});
+"""
+
+# The results page's inline job data, as a JSON string (much cheaper over WebDriver than the object itself)
+MOSAIC_JOB_CARDS_JS = """
+var data = window.mosaic && window.mosaic.providerData && window.mosaic.providerData["mosaic-provider-jobcards"];
+return data ? JSON.stringify(data) : null;
+"""
+
+# The job component's HTML followed by the page's JSON-LD job data, or the whole body for pages that link out
+JOB_PAGE_HTML_JS = """
+var component = document.querySelector('.jobsearch-JobComponent');
+if (!component) { return document.body ? document.body.innerHTML : null; }
+return component.innerHTML + Array.from(document.querySelectorAll('script[type="application/ld+json"]'))
+    .map(function (script) { return script.outerHTML; }).join('');
+"""
+
+# True while the page shows a human verification challenge. Checked in the browser, so the page source
+# doesn't have to be sent over the WebDriver connection and searched on every page.
+VERIFICATION_JS = """
+var text = document.body ? document.body.innerText : '';
+return text.indexOf('Verify you are human') !== -1 || text.indexOf('Verifying you are human') !== -1
+    || !!document.querySelector('iframe[src*="challenges.cloudflare.com"], #challenge-form');
+"""
+
+# What a job page is showing right now: the job component, the human verification check,
+# a fully loaded page without the component (external link-out), or null while it is still loading.
+DESCRIPTION_STATE_JS = """
+if (document.querySelector('.jobsearch-JobComponent')) { return 'component'; }
+if (document.body && document.body.innerText.indexOf('Verifying you are human') !== -1) { return 'verifying'; }
+return document.readyState === 'complete' ? 'page' : null;
+"""
 
 
 class IndeedScraper(SeleniumScraper):
     """Initializes the Indeed Scraper with the specified browser and database settings."""
     print('Indeed Scraper Initialized')
-    def __init__(self, browser: str = Browsers.CHROME, use_database: bool = False):
-        super().__init__(browser=browser, use_database=use_database)
+    def __init__(self, browser: str = Browsers.CHROME, use_database: bool = False, wait_timeouts: dict = None,
+                 performance_profile: bool = False, html_cache: HtmlCache = None, rate_controller=None,
+                 recycle_after_pages: int = 200, capture_json: bool = True):
+        super().__init__(browser=browser, use_database=use_database, wait_timeouts=wait_timeouts,
+                         performance_profile=performance_profile, rate_controller=rate_controller,
+                         recycle_after_pages=recycle_after_pages)
         self.session_id = None
+        # Read job cards from the results page's inline JSON, only scraping the card elements when it isn't there
+        self.capture_json = capture_json
+        # Raw job page HTML is saved here (if set) so descriptions can be rebuilt without refetching
+        self.html_cache = html_cache
 
     """Type Parameters for Indeed Scraper"""
     class SortBy:
@@ -112,6 +184,41 @@ class IndeedScraper(SeleniumScraper):
         logging.log(logging.INFO, f'Filter items found: {menu_items}')
         return menu_items
 
+    def extract_job_cards(self, from_page_source: bool = False):
+        """Returns the id, title, link, employer, location, pay and job type of every job card on the results page.
+
+        With capture_json the cards come from the page's inline job data (see indeed_parsers.mosaic_job_cards),
+        which also has the structured pay, snippet and posting time. Otherwise, or if the page doesn't have it,
+        the card elements are read. Either way it is a single execute_script call, or with from_page_source=True
+        the page source is downloaded once and parsed locally instead.
+        """
+        with self.latency.time('extract_cards'):
+            cards = None
+            if from_page_source:
+                html = self.driver.page_source
+                if self.capture_json:
+                    cards = parse_mosaic_job_cards(html, base_url=self.driver.current_url)
+                if not cards:
+                    cards = parse_job_cards(html, base_url=self.driver.current_url)
+            else:
+                if self.capture_json:
+                    cards = self.capture_job_cards()
+                if not cards:
+                    cards = self.driver.execute_script(EXTRACT_JOB_CARDS_JS)
+        logging.log(logging.INFO, f'Job cards found: {len(cards)}')
+        return cards
+
+    def capture_job_cards(self):
+        """Returns the job cards in the page's inline job data, or None if the page doesn't have it."""
+        data = self.driver.execute_script(MOSAIC_JOB_CARDS_JS)
+        try:
+            cards = mosaic_job_cards(json.loads(data), base_url=self.driver.current_url) if data else None
+        except ValueError:
+            cards = None
+        if not cards:
+            logging.log(logging.INFO, 'No inline job data on the results page, reading the job cards instead')
+        return cards
+
     def get_current_url(self):
         logging.log(
             logging.INFO, f'Getting current url: {self.driver.current_url}')
@@ -122,9 +229,10 @@ class IndeedScraper(SeleniumScraper):
     def close_popup(self):
         try:
             logging.log(logging.INFO, 'Closing popup')
-            self.driver.find_element(
-                by=By.CSS_SELECTOR, value='button[aria-label="close"]').click()
-            time.sleep(1)
+            button = self.driver.find_element(
+                by=By.CSS_SELECTOR, value='button[aria-label="close"]')
+            button.click()
+            self.wait_for(EC.invisibility_of_element(button), 'popup_closed', 'popup')
         except:
             pass
 
@@ -138,123 +246,168 @@ class IndeedScraper(SeleniumScraper):
         self.driver.find_element(
             by=By.CSS_SELECTOR, value='a[data-testid="pagination-page-prev"]').click()
 
+    def is_verification_page(self):
+        return bool(self.driver.execute_script(VERIFICATION_JS))
+
     # !!!! TODO: This function doesnt work on all resolutions and browsers. Also it should minimize back. Full-screen indeed is bright.
     def requires_human_verification(self):
-        logging.log(logging.INFO, 'Checking for human verification')
+        logging.log(logging.DEBUG, 'Checking for human verification')
         # works on 1080 * 1920 resolution, with firefox browser
-        if 'Verify' in str(self.driver.page_source):
+        if self.is_verification_page():
             logging.log(logging.INFO, 'Human verification required')
+            # go_to_url already told the rate controller, so every scraper on this domain slows down
+            # fullscreen_window only returns once the window has been resized
             self.driver.fullscreen_window()
-            time.sleep(2)
             where = {
                 Browsers.FIREFOX: {'x': 537, 'y': 286}
             }
             pyautogui.click(where[self.browser]['x'], where[self.browser]['y'])
-            time.sleep(2)
+            self.wait_for(lambda driver: not self.is_verification_page(), 'verification_cleared', 'verification')
             self.driver.minimize_window()
             return True
         else:
             return False
 
+    """Waiting Functions"""
+
+    def wait_for_job_cards(self):
+        return self.wait_for(EC.presence_of_element_located((By.CLASS_NAME, 'cardOutline')), 'cards_present', 'page_load')
+
+    def wait_for_description(self):
+        """Waits until the job page shows its description (or an external page), not while it's verifying."""
+        return self.wait_for(
+            lambda driver: driver.execute_script(DESCRIPTION_STATE_JS) in ('component', 'page'),
+            'description_ready', 'page_load')
+
     """Main Functions"""
 
-    def search_for_jobs(self, max_pages=2, **search_params):
-        """Collects job listings from the current page and returns them as a list of dictionaries."""
+    def search_for_jobs(self, max_pages=2, incremental=False, known_ratio=0.9, on_new_postings=None, resume=True,
+                        **search_params):
+        """Collects job listings from the current page and returns them as a list of dictionaries.
 
-        current_page = 0
+        With incremental=True paging stops once at least known_ratio of a page's cards are already in the
+        database. Only makes sense with sort_by=date, where everything after that page is older still.
+        on_new_postings, if given, is called after each page with the cards that weren't in the database yet.
+        With resume=True an unfinished session of the same search from the last day carries on after its last
+        completed page. The browser is left open for whatever runs next, close it with close_browser().
+        """
 
-        self.open_browser(wait_seconds=0)
+        current_page = 0
+        new_postings = 0
+        seen_postings = 0
+        self.session_id = None
+        # Timings are reported per search session
+        started = time.perf_counter()
+        self.latency = LatencyHistogram()
+        if incremental and search_params.get('sort_by') != self.SortBy.DATE:
+            print('Incremental search works best sorted by date, results sorted by relevance are not chronological.')
+
+        # reusing one connection for the whole search
+        if self.database is None:
+            self.database = DatabaseTools()
+        self.database.latency = LatencyHistogram()
+        search_key = json.dumps(search_params, sort_keys=True)
+        checkpoint = self.database.find_resumable_session(search_key)
+        if checkpoint is not None and resume and checkpoint[1] < max_pages:
+            self.session_id, current_page, new_postings, seen_postings = checkpoint
+            print(f'Resuming session {self.session_id} after page {current_page}.')
+        elif checkpoint is not None:
+            # Restarted, or it already has the pages asked for: a new session takes over, so end this one
+            self.database.end_session(checkpoint[0])
+            print(f'Ended unfinished session {checkpoint[0]} after page {checkpoint[1]}, starting a new one.')
+        first_page = current_page
 
         self.url = self.build_query_url(
             page_number=current_page+1, **search_params)
 
         self.go_to_url(self.url)
 
-        time.sleep(1)
-        filter_items = self.get_filter_items()
+        self.wait_for_job_cards()
 
-        # create a new search session record in the database
-        db_tools = DatabaseTools()
-        self.session_id = db_tools.start_new_session(
-            terms=search_params['keywords'],
-            location=search_params['location'],
-            filter_tags=str(json.dumps(filter_items)),
-            n_pages=max_pages
-        )
+        if self.session_id is None:
+            # create a new search session record in the database, unless one was resumed
+            filter_items = self.get_filter_items()
+            self.session_id = self.database.start_new_session(
+                terms=search_params['keywords'],
+                location=search_params['location'],
+                filter_tags=str(json.dumps(filter_items)),
+                n_pages=max_pages,
+                search_params=search_key
+            )
 
-        for page in range(max_pages):
+        for page in range(first_page, max_pages):
             print(f'Page {current_page+1} of {max_pages}')
+            page_started = time.perf_counter()
             if current_page <= max_pages:
                 self.current_url = self.get_current_url()
-                if current_page != 0:
+                if current_page != first_page:
                     self.url = self.build_query_url(
                         page_number=current_page+1, **search_params)
                     self.go_to_url(self.url)
+                    self.wait_for_job_cards()
                 self.close_popup()
                 self.requires_human_verification()
 
                 # Isolate the job cards on the page. Each card is a job listing.
-                job_cards = self.driver.find_elements(
-                    By.CLASS_NAME, 'cardOutline')
-
-                for job in job_cards:
-
-                    try:  # to get the unique id of the job
-                        job_unique_id = job.find_element(By.CLASS_NAME, 'jobTitle').find_element(
-                            By.TAG_NAME, 'a').get_attribute('id')
-                    except:
-                        job_unique_id = None
-
-                    try:  # to get the job title
-                        job_title = job.find_element(
-                            By.CLASS_NAME, 'jcs-JobTitle').text
-                    except:
-                        print('no job title')
-                        job_title = None
-
-                    try:  # to get the job link
-                        job_link = job.find_element(
-                            By.TAG_NAME, 'a').get_attribute('href')
-                    except:
-                        print('no job link')
-                        job_link = None
-
-                    # Build the job object
-                    obj = {
-                        'job_unique_id': job_unique_id,
-                        'job_title': job_title,
-                        'job_link': job_link,
-                        'session_id': self.session_id
-                    }
-                    db = DatabaseTools()
-                    db.update_job_postings(obj)
+                page_postings = []
+                for card in self.extract_job_cards():
+                    card['session_id'] = self.session_id
+                    page_postings.append(card)
+
+                if on_new_postings is not None:
+                    known = self.database.known_job_ids([card['job_unique_id'] for card in page_postings])
+                    new_cards = [card for card in page_postings if card['job_unique_id'] not in known]
+
+                # Write the whole page in one transaction, duplicates are ignored and not counted as new
+                page_new = self.database.insert_job_postings(page_postings)
+                if on_new_postings is not None:
+                    on_new_postings(new_cards)
+                page_seen = len(page_postings) - page_new
+                new_postings += page_new
+                seen_postings += page_seen
 
                 # Prepare to switch pages. Saving the last working link is helful for error handling.
                 self.previous_url = self.get_current_url()
 
                 current_page += 1
-        self.close_browser()
+                # Checkpoint, a crash from here on resumes with the next page
+                self.database.update_session_counts(self.session_id, current_page, new_postings, seen_postings,
+                                                    last_url=self.url)
+            self.latency.observe('results_page', time.perf_counter() - page_started)
+
+            if incremental and page_postings and page_seen / len(page_postings) >= known_ratio:
+                print(f'{page_seen} of {len(page_postings)} postings on page {current_page} were already known. Stopping.')
+                break
+        print(f'Session {self.session_id}: {new_postings} new and {seen_postings} already known postings over {current_page} pages.')
+        self.database.end_session(self.session_id)
+        self.latency.merge(self.database.latency)
+        report_run('search', self.latency, time.perf_counter() - started, pages=current_page,
+                   jobs=new_postings + seen_postings, db=self.database, session_id=self.session_id)
 
     """Obtaining and parsing the job description from the job page."""
 
-    def get_job_html(self, url: str):
+    def get_job_html(self, url: str, job_unique_id: str = None):
+        """Returns the job description HTML for url. With an html_cache and a job_unique_id, cached pages are
+        returned without loading the page, and freshly loaded ones are added to the cache."""
+        with self.latency.time('get_job_html'):
+            return self._get_job_html(url, job_unique_id)
+
+    def _get_job_html(self, url, job_unique_id):
+        if self.html_cache is not None and job_unique_id is not None:
+            cached_html = self.html_cache.get(job_unique_id)
+            if cached_html is not None:
+                return cached_html
 
         def get_description_html():
-            try:
-                description_element = self.driver.find_element(
-                    By.CLASS_NAME, 'jobsearch-JobComponent')
-                return description_element.get_attribute('innerHTML')
-            except:
-                
-                # Sometimes in indeed the job description links out to a different website, and not the "jobsearch-JobComponent" class.
-                # This is a workaround to get the job description in those cases. We'll just get the entire page.
-                ele = self.driver.find_element(By.TAG_NAME, 'body').get_attribute('innerHTML')
-                if 'Verifying you are human' in ele:
-                    time.sleep(1)
-                    self.requires_human_verification()
-                else:
-                    return ele
+            # The job component and its JSON-LD job data in one round trip. Sometimes in indeed the job description
+            # links out to a different website, and not the "jobsearch-JobComponent" class, then it's the entire page.
+            ele = self.driver.execute_script(JOB_PAGE_HTML_JS)
+            if ele is None or 'Verifying you are human' in ele:
+                self.requires_human_verification()
+            else:
+                return ele
         self.go_to_url(url)
+        self.wait_for_description()
 
         try:
             description_html = get_description_html()
@@ -264,63 +417,158 @@ class IndeedScraper(SeleniumScraper):
             try:
                 description_html = get_description_html()
             except:
-                time.sleep(3)
+                self.wait_for_description()
                 self.requires_human_verification()
                 description_html = get_description_html()
 
+        if (self.html_cache is not None and job_unique_id is not None
+                and description_html is not None and not requires_browser(description_html)):
+            self.html_cache.put(job_unique_id, description_html)
         return description_html
 
     def html_to_markdown(self, description_html: str):
-        md_text = md(description_html)
+        md_text = markdown_pipeline.html_to_markdown(description_html)
         logging.log(logging.DEBUG, md_text)
         return md_text
 
     def remove_links_from_markdown(self, markdown, replace_with: str = '<url removed>'):
-        def replace_link(match):
-            return f"[{match.group(1)}]({replace_with})"
-        pattern = r'\[([^]]+)]\(([^)]+)\)'
-        return re.sub(pattern, replace_link, markdown).replace('\n', '')
-
-
-def main(max_pages=15, dont_search=False, dont_update_job_descriptions=False, **search_params):
+        return markdown_pipeline.remove_links_from_markdown(markdown, replace_with)
+
+
+def http_fast_path(converter, postings, html_cache=None, chunk_size=500):
+    """Fetches postings over HTTP a chunk at a time, saves what worked and yields the ones that need a browser."""
+    fetcher = HttpJobFetcher()
+    postings = iter(postings)
+    while True:
+        chunk = list(itertools.islice(postings, chunk_size))
+        if not chunk:
+            break
+        fetched, fallbacks = fetcher.run(chunk)
+        for job_unique_id, job_html in fetched:
+            if html_cache is not None:
+                html_cache.put(job_unique_id, job_html)
+            converter.add(job_unique_id, job_html)
+        yield from fallbacks
+
+
+def reconvert_from_cache(html_cache: HtmlCache = None, processes=None, batch_size=100):
+    """Rebuilds the markdown description of every job posting whose page is cached, on all cores, without the network.
+
+    Saved through DescriptionQueue.finish like fetched pages, so open tasks are closed, tasks leased to a running
+    scraper are left to it and the near-duplicate index sees the new text.
+    """
+    html_cache = html_cache or HtmlCache()
+    db = DatabaseTools()
+    task_queue = DescriptionQueue(db)
+    n_postings = db.run_sql('SELECT COUNT(*) FROM job_postings')[0][0]
+    stats = markdown_pipeline.convert_all(
+        html_cache.iter_entries(), sink=lambda results: task_queue.finish(results, rewrite_done=True),
+        processes=processes, batch_size=batch_size)
+    db.close()
+    print(f"Reconverted {stats['documents']} cached job pages ({n_postings} postings in the database) "
+          f"in {stats['seconds']:.1f}s: {stats['documents'] / max(stats['seconds'], 1e-9):.1f} docs/sec, "
+          f"{stats['megabytes'] / max(stats['seconds'], 1e-9):.2f} MB/sec of HTML.")
+    return stats
+
+
+def main(max_pages=15, dont_search=False, dont_update_job_descriptions=False, description_batch_size=25, workers=1, use_http=False, performance_profile=False, incremental=False, use_html_cache=True, fetch_reposts=False, resume=True, backend='selenium', tabs=8, **search_params):
     print(f'Searching for {search_params["keywords"]} jobs in {search_params["location"]}.')
+    if backend == 'playwright':
+        if workers > 1:
+            raise ValueError('workers only applies to the Selenium backend, the Playwright backend fetches on tabs.')
+        # imported here because playwright is optional, and the backend builds on this module
+        from playwright_backend import main as playwright_main
+        return playwright_main(max_pages=max_pages, dont_search=dont_search,
+                               dont_update_job_descriptions=dont_update_job_descriptions,
+                               description_batch_size=description_batch_size, tabs=tabs, use_http=use_http,
+                               performance_profile=performance_profile, incremental=incremental,
+                               use_html_cache=use_html_cache, fetch_reposts=fetch_reposts, resume=resume,
+                               **search_params)
     # Run the Scraper to collect job postings
-    scraper = IndeedScraper(browser=Browsers.FIREFOX, use_database=False)
+    html_cache = HtmlCache() if use_html_cache else None
+    scraper = IndeedScraper(browser=Browsers.FIREFOX, use_database=False, performance_profile=performance_profile,
+                            html_cache=html_cache)
    
     if dont_search:
         print(f'Skipping search. Only updating job descriptions.')
     else:
         print(f'Searching for {max_pages} pages of job postings.')
-        scraper.search_for_jobs(max_pages=max_pages, **search_params)
+        try:
+            scraper.search_for_jobs(max_pages=max_pages, incremental=incremental, resume=resume, **search_params)
+        except Exception:
+            scraper.close_browser()
+            raise
 
     if dont_update_job_descriptions:
         print('Skipping job description updates.')
+        scraper.close_browser()
     else:
-        # Determine which job postings need to be updated
+        # Work comes from the description_tasks queue. Tasks are leased a batch at a time, so several
+        # processes can share the backlog, and an interrupted run resumes where it stopped.
         db = DatabaseTools()
-        df = db.sql_to_df(
-            '''SELECT * FROM job_postings WHERE 
-            (job_description IS NULL or job_description like '' 
-            or job_description like 'Verify% you are human'
-            or job_description like '%nable JavaScript%') 
-            and job_link is not null''')
-        if len(df.index) == 0:
-            print('No job postings to update.')
-            exit()
+        task_queue = DescriptionQueue(db)
+        task_queue.enqueue_pending()
+        n_pending = task_queue.counts().get('pending', 0)
+        print(f'Description tasks: {task_queue.counts()}')
+        # Descriptions saved before the near-duplicate index existed are indexed once, then kept up to date by finish()
+        task_queue.duplicate_index.update()
+        postings = task_queue.iter_claims(description_batch_size)
+        # Reposts of a role we already have (same title, employer and location) get a copy instead of a fetch
+        if not fetch_reposts:
+            postings = skip_reposts(postings, task_queue)
+        # Timings for the description run, separate from the search's
+        scraper.latency = LatencyHistogram()
+        started = time.perf_counter()
+        # HTML to markdown runs on a process pool, so the browser can move on to the next page right away
+        converter = markdown_pipeline.MarkdownConverter(sink=task_queue.finish, batch_size=description_batch_size,
+                                                        latency=scraper.latency)
+
+        # Try plain HTTP first, only the pages that need a real browser go on to Selenium.
+        if use_http:
+            postings = http_fast_path(converter, postings, html_cache)
 
         # For each job posting without a description, get the description from the job link and update the database.
-        print(f'Updating {len(df.index)} job postings.')
-        scraper.open_browser()
-        for index, row in df.iterrows():
-            # job number and url
-            print(f'Job {index+1} of {len(df.index)}: {row["job_link"]}')
-            job_html = scraper.get_job_html(row['job_link'])
-            if job_html is not None:
-                job_markdown = scraper.html_to_markdown(job_html)
-                db.update_job_posting_description(
-                    row['job_unique_id'], job_markdown)
-        scraper.close_browser()
+        if workers > 1:
+            # imported here because description_workers builds on this module
+            from description_workers import DescriptionWorkerPool
+            pool = DescriptionWorkerPool(workers=workers, browser=scraper.browser, batch_size=description_batch_size,
+                                         performance_profile=performance_profile, html_cache=html_cache,
+                                         task_owner=task_queue.owner)
+            # The pool opens its own browsers
+            scraper.close_browser()
+            try:
+                pool.run(postings)
+            finally:
+                converter.close()
+                task_queue.release()
+                db.close()
+                if html_cache is not None:
+                    html_cache.log_stats()
+            print('All job postings updated.')
+            compact_descriptions()
+            extract_new_details(html_cache=html_cache)
+            return
+        # Carries on in the search's browser, which is still warm
+        try:
+            for index, (job_unique_id, job_link) in enumerate(postings):
+                # job number and url
+                print(f'Job {index+1} of about {n_pending}: {job_link}')
+                # Converted and saved in batches, so a crash only loses the last few descriptions
+                converter.add(job_unique_id, scraper.get_job_html(job_link, job_unique_id))
+        finally:
+            converter.close()
+            task_queue.release()
+            db.close()
+            scraper.close_browser()
+        scraper.latency.merge(db.latency)
+        report_run('descriptions', scraper.latency, time.perf_counter() - started, jobs=converter.converted, db=db)
+        if html_cache is not None:
+            html_cache.log_stats()
         print('All job postings updated.')
+        # Trains a compression dictionary once enough descriptions are stored
+        compact_descriptions()
+        # Fill job_details for the postings that just got a description
+        extract_new_details(html_cache=html_cache)
 
 
 # if __name__ == '__main__':
@@ -0,0 +1,239 @@
+# Rule-based extraction of the job_details columns from stored description markdown (and cached page HTML).
+# No network and no models, so it can be re-run over every posting whenever the rules change.
+import logging
+import re
+import time
+
+# Custom code
+from database_tools import DatabaseTools
+from indeed_parsers import parse_job_detail, PERIODS
+
+# "$65,000 - $80,000 a year", "$25.50 to $30 an hour", "$90K-$110K per year", "From $20 an hour", "Up to $70,000 a year"
+SALARY_PATTERN = re.compile(
+    r'(?P<prefix>from|up to|starting at)?\s*'
+    r'\$\s?(?P<low>\d[\d,]*(?:\.\d+)?)\s?(?P<low_k>[kK])?'
+    r'(?:\s?(?:-|–|to)\s?\$?\s?(?P<high>\d[\d,]*(?:\.\d+)?)\s?(?P<high_k>[kK])?)?'
+    r'\s*(?:an?|per|/)?\s*(?P<period>hour|hourly|hr|day|daily|week|weekly|month|monthly|year|yearly|annum|annually|annual)\b',
+    re.IGNORECASE)
+
+EMPLOYMENT_TYPES = ['Full-time', 'Part-time', 'Contract', 'Temporary', 'Internship', 'Permanent', 'Freelance',
+                    'Casual', 'Seasonal']
+EMPLOYMENT_TYPE_PATTERNS = [(name, re.compile(r'\b' + name.replace('-', r'[\s-]?') + r'\b', re.IGNORECASE))
+                            for name in EMPLOYMENT_TYPES]
+
+WORK_ENVIRONMENTS = [('Remote', re.compile(r'\bremote\b', re.IGNORECASE)),
+                     ('Hybrid', re.compile(r'\bhybrid\b', re.IGNORECASE)),
+                     ('On-site', re.compile(r'\bon[\s-]?site\b|\bin[\s-]person\b', re.IGNORECASE))]
+
+EDUCATION_LEVELS = [('PhD', re.compile(r'\bph\.?\s?d\b|\bdoctorate\b', re.IGNORECASE)),
+                    ("Master's", re.compile(r"\bmaster'?s\b|\bM\.?Sc?\b|\bMBA\b")),
+                    ("Bachelor's", re.compile(r"\bbachelor'?s\b|\bB\.?Sc?\b|\bundergraduate degree\b", re.IGNORECASE)),
+                    ("Associate", re.compile(r"\bassociate'?s degree\b", re.IGNORECASE)),
+                    ('High school', re.compile(r'\bhigh school\b|\bGED\b', re.IGNORECASE))]
+
+# Matched case-insensitively on word boundaries, add to this as new tools show up in postings
+SKILLS = ['Python', 'SQL', 'R', 'Excel', 'Power BI', 'Tableau', 'Looker', 'pandas', 'NumPy', 'Spark', 'Hadoop',
+          'Airflow', 'dbt', 'Snowflake', 'BigQuery', 'Redshift', 'Databricks', 'AWS', 'Azure', 'GCP', 'Docker',
+          'Kubernetes', 'Terraform', 'Java', 'Scala', 'Go', 'JavaScript', 'TypeScript', 'React', 'Node.js', 'C++',
+          'C#', '.NET', 'SAS', 'SPSS', 'Stata', 'MATLAB', 'Git', 'Linux', 'PostgreSQL', 'MySQL', 'MongoDB',
+          'Kafka', 'machine learning', 'statistics', 'ETL', 'data modeling', 'A/B testing', 'Salesforce', 'SAP']
+# R and Go are only counted in their capitalized form, they're common words otherwise
+CASE_SENSITIVE_SKILLS = {'R', 'Go'}
+# One alternation for every skill, so a description is scanned once instead of once per skill
+SKILL_PATTERN = re.compile(r'(?<![\w.+#])(' + '|'.join(re.escape(skill) for skill in sorted(SKILLS, key=len, reverse=True))
+                           + r')(?![\w+#])', re.IGNORECASE)
+SKILL_NAMES = {skill.lower(): skill for skill in SKILLS}
+
+EXPERIENCE_PATTERN = re.compile(r'(\d+)\+?\s*(?:-\s*\d+\s*)?years?', re.IGNORECASE)
+SENIORITY_PATTERNS = [('Internship', re.compile(r'\bintern(ship)?\b', re.IGNORECASE)),
+                      ('Entry level', re.compile(r'\bentry[\s-]level\b|\bjunior\b|\bjr\.?\b', re.IGNORECASE)),
+                      ('Senior', re.compile(r'\bsenior\b|\bsr\.?\b|\blead\b|\bprincipal\b|\bstaff\b', re.IGNORECASE))]
+DEADLINE_PATTERN = re.compile(r'(?:application deadline|apply by|applications close)\W*([^\n]{4,40})', re.IGNORECASE)
+
+# A markdown heading: "# Title", "**Title**" alone on a line, or a line underlined with === / ---
+HEADING_PATTERN = re.compile(r'^(?:#{1,6}\s*(?P<hash>.+?)|\*\*(?P<bold>[^*]+?):?\*\*:?)\s*$')
+UNDERLINE_PATTERN = re.compile(r'^(=+|-+)\s*$')
+BULLET_PATTERN = re.compile(r'^\s*[*+-]\s+(.*)$')
+LINK_PATTERN = re.compile(r'\[([^]]*)]\([^)]*\)')
+
+RESPONSIBILITY_HEADINGS = ('responsibilit', "what you'll do", 'what you will do', 'duties', 'the role', 'your role')
+BENEFIT_HEADINGS = ('benefit', 'perks', 'what we offer')
+SUMMARY_HEADINGS = ('about the role', 'summary', 'overview', 'about the job', 'position')
+
+SUMMARY_LENGTH = 500
+
+# job_card_data columns passed to extract_job_details with the posting
+CARD_DATA_FIELDS = ['salary_text', 'salary_min', 'salary_max', 'salary_period', 'employment_type', 'snippet', 'remote']
+
+
+def parse_salary(text: str):
+    """Returns (salary_text, salary_min, salary_max, salary_period) for the first pay range in text, or all None."""
+    match = SALARY_PATTERN.search(text or '')
+    if match is None:
+        return None, None, None, None
+
+    def amount(value, thousands):
+        number = float(value.replace(',', ''))
+        return number * 1000 if thousands else number
+
+    low_k, high_k = match.group('low_k'), match.group('high_k')
+    # "$50-60k": the k applies to both ends, but not in "$45,000-60k"
+    if low_k is None and high_k and amount(match.group('low'), False) <= amount(match.group('high'), False):
+        low_k = high_k
+    low = amount(match.group('low'), low_k)
+    high = amount(match.group('high'), high_k) if match.group('high') else None
+    prefix = (match.group('prefix') or '').lower()
+    if high is None:
+        # "Up to $X" is only a maximum, "From $X" or a bare amount is a minimum and a maximum
+        low, high = (None, low) if prefix == 'up to' else (low, None if prefix else low)
+    return match.group(0).strip(), low, high, PERIODS[match.group('period').lower()]
+
+
+def split_sections(markdown: str):
+    """Splits description markdown into [(heading, lines)], the text before the first heading has heading ''."""
+    sections = [('', [])]
+    lines = markdown.splitlines()
+    for i, line in enumerate(lines):
+        if UNDERLINE_PATTERN.match(line) and i > 0 and sections[-1][1] and sections[-1][1][-1] == lines[i - 1]:
+            # The previous line was an underlined heading, not content
+            sections[-1][1].pop()
+            sections.append((lines[i - 1].strip(), []))
+            continue
+        heading = HEADING_PATTERN.match(line.strip())
+        if heading is not None:
+            sections.append(((heading.group('hash') or heading.group('bold')).strip(), []))
+        elif line.strip():
+            sections[-1][1].append(line)
+    return sections
+
+
+def _bullets_under(sections, headings):
+    items = []
+    for heading, lines in sections:
+        if any(name in heading.lower() for name in headings):
+            items.extend(LINK_PATTERN.sub(r'\1', bullet.group(1)).strip()
+                         for bullet in map(BULLET_PATTERN.match, lines) if bullet is not None)
+    return items
+
+
+def _summary(sections):
+    # The "About the role" paragraph if there is one, otherwise the first real paragraph of the description
+    candidates = [lines for heading, lines in sections if any(name in heading.lower() for name in SUMMARY_HEADINGS)]
+    candidates += [lines for _, lines in sections]
+    for lines in candidates:
+        for line in lines:
+            text = LINK_PATTERN.sub(r'\1', line).strip()
+            if BULLET_PATTERN.match(line) is None and len(text.split()) >= 8:
+                return text[:SUMMARY_LENGTH]
+    return None
+
+
+def _matches(patterns, text):
+    return [name for name, pattern in patterns if pattern.search(text)]
+
+
+def _skills(text):
+    found = set()
+    for match in SKILL_PATTERN.findall(text):
+        skill = SKILL_NAMES[match.lower()]
+        if skill not in CASE_SENSITIVE_SKILLS or match == skill:
+            found.add(skill)
+    return [skill for skill in SKILLS if skill in found]
+
+
+def extract_job_details(markdown: str, html: str = None, posting: dict = None):
+    """Returns a job_details record for one job, from its description markdown.
+
+    html (the job page) supplies the header fields and JSON-LD job data when the page is cached, and posting
+    (the job_postings row with its job_card_data) the employer, location and structured pay from the search card.
+    Structured values are used over what the rules find in the text. Fields that can't be found are None.
+    """
+    posting = posting or {}
+    header = parse_job_detail(html) if html else {}
+    job_posting = header.get('job_posting') or {}
+    sections = split_sections(markdown)
+    text = LINK_PATTERN.sub(r'\1', markdown)
+    title = posting.get('job_title') or header.get('job_title') or ''
+
+    salary_text, salary_min, salary_max, salary_period = parse_salary(
+        posting.get('salary_text') or header.get('salary_and_job_type') or text)
+    for structured in (job_posting, posting):
+        if structured.get('salary_min') is not None or structured.get('salary_max') is not None:
+            salary_min, salary_max = structured.get('salary_min'), structured.get('salary_max')
+            salary_period = structured.get('salary_period') or salary_period
+            break
+    experience_years = [int(years) for years in EXPERIENCE_PATTERN.findall(text) if int(years) < 40]
+    seniority = _matches(SENIORITY_PATTERNS, title)
+    if seniority:
+        experience_level = seniority[0]
+    elif experience_years:
+        experience_level = f'{min(experience_years)}+ years'
+    else:
+        experience_level = None
+    deadline = DEADLINE_PATTERN.search(text)
+
+    def joined(values):
+        return ', '.join(values) if values else None
+
+    return {
+        'job_unique_id': posting.get('job_unique_id'),
+        'position_summary': _summary(sections) or posting.get('snippet'),
+        'salary': salary_text,
+        'salary_min': salary_min,
+        'salary_max': salary_max,
+        'salary_period': salary_period,
+        'location': posting.get('job_location') or header.get('location') or job_posting.get('location'),
+        'employer': posting.get('employer') or header.get('employer') or job_posting.get('employer'),
+        'education': joined(_matches(EDUCATION_LEVELS, text)),
+        'key_skills': joined(_skills(text)),
+        'employment_type': posting.get('employment_type') or job_posting.get('employment_type')
+        or joined(_matches(EMPLOYMENT_TYPE_PATTERNS, header.get('salary_and_job_type') or text)),
+        'work_environment': joined(_matches(WORK_ENVIRONMENTS, ' '.join(
+            [posting.get('job_location') or '', 'remote' if posting.get('remote') or job_posting.get('remote') else '',
+             text]))),
+        'experience_level': experience_level,
+        'responsibilities': joined(_bullets_under(sections, RESPONSIBILITY_HEADINGS)),
+        'benefits': joined(_bullets_under(sections, BENEFIT_HEADINGS)),
+        'application_deadline': job_posting.get('valid_through') or (deadline.group(1).strip() if deadline else None),
+        # Only when the job page's JSON-LD states it, the text doesn't say it in a consistent place
+        'industry': job_posting.get('industry'),
+    }
+
+
+def extract_new_details(db: DatabaseTools = None, html_cache=None, chunk_size: int = 500, force: bool = False):
+    """Fills job_details for every posting with a description but no details yet, chunk_size postings per transaction.
+
+    With an HtmlCache, cached job pages are used for the header fields. force=True re-extracts every posting,
+    e.g. after the rules change. Returns the number of postings processed.
+    """
+    db = db or DatabaseTools()
+    started = time.perf_counter()
+    where_new = '' if force else 'AND NOT EXISTS (SELECT 1 FROM job_details d WHERE d.job_unique_id = p.job_unique_id)'
+    n_extracted = 0
+    last_id = 0
+    while True:
+        # Keyset paging, so each chunk is an index range scan and rows written in between don't shift the pages
+        rows = list(db.iter_query(f'''
+            SELECT p.id, p.job_unique_id, p.job_title, p.employer, p.job_location, p.job_description,
+                c.salary_text, c.salary_min, c.salary_max, c.salary_period, c.employment_type, c.snippet, c.remote
+            FROM job_postings_full p
+            LEFT JOIN job_card_data c ON c.job_unique_id = p.job_unique_id
+            WHERE p.id > ? AND p.description_status = 'done' {where_new}
+            ORDER BY p.id
+            LIMIT ?
+        ''', (last_id, chunk_size)))
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        details = []
+        for _, job_unique_id, job_title, employer, job_location, job_description, *card_data in rows:
+            html = html_cache.get(job_unique_id) if html_cache is not None else None
+            posting = {'job_unique_id': job_unique_id, 'job_title': job_title, 'employer': employer,
+                       'job_location': job_location, **dict(zip(CARD_DATA_FIELDS, card_data))}
+            details.append(extract_job_details(job_description, html, posting))
+        db.upsert_job_details(details)
+        n_extracted += len(rows)
+    seconds = time.perf_counter() - started
+    logging.info(f'Extracted job details for {n_extracted} postings in {seconds:.1f}s.')
+    print(f'Extracted job details for {n_extracted} postings in {seconds:.1f}s.')
+    return n_extracted
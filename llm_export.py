@@ -0,0 +1,307 @@
+# Normalizes stored job descriptions for language models and streams them to JSONL shards sized by token count.
+# Only the descriptions added or changed since the last run are exported, normalized on all cores.
+import hashlib
+import html
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# Custom code
+from database_tools import DatabaseTools
+
+EXPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports', 'llm')
+TOKEN_ENCODING = 'cl100k_base'
+
+IMAGE_PATTERN = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+# [text](target) -> text, the targets are mostly Indeed redirects and tracking links
+LINK_PATTERN = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+# Query strings and fragments of bare urls
+URL_TRACKING_PATTERN = re.compile(r'(https?://[^\s?#)>]+)[?#][^\s)>]*')
+INVISIBLE_PATTERN = re.compile(r'[\u00ad\u200b-\u200d\u2060\ufeff]')
+# Runs of spaces and tabs, and odd spaces on their own. Single plain spaces aren't matched, they'd stay the same.
+SPACE_PATTERN = re.compile(r'[ \t\u00a0\u2000-\u200a\u202f\u205f\u3000]{2,}|[\t\u00a0\u2000-\u200a\u202f\u205f\u3000]')
+EMPHASIS_PATTERN = re.compile(r'\*\*|__')
+BULLETS = '*+•·'
+BULLET_PATTERN = re.compile(r'^[*+•·]\s+')
+# "Title\n=====" headings become "# Title", the underline costs a token per few characters. Lone rules are dropped.
+SETEXT_UNDERLINE_PATTERN = re.compile(r'^(=+|-+)$')
+# Parts of the Indeed job page that end up in the description: apply and save buttons, the profile match prompts
+PAGE_CHROME_PATTERN = re.compile(
+    r'^(apply now|report job|save-icon|profile insights|job details|full job description|'
+    r'pulled from the full job description|find out how your skills align with the job description|'
+    r'here.s how the job details align with your profile.*|do you have .*\?\s*yes\s*no)$', re.IGNORECASE)
+PAGE_CHROME_FRAGMENT_PATTERN = re.compile(r'apply now\s*save-icon\s*report job|save-icon', re.IGNORECASE)
+# Rough stand-in for a BPE tokenizer when tiktoken isn't installed: words, numbers in groups of 3, punctuation runs
+APPROXIMATE_TOKEN_PATTERN = re.compile(r"'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]{1,10}| ?\d{1,3}| ?[^\s\w]+|\s+")
+
+# Lines shorter than this are never treated as boilerplate, so shared headings and bullets like "Dental insurance" stay
+BOILERPLATE_MIN_WORDS = 8
+
+_encoding = None
+# Set in each worker process by _init_worker
+_boilerplate = frozenset()
+
+
+def count_tokens(text: str):
+    """Tokens in text with tiktoken's TOKEN_ENCODING, or an approximation when tiktoken isn't available."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken  # optional, the counts are approximate without it
+            _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+        except Exception as e:
+            logging.info(f'Counting tokens approximately, tiktoken is not available: {e}')
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(APPROXIMATE_TOKEN_PATTERN.findall(text))
+
+
+def clean_lines(markdown: str):
+    """Returns the lines of markdown without images, link targets, tracking parameters, page chrome or extra spaces."""
+    text = INVISIBLE_PATTERN.sub('', html.unescape(markdown))
+    text = IMAGE_PATTERN.sub('', text)
+    text = LINK_PATTERN.sub(r'\1', text)
+    text = URL_TRACKING_PATTERN.sub(r'\1', text)
+    if 'save-icon' in text:
+        text = PAGE_CHROME_FRAGMENT_PATTERN.sub(' ', text)
+    # Substitutions run over the whole text, once per document rather than once per line
+    text = SPACE_PATTERN.sub(' ', EMPHASIS_PATTERN.sub('', text))
+    raw_lines = [line.strip() for line in text.splitlines()]
+    lines = []
+    for i, line in enumerate(raw_lines):
+        if not line or SETEXT_UNDERLINE_PATTERN.match(line) or PAGE_CHROME_PATTERN.match(line):
+            continue
+        underline = raw_lines[i + 1] if i + 1 < len(raw_lines) else ''
+        if SETEXT_UNDERLINE_PATTERN.match(underline):
+            line = ('# ' if underline[0] == '=' else '## ') + line
+        elif line[0] in BULLETS:
+            line = BULLET_PATTERN.sub('- ', line)
+        if lines and line == lines[-1]:
+            continue
+        lines.append(line)
+    return lines
+
+
+def line_key(line: str):
+    """64-bit hash of a line ignoring case and punctuation, or None for lines too short to count as boilerplate."""
+    words = re.findall(r'\w+', line.lower())
+    if len(words) < BOILERPLATE_MIN_WORDS:
+        return None
+    return int.from_bytes(hashlib.blake2b(' '.join(words).encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+def normalize_description(markdown: str, boilerplate=frozenset()):
+    """Token-lean plain text of a description: clean_lines, minus the lines in the boilerplate set of line_keys.
+
+    If every line is boilerplate the cleaned text is kept, an empty document is no use to anyone.
+    """
+    lines = clean_lines(markdown)
+    kept = [line for line in lines if line_key(line) not in boilerplate] if boilerplate else lines
+    return '\n'.join(kept or lines)
+
+
+"""Worker processes"""
+
+
+def _init_worker(boilerplate):
+    global _boilerplate
+    _boilerplate = boilerplate
+
+
+def line_keys_batch(rows):
+    """[(id, job_unique_id, title, employer, location, description, ...)] -> [set of line_keys], one per row."""
+    return [{key for key in map(line_key, clean_lines(row[5])) if key is not None} for row in rows]
+
+
+def normalize_batch(rows):
+    """[(id, job_unique_id, title, employer, location, description, ...)] -> [(id, record)], records without text left out."""
+    records = []
+    for row_id, job_unique_id, job_title, employer, job_location, description, *_ in rows:
+        text = normalize_description(description, _boilerplate)
+        if not text:
+            continue
+        records.append((row_id, {'job_unique_id': job_unique_id, 'title': job_title, 'employer': employer,
+                                 'location': job_location, 'text': text, 'tokens': count_tokens(text)}))
+    return records
+
+
+def map_in_order(function, batches, processes: int = None, boilerplate=frozenset()):
+    """Yields (batch, function(batch)) for each batch, in order, computed on a process pool.
+
+    Only two batches per process are in flight, so batches can be read lazily from the database.
+    """
+    processes = processes or os.cpu_count()
+    in_flight = deque()
+    # Spawned like markdown_pipeline's workers, the exporter may run alongside threads (e.g. the rate decision writer)
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(boilerplate,)) as executor:
+        for batch in batches:
+            in_flight.append((batch, executor.submit(function, batch)))
+            if len(in_flight) >= processes * 2:
+                batch, future = in_flight.popleft()
+                yield batch, future.result()
+        while in_flight:
+            batch, future = in_flight.popleft()
+            yield batch, future.result()
+
+
+class LlmExporter:
+    """Appends the descriptions saved or changed since the last run to JSONL shards of at most shard_tokens tokens each.
+
+    Each run first counts how many descriptions every long line appears in (the description_lines table), then
+    writes the new descriptions without the lines that at least boilerplate_documents of them share: equal
+    opportunity statements, "about us" paragraphs and the like. Reposts (duplicate_of) aren't exported, nor are
+    postings whose description is still being fetched; those go out with a later run. Both steps record the
+    description_hash they handled for each posting in llm_export_rows, as each chunk of counts or each shard is
+    saved, so an interrupted run carries on where it stopped and a changed description is exported again (a later
+    shard's record for a job_unique_id supersedes an earlier one). A line only counts as boilerplate from the run
+    its count gets there, shards written before that keep it.
+    """
+
+    def __init__(self,
+                 db: DatabaseTools = None,
+                 export_path: str = EXPORT_PATH,
+                 shard_tokens: int = 2000000,
+                 boilerplate_documents: int = 5,
+                 processes: int = None,
+                 batch_size: int = 200):
+        self.db = db or DatabaseTools()
+        self.export_path = export_path
+        self.shard_tokens = shard_tokens
+        self.boilerplate_documents = boilerplate_documents
+        self.processes = processes
+        self.batch_size = batch_size
+
+    def _batches(self, state_column):
+        """Yields batches of original descriptions whose description_hash isn't the one in llm_export_rows.state_column,
+        as [(id, job_unique_id, title, employer, location, description, description_hash, previous description)].
+
+        Postings still waiting for their description are skipped, they come up again once it is saved. The previous
+        description is the one state_column names, while it is still stored.
+        """
+        last_id = 0
+        while True:
+            # Keyset paging on the view, so only the rows of this batch are decompressed
+            rows = list(self.db.iter_query(f'''
+                SELECT p.id, p.job_unique_id, p.job_title, p.employer, p.job_location, p.job_description,
+                    p.description_hash, description_text(d.compressed, d.dictionary_id)
+                FROM job_postings_full p
+                LEFT JOIN llm_export_rows e ON e.posting_id = p.id
+                LEFT JOIN job_descriptions d ON d.content_hash = e.{state_column}
+                WHERE p.id > ? AND p.description_status = 'done' AND p.duplicate_of IS NULL
+                AND e.{state_column} IS NOT p.description_hash
+                AND NOT EXISTS (SELECT 1 FROM description_tasks t
+                                WHERE t.job_unique_id = p.job_unique_id AND t.state IN ('pending', 'leased'))
+                ORDER BY p.id
+                LIMIT ?
+            ''', (last_id, self.batch_size)))
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            yield rows
+
+    def _save_state(self, cursor, state_column, name, rows, n_rows):
+        """Records the (posting_id, description_hash) rows as handled by state_column's step, and n_rows more exported."""
+        cursor.executemany(f'''
+            INSERT INTO llm_export_rows (posting_id, {state_column}) VALUES (?, ?)
+            ON CONFLICT(posting_id) DO UPDATE SET {state_column} = excluded.{state_column}
+        ''', rows)
+        cursor.execute('''
+            INSERT INTO export_watermarks (table_name, rows_exported, exported_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(table_name) DO UPDATE SET
+                rows_exported = rows_exported + excluded.rows_exported, exported_at = CURRENT_TIMESTAMP
+        ''', (name, n_rows))
+
+    """Main Functions"""
+
+    def count_lines(self):
+        """Adds the descriptions saved or changed since the last count to description_lines, taking a changed one's
+        previous lines back out. Returns how many were counted."""
+        n_counted = 0
+        for batch, keys in map_in_order(line_keys_batch, self._batches('counted_hash'), self.processes):
+            # Changes are rare, the previous descriptions are split here rather than on the pool
+            previous = line_keys_batch([row[:5] + (row[7],) for row in batch if row[7] is not None])
+            with self.db.transaction(stage='db_count_lines') as cursor:
+                cursor.executemany('''
+                    INSERT INTO description_lines (line_hash, documents) VALUES (?, 1)
+                    ON CONFLICT(line_hash) DO UPDATE SET documents = documents + 1
+                ''', [(key,) for document_keys in keys for key in document_keys])
+                cursor.executemany('UPDATE description_lines SET documents = documents - 1 WHERE line_hash = ?',
+                                   [(key,) for document_keys in previous for key in document_keys])
+                self._save_state(cursor, 'counted_hash', 'description_lines', [(row[0], row[6]) for row in batch],
+                                 len(batch))
+            n_counted += len(batch)
+        return n_counted
+
+    def boilerplate(self):
+        """The line_keys shared by at least boilerplate_documents descriptions."""
+        return frozenset(key for (key,) in self.db.iter_query('SELECT line_hash FROM description_lines WHERE documents >= ?',
+                                                             (self.boilerplate_documents,)))
+
+    def export(self):
+        """Counts lines, then writes the new descriptions to shards. Returns throughput and token numbers."""
+        started = time.perf_counter()
+        self.count_lines()
+        boilerplate = self.boilerplate()
+        os.makedirs(self.export_path, exist_ok=True)
+        stats = {'documents': 0, 'shards': 0, 'tokens': 0, 'boilerplate_lines': len(boilerplate)}
+        shard = None
+        for batch, records in map_in_order(normalize_batch, self._batches('exported_hash'), self.processes, boilerplate):
+            for row_id, record in records:
+                if shard is not None and shard['tokens'] + record['tokens'] > self.shard_tokens:
+                    self._close_shard(shard)
+                    stats['shards'] += 1
+                    shard = None
+                if shard is None:
+                    shard = self._open_shard(row_id)
+                shard['file'].write(json.dumps(record, ensure_ascii=False) + '\n')
+                shard['tokens'] += record['tokens']
+                shard['rows'] += 1
+                stats['documents'] += 1
+                stats['tokens'] += record['tokens']
+            # Rows are recorded with the shard that holds them. Those left out (no text) go with the open shard, or
+            # straight away when there is none, so they aren't normalized again next run.
+            handled = [(row[0], row[6]) for row in batch]
+            if shard is not None:
+                shard['handled'].extend(handled)
+            else:
+                with self.db.transaction(stage='db_llm_export') as cursor:
+                    self._save_state(cursor, 'exported_hash', 'llm_export', handled, 0)
+        if shard is not None:
+            self._close_shard(shard)
+            stats['shards'] += 1
+        stats['seconds'] = time.perf_counter() - started
+        logging.info(f'LLM export: {stats}')
+        print(f"Exported {stats['documents']} descriptions ({stats['tokens']} tokens) to {stats['shards']} shards "
+              f"in {self.export_path} in {stats['seconds']:.1f}s.")
+        return stats
+
+    def _open_shard(self, first_id):
+        path = os.path.join(self.export_path, f'shard-{datetime.now():%Y%m%d%H%M%S%f}-{first_id:012d}.jsonl')
+        return {'path': path, 'file': open(f'{path}.tmp', 'w', encoding='utf-8'), 'tokens': 0, 'rows': 0,
+                'handled': []}
+
+    def _close_shard(self, shard):
+        # Renamed into place before its rows are recorded, so a crash never leaves a half-written shard
+        shard['file'].close()
+        os.replace(f"{shard['path']}.tmp", shard['path'])
+        with self.db.transaction(stage='db_llm_export') as cursor:
+            self._save_state(cursor, 'exported_hash', 'llm_export', shard['handled'], shard['rows'])
+
+
+def load_shards(export_path: str = EXPORT_PATH):
+    """Yields the records of every shard in export_path in the order they were written, so a job_unique_id's last
+    record is its current description."""
+    for name in sorted(os.listdir(export_path)):
+        if name.endswith('.jsonl'):
+            with open(os.path.join(export_path, name), 'r', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
@@ -1,5 +1,5 @@
 import argparse
-from indeed_scraper import IndeedScraper, main  # Adjust this import based on your actual module structure.
+from indeed_scraper import IndeedScraper, main, reconvert_from_cache  # Adjust this import based on your actual module structure.
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Scrape job listings from Indeed.")
@@ -8,15 +8,81 @@ def parse_args():
     parser.add_argument('--country', type=str, choices=['USA', 'CANADA'], default='usa', help='Country to search in.')
     parser.add_argument('--sort_by', type=str, choices=['date', 'relevance'], default='date', help='Sort by date or relevance.')
     parser.add_argument('--max_pages', type=int, default=5, help='Maximum number of pages to scrape.')
+    parser.add_argument('--incremental', action='store_true', help='Stop paging once a page is mostly postings that are already saved.')
+    parser.add_argument('--no_resume', action='store_true', help='Start the search from page 1 even if an unfinished session of it can be resumed.')
     parser.add_argument('--dont_search', action='store_true', help='Disable searching for new jobs.')
     parser.add_argument('--dont_update_job_descriptions', action='store_true', help='Disable updating job descriptions.')
-    return parser.parse_args()
+    parser.add_argument('--use_http', action='store_true', help='Fetch job descriptions over plain HTTP first, only using the browser when a page needs it.')
+    parser.add_argument('--performance_profile', action='store_true', help='Run headless browsers without images, fonts or css.')
+    parser.add_argument('--backend', type=str, choices=['selenium', 'playwright'], default='selenium', help='Browser automation to use. playwright runs many tabs in one browser process.')
+    parser.add_argument('--tabs', type=int, default=8, help='Number of tabs fetching job descriptions at once with --backend playwright.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of browsers to fetch job descriptions with in parallel (--backend selenium).')
+    parser.add_argument('--no_html_cache', action='store_true', help='Do not save raw job pages to the html_cache/ folder.')
+    parser.add_argument('--reconvert_from_cache', action='store_true', help='Rebuild job descriptions from the cached job pages and exit.')
+    parser.add_argument('--spec', type=str, default=None, help='JSON or YAML file listing many searches to run concurrently (see search_scheduler.py).')
+    parser.add_argument('--fetch_reposts', action='store_true', help='Fetch reposted jobs too, instead of copying the description of the original posting.')
+    parser.add_argument('--extract_details', action='store_true', help='Fill job_details from the saved descriptions of postings that have none yet and exit.')
+    parser.add_argument('--export_parquet', action='store_true', help='Append the rows added since the last export to the Parquet files in exports/ and exit.')
+    parser.add_argument('--export_llm', action='store_true', help='Append the descriptions added or changed since the last export, normalized for language models, to JSONL shards in exports/llm/ and exit.')
+    parser.add_argument('--shard_tokens', type=int, default=2000000, help='Maximum tokens per JSONL shard written by --export_llm.')
+    parser.add_argument('--compact_descriptions', action='store_true', help='Delete the job descriptions no posting uses, train a new compression dictionary for the rest, recompress them and VACUUM the database, then exit.')
+    parser.add_argument('--similar', type=str, default=None, help='Print the saved postings most similar to this job_unique_id and exit.')
+    parser.add_argument('--search_browsers', type=int, default=2, help='Number of browsers running searches at once when using --spec.')
+    args = parser.parse_args()
+    if args.backend == 'playwright' and args.workers > 1 and not args.spec:
+        parser.error('--workers only applies to --backend selenium, use --tabs to fetch on more tabs with --backend playwright.')
+    return args
 
 if __name__ == '__main__':
     args = parse_args()
 
+    if args.reconvert_from_cache:
+        reconvert_from_cache()
+        exit()
+
+    if args.extract_details:
+        from job_details_extractor import extract_new_details
+        extract_new_details()
+        exit()
+
+    if args.export_parquet:
+        from parquet_export import ParquetExporter
+        ParquetExporter().export_all()
+        exit()
+
+    if args.export_llm:
+        from llm_export import LlmExporter
+        LlmExporter(shard_tokens=args.shard_tokens).export()
+        exit()
+
+    if args.compact_descriptions:
+        from description_store import compact_descriptions
+        compact_descriptions(force=True, vacuum=True)
+        exit()
+
+    if args.similar:
+        from near_duplicates import DuplicateIndex
+        index = DuplicateIndex()
+        index.update()
+        for job_unique_id, similarity in index.similar(args.similar):
+            print(f'{similarity:.2f}  {job_unique_id}')
+        exit()
+
+    # Many searches from a spec file, with descriptions fetched while the searches run.
+    if args.spec:
+        from search_scheduler import SearchScheduler, load_job_spec
+        from html_cache import HtmlCache
+        scheduler = SearchScheduler(
+            search_browsers=args.search_browsers,
+            description_workers=args.workers,
+            performance_profile=args.performance_profile,
+            html_cache=None if args.no_html_cache else HtmlCache()
+        )
+        scheduler.run(load_job_spec(args.spec))
+        exit()
+
     # Set the country and sort_by using the enumeration in IndeedScraper, adjusting as needed for your implementation.
-    country_enum = getattr(IndeedScraper.Country, args.country)
+    country_enum = getattr(IndeedScraper.Country, args.country.upper())
     sort_by_enum = getattr(IndeedScraper.SortBy, args.sort_by.upper())
 
     # Construct the search parameters Object
@@ -32,15 +98,16 @@ if __name__ == '__main__':
         max_pages=args.max_pages, 
         dont_search=args.dont_search, 
         dont_update_job_descriptions=args.dont_update_job_descriptions,
+        workers=args.workers,
+        use_http=args.use_http,
+        performance_profile=args.performance_profile,
+        incremental=args.incremental,
+        use_html_cache=not args.no_html_cache,
+        fetch_reposts=args.fetch_reposts,
+        resume=not args.no_resume,
+        backend=args.backend,
+        tabs=args.tabs,
         **search_params
     )
-    
-    # Handle temporary bug fix with the second call
-    if args.dont_update_job_descriptions:  # Check if updating descriptions is needed
-        main(
-            max_pages=0, 
-            dont_search=args.dont_search, 
-            dont_update_job_descriptions=False, 
-            **search_params
-        )
+
 # python main.py --keywords "Engineering" --location "Toronto" --country CANADA --sort_by relevance --max_pages 2 --dont_search --dont_update_job_descriptions
\ No newline at end of file
@@ -0,0 +1,131 @@
+# Converts job page HTML to markdown on all cores, away from the scraper threads.
+# Only imports what the worker processes need, so the spawned workers start quickly.
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from markdownify import markdownify as md
+
+# [text](target) links, compiled once instead of on every call
+LINK_PATTERN = re.compile(r'\[([^]]+)]\(([^)]+)\)')
+SCRIPT_PATTERN = re.compile(r'<script\b[^>]*>.*?</script>', re.IGNORECASE | re.DOTALL)
+# Workers are spawned rather than forked: the pools are started from threaded processes (scraper and writer
+# threads), and a forked child can inherit a lock another thread was holding.
+MP_CONTEXT = multiprocessing.get_context('spawn')
+
+
+def html_to_markdown(html: str):
+    # Scripts (the JSON-LD job data kept with the job page) aren't part of the description
+    return md(SCRIPT_PATTERN.sub('', html))
+
+
+def remove_links_from_markdown(markdown: str, replace_with: str = '<url removed>'):
+    return LINK_PATTERN.sub(lambda match: f'[{match.group(1)}]({replace_with})', markdown).replace('\n', '')
+
+
+def convert_batch(batch):
+    """Converts [(job_unique_id, html)] to [(job_unique_id, markdown)]. None html stays None (a failed fetch)."""
+    return [(job_unique_id, html_to_markdown(html) if html is not None else None) for job_unique_id, html in batch]
+
+
+def timed_convert_batch(batch):
+    """convert_batch, also returning how long the conversion took inside the worker process."""
+    started = time.perf_counter()
+    results = convert_batch(batch)
+    return time.perf_counter() - started, results
+
+
+class MarkdownConverter:
+    """Collects (job_unique_id, html) pairs and converts them in batches on a process pool.
+
+    Finished batches are passed to sink, e.g. DescriptionQueue.finish or DatabaseTools.update_job_posting_descriptions.
+    add() never waits for a conversion, so the scraper can load the next page while the last ones convert.
+    """
+
+    def __init__(self, sink, processes: int = None, batch_size: int = 25, latency=None):
+        self.sink = sink
+        # Optional LatencyHistogram, gets a 'markdown_batch' sample per converted batch
+        self.latency = latency
+        self.batch_size = batch_size
+        self.executor = ProcessPoolExecutor(max_workers=processes or os.cpu_count(), mp_context=MP_CONTEXT)
+        self.batch = []
+        self.in_flight = []
+        self.converted = 0
+
+    def add(self, job_unique_id, html):
+        self.batch.append((job_unique_id, html))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Sends the current batch off for conversion and saves any batches that have finished."""
+        if self.batch:
+            self.in_flight.append(self.executor.submit(timed_convert_batch, self.batch))
+            self.batch = []
+        self._save(wait=False)
+
+    def _save(self, wait):
+        still_running = []
+        for future in self.in_flight:
+            if wait or future.done():
+                seconds, results = future.result()
+                if self.latency is not None:
+                    self.latency.observe('markdown_batch', seconds)
+                self.sink(results)
+                self.converted += len(results)
+            else:
+                still_running.append(future)
+        self.in_flight = still_running
+
+    def close(self):
+        """Converts and saves everything that is left, then stops the worker processes."""
+        self.flush()
+        self._save(wait=True)
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def convert_all(items, sink, processes: int = None, batch_size: int = 100):
+    """Converts an iterable of (job_unique_id, html) with every core, saving each batch with sink.
+
+    Returns throughput numbers: documents, megabytes of HTML and seconds taken.
+    """
+    started = time.perf_counter()
+    n_bytes = 0
+
+    def batches():
+        nonlocal n_bytes
+        batch = []
+        for job_unique_id, html in items:
+            n_bytes += len(html) if html is not None else 0
+            batch.append((job_unique_id, html))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    n_documents = 0
+    processes = processes or os.cpu_count()
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=processes, mp_context=MP_CONTEXT) as executor:
+        # Executor.map would read every batch up front, so keep only two batches per process in flight
+        for batch in batches():
+            in_flight.append(executor.submit(convert_batch, batch))
+            if len(in_flight) >= processes * 2:
+                results = in_flight.popleft().result()
+                sink(results)
+                n_documents += len(results)
+        while in_flight:
+            results = in_flight.popleft().result()
+            sink(results)
+            n_documents += len(results)
+    seconds = time.perf_counter() - started
+    return {'documents': n_documents, 'megabytes': n_bytes / 1024 ** 2, 'seconds': seconds}
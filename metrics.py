@@ -0,0 +1,134 @@
+# Packages
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Prometheus textfiles go here, one per kind of run. Point node_exporter's textfile collector at this folder.
+METRICS_PATH = os.environ.get('INDEED_METRICS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics'))
+
+
+class LatencyHistogram:
+    """Collects how long each stage of a run takes (page loads, waits, ...) and logs them as a histogram."""
+
+    # Upper bounds of the histogram buckets in seconds, anything slower lands in the last '+Inf' bucket.
+    BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    def merge(self, other):
+        """Adds the samples of another histogram, e.g. to combine the workers of a pool into one run."""
+        with self.lock:
+            for stage, samples in list(other.samples.items()):
+                self.samples[stage].extend(samples)
+
+    @contextmanager
+    def time(self, stage: str):
+        """Times the enclosed block and records it under stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def histogram(self, stage: str):
+        """Returns the number of samples in each bucket as {upper_bound: count}."""
+        counts = {bound: 0 for bound in self.BUCKETS + (float('inf'),)}
+        for seconds in self.samples[stage]:
+            for bound in counts:
+                if seconds <= bound:
+                    counts[bound] += 1
+                    break
+        return counts
+
+    def percentile(self, stage: str, q: float):
+        """Returns the q-th percentile (0-100) of stage's samples, nearest rank."""
+        samples = sorted(self.samples[stage])
+        if not samples:
+            return None
+        return samples[max(0, math.ceil(q / 100 * len(samples)) - 1)]
+
+    def summary(self):
+        """Returns count, total, mean, p50, p95 and max seconds for each stage."""
+        return {
+            stage: {
+                'count': len(samples),
+                'total': sum(samples),
+                'mean': sum(samples) / len(samples),
+                'p50': self.percentile(stage, 50),
+                'p95': self.percentile(stage, 95),
+                'max': max(samples)
+            }
+            for stage, samples in self.samples.items() if samples
+        }
+
+    def _bucket_label(self, bound):
+        return f'<={bound}s' if bound != float('inf') else f'>{self.BUCKETS[-1]}s'
+
+    def log_summary(self, title: str = 'Latency summary'):
+        logging.info(title)
+        for stage, stats in self.summary().items():
+            buckets = ' '.join(f'{self._bucket_label(bound)}:{count}' for bound, count in self.histogram(stage).items() if count)
+            logging.info(f"  {stage}: n={stats['count']} total={stats['total']:.2f}s mean={stats['mean']:.3f}s "
+                         f"p50={stats['p50']:.3f}s p95={stats['p95']:.3f}s max={stats['max']:.3f}s | {buckets}")
+
+    def prometheus_lines(self, run_name: str):
+        """Returns the histogram in the Prometheus text format, one series per stage labelled with run_name."""
+        lines = ['# HELP indeed_scraper_stage_seconds Time spent in each stage of the last run.',
+                 '# TYPE indeed_scraper_stage_seconds histogram']
+        for stage, samples in self.samples.items():
+            labels = f'run="{run_name}",stage="{stage}"'
+            cumulative = 0
+            for bound, count in self.histogram(stage).items():
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else bound
+                lines.append(f'indeed_scraper_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'indeed_scraper_stage_seconds_sum{{{labels}}} {sum(samples)}')
+            lines.append(f'indeed_scraper_stage_seconds_count{{{labels}}} {len(samples)}')
+        return lines
+
+
+def write_prometheus_textfile(run_name: str, latency: LatencyHistogram, gauges: dict):
+    """Writes METRICS_PATH/indeed_scraper_<run_name>.prom with the latency histogram and gauges {name: value}."""
+    os.makedirs(METRICS_PATH, exist_ok=True)
+    lines = latency.prometheus_lines(run_name)
+    for name, value in gauges.items():
+        lines.append(f'# TYPE indeed_scraper_{name} gauge')
+        lines.append(f'indeed_scraper_{name}{{run="{run_name}"}} {value}')
+    path = os.path.join(METRICS_PATH, f'indeed_scraper_{run_name}.prom')
+    # The collector may read at any moment, so write a temporary file and rename it over the old one
+    with open(f'{path}.tmp', 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(f'{path}.tmp', path)
+
+
+def report_run(run_name: str, latency: LatencyHistogram, seconds: float, pages: int = 0, jobs: int = 0,
+               db=None, session_id: int = None):
+    """Logs the latency summary and throughput of a run, saves it to run_metrics (when given a db) and
+    writes the Prometheus textfile."""
+    minutes = max(seconds, 1e-9) / 60
+    gauges = {
+        'pages_per_minute': pages / minutes,
+        'jobs_per_minute': jobs / minutes,
+        'run_seconds': seconds,
+        'last_run_timestamp_seconds': time.time()
+    }
+    title = f'{run_name} run' + (f' (session {session_id})' if session_id is not None else '')
+    latency.log_summary(f'{title} latency')
+    logging.info(f"{title}: {pages} pages, {jobs} jobs in {seconds:.1f}s, "
+                 f"{gauges['pages_per_minute']:.1f} pages/min, {gauges['jobs_per_minute']:.1f} jobs/min")
+    print(f"{title}: {gauges['pages_per_minute']:.1f} pages/min, {gauges['jobs_per_minute']:.1f} jobs/min.")
+    if db is not None:
+        db.save_run_metrics(run_name, session_id, latency.summary(), seconds, pages, jobs)
+    try:
+        write_prometheus_textfile(run_name, latency, gauges)
+    except OSError as e:
+        logging.warning(f'Could not write the metrics textfile: {e}')
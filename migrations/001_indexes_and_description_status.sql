@@ -0,0 +1,17 @@
+/* Track which postings still need a description instead of scanning job_description with LIKE */
+ALTER TABLE job_postings ADD COLUMN description_status TEXT DEFAULT 'pending';
+
+UPDATE job_postings SET description_status = CASE
+    WHEN job_description IS NULL
+        OR job_description LIKE ''
+        OR job_description LIKE 'Verify% you are human'
+        OR job_description LIKE '%nable JavaScript%'
+    THEN 'pending'
+    ELSE 'done'
+END;
+
+/* Only the pending rows are indexed, so the backfill lookup is O(pending) */
+CREATE INDEX IF NOT EXISTS idx_job_postings_pending ON job_postings(id) WHERE description_status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_job_postings_session_id ON job_postings(session_id);
+CREATE INDEX IF NOT EXISTS idx_job_postings_timestamp ON job_postings(timestamp);
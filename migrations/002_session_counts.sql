@@ -0,0 +1,4 @@
+/* How many cards each search session found that were new vs. already in job_postings */
+ALTER TABLE search_sessions ADD COLUMN pages_fetched INTEGER DEFAULT 0;
+ALTER TABLE search_sessions ADD COLUMN new_postings INTEGER DEFAULT 0;
+ALTER TABLE search_sessions ADD COLUMN seen_postings INTEGER DEFAULT 0;
@@ -0,0 +1,27 @@
+/* Durable work queue for the description backfill. Times are unix epoch seconds. */
+CREATE TABLE IF NOT EXISTS description_tasks (
+    job_unique_id TEXT PRIMARY KEY,
+    job_link TEXT,
+    state TEXT NOT NULL DEFAULT 'pending', /* pending, leased, done or failed */
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (job_unique_id) REFERENCES job_postings(job_unique_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_description_tasks_claim ON description_tasks(state, next_attempt_at);
+
+INSERT OR IGNORE INTO description_tasks (job_unique_id, job_link)
+SELECT job_unique_id, job_link FROM job_postings
+WHERE description_status = 'pending' AND job_link IS NOT NULL AND job_unique_id IS NOT NULL;
+
+/* New postings are queued as soon as the search saves them */
+CREATE TRIGGER IF NOT EXISTS enqueue_description_task
+AFTER INSERT ON job_postings
+WHEN new.job_unique_id IS NOT NULL AND new.job_link IS NOT NULL
+BEGIN
+    INSERT OR IGNORE INTO description_tasks (job_unique_id, job_link) VALUES (new.job_unique_id, new.job_link);
+END;
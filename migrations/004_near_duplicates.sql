@@ -0,0 +1,24 @@
+/* Card fields used to spot reposts before their page is fetched, and the posting a duplicate was matched to */
+ALTER TABLE job_postings ADD COLUMN employer TEXT;
+ALTER TABLE job_postings ADD COLUMN job_location TEXT;
+ALTER TABLE job_postings ADD COLUMN posting_key TEXT;
+ALTER TABLE job_postings ADD COLUMN duplicate_of TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_job_postings_posting_key ON job_postings(posting_key) WHERE posting_key IS NOT NULL;
+
+/* MinHash signature of each stored description (num_perm uint32 values) */
+CREATE TABLE IF NOT EXISTS minhash_signatures (
+    job_unique_id TEXT PRIMARY KEY,
+    signature BLOB NOT NULL,
+    indexed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+/* LSH buckets: descriptions sharing any (band, bucket) are candidate near-duplicates */
+CREATE TABLE IF NOT EXISTS minhash_bands (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    job_unique_id TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, job_unique_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_minhash_bands_job ON minhash_bands(job_unique_id);
@@ -0,0 +1,71 @@
+/* The searchable text of job_details, one row per job */
+CREATE VIEW IF NOT EXISTS job_details_text AS
+SELECT job_unique_id,
+    COALESCE(position_summary, '') || ' ' || COALESCE(salary, '') || ' ' || COALESCE(location, '') || ' ' ||
+    COALESCE(employer, '') || ' ' || COALESCE(education, '') || ' ' || COALESCE(key_skills, '') || ' ' ||
+    COALESCE(employment_type, '') || ' ' || COALESCE(work_environment, '') || ' ' ||
+    COALESCE(experience_level, '') || ' ' || COALESCE(responsibilities, '') || ' ' ||
+    COALESCE(benefits, '') || ' ' || COALESCE(industry, '') AS details
+FROM job_details;
+
+/* Full-text index of job postings, rowid = job_postings.id. Kept in sync by the triggers below. */
+CREATE VIRTUAL TABLE IF NOT EXISTS job_search USING fts5(
+    job_unique_id UNINDEXED,
+    job_title,
+    employer,
+    job_location,
+    job_description,
+    details,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+
+INSERT INTO job_search (rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+SELECT p.id, p.job_unique_id, p.job_title, p.employer, p.job_location, p.job_description, d.details
+FROM job_postings p LEFT JOIN job_details_text d ON d.job_unique_id = p.job_unique_id;
+
+CREATE TRIGGER IF NOT EXISTS job_search_insert
+AFTER INSERT ON job_postings
+BEGIN
+    INSERT INTO job_search (rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    VALUES (new.id, new.job_unique_id, new.job_title, new.employer, new.job_location, new.job_description,
+            (SELECT details FROM job_details_text WHERE job_unique_id = new.job_unique_id));
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_update
+AFTER UPDATE OF job_unique_id, job_title, employer, job_location, job_description ON job_postings
+BEGIN
+    UPDATE job_search
+    SET job_unique_id = new.job_unique_id, job_title = new.job_title, employer = new.employer,
+        job_location = new.job_location, job_description = new.job_description
+    WHERE rowid = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_delete
+AFTER DELETE ON job_postings
+BEGIN
+    DELETE FROM job_search WHERE rowid = old.id;
+END;
+
+/* job_details rows are matched to their posting by job_unique_id */
+CREATE TRIGGER IF NOT EXISTS job_search_details_insert
+AFTER INSERT ON job_details
+BEGIN
+    UPDATE job_search
+    SET details = (SELECT details FROM job_details_text WHERE job_unique_id = new.job_unique_id)
+    WHERE rowid = (SELECT id FROM job_postings WHERE job_unique_id = new.job_unique_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_details_update
+AFTER UPDATE ON job_details
+BEGIN
+    UPDATE job_search
+    SET details = (SELECT details FROM job_details_text WHERE job_unique_id = new.job_unique_id)
+    WHERE rowid = (SELECT id FROM job_postings WHERE job_unique_id = new.job_unique_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_details_delete
+AFTER DELETE ON job_details
+BEGIN
+    UPDATE job_search SET details = NULL
+    WHERE rowid = (SELECT id FROM job_postings WHERE job_unique_id = old.job_unique_id);
+END;
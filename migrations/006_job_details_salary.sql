@@ -0,0 +1,6 @@
+/* Salary parsed into numbers, in the pay period the posting uses (hour, day, week, month or year) */
+ALTER TABLE job_details ADD COLUMN salary_min REAL;
+ALTER TABLE job_details ADD COLUMN salary_max REAL;
+ALTER TABLE job_details ADD COLUMN salary_period TEXT;
+/* When the rule-based extractor last filled the row */
+ALTER TABLE job_details ADD COLUMN extracted_at DATETIME;
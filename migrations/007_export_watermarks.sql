@@ -0,0 +1,7 @@
+/* The highest row id of each table already written to the Parquet export */
+CREATE TABLE IF NOT EXISTS export_watermarks (
+    table_name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0,
+    rows_exported INTEGER NOT NULL DEFAULT 0,
+    exported_at DATETIME
+);
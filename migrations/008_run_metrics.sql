@@ -0,0 +1,18 @@
+/* Per-stage latency of each run, one row per stage plus a 'run' row holding the totals */
+CREATE TABLE IF NOT EXISTS run_metrics (
+    id INTEGER PRIMARY KEY,
+    run_name TEXT NOT NULL,
+    session_id INTEGER,
+    stage TEXT NOT NULL,
+    count INTEGER,
+    total_seconds REAL,
+    p50_seconds REAL,
+    p95_seconds REAL,
+    max_seconds REAL,
+    pages INTEGER,
+    jobs INTEGER,
+    recorded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (session_id) REFERENCES search_sessions(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_run_metrics_session ON run_metrics(session_id);
@@ -0,0 +1,14 @@
+/* Every change the rate controller makes to a domain's limits, and why */
+CREATE TABLE IF NOT EXISTS rate_decisions (
+    id INTEGER PRIMARY KEY,
+    domain TEXT NOT NULL,
+    decision TEXT NOT NULL,  -- increase, decrease, pause or resume
+    reason TEXT,
+    concurrency INTEGER,
+    delay_seconds REAL,
+    challenge_rate REAL,
+    error_rate REAL,
+    decided_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_decisions_domain ON rate_decisions(domain, decided_at);
@@ -0,0 +1,7 @@
+/* Where each search got to, so an interrupted search can pick up after its last completed page */
+ALTER TABLE search_sessions ADD COLUMN search_params TEXT;
+ALTER TABLE search_sessions ADD COLUMN last_url TEXT;
+ALTER TABLE search_sessions ADD COLUMN checkpoint_at DATETIME;
+
+/* Only unfinished sessions can be resumed */
+CREATE INDEX IF NOT EXISTS idx_search_sessions_resumable ON search_sessions(search_params) WHERE ended_at IS NULL;
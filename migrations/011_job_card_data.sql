@@ -0,0 +1,16 @@
+/* What the search results captured about each posting beyond its card text: the inline JSON
+   (mosaic-provider-jobcards) or, when a page doesn't have it, the salary and job type shown on the card */
+CREATE TABLE IF NOT EXISTS job_card_data (
+    job_unique_id TEXT PRIMARY KEY,
+    source TEXT,  -- mosaic or dom
+    salary_text TEXT,
+    salary_min REAL,
+    salary_max REAL,
+    salary_period TEXT,
+    employment_type TEXT,
+    snippet TEXT,
+    company_rating REAL,
+    remote INTEGER,
+    posted_at DATETIME,
+    captured_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
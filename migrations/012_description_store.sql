@@ -0,0 +1,149 @@
+/* Descriptions move out of job_postings into job_descriptions, stored once per distinct text and zstd
+   compressed. description_text(), description_hash() and description_compress() are registered on every
+   DatabaseTools connection (see description_store.py). */
+CREATE TABLE IF NOT EXISTS description_dictionaries (
+    id INTEGER PRIMARY KEY,
+    dictionary BLOB NOT NULL,
+    samples INTEGER,  -- descriptions it was trained on
+    trained_on INTEGER,  -- descriptions stored at the time
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS job_descriptions (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,  -- sha256 of the markdown
+    dictionary_id INTEGER,  -- NULL when compressed without a dictionary
+    size INTEGER NOT NULL,  -- bytes of markdown before compression
+    compressed BLOB NOT NULL,
+    FOREIGN KEY (dictionary_id) REFERENCES description_dictionaries(id)
+);
+
+ALTER TABLE job_postings ADD COLUMN description_hash TEXT;
+
+INSERT OR IGNORE INTO job_descriptions (content_hash, size, compressed)
+SELECT description_hash(job_description), length(CAST(job_description AS BLOB)), description_compress(job_description)
+FROM job_postings WHERE job_description IS NOT NULL;
+
+UPDATE job_postings SET description_hash = description_hash(job_description) WHERE job_description IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_job_postings_description_hash ON job_postings(description_hash);
+
+/* The full-text index stored its own copy of every description. It is rebuilt below as an external content
+   index that reads the text through job_search_source, so only the index itself is stored. */
+DROP TRIGGER IF EXISTS job_search_insert;
+DROP TRIGGER IF EXISTS job_search_update;
+DROP TRIGGER IF EXISTS job_search_delete;
+DROP TRIGGER IF EXISTS job_search_details_insert;
+DROP TRIGGER IF EXISTS job_search_details_update;
+DROP TRIGGER IF EXISTS job_search_details_delete;
+DROP TABLE IF EXISTS job_search;
+
+ALTER TABLE job_postings DROP COLUMN job_description;
+
+/* Every posting column with its description, which is only decompressed for the rows a query returns */
+CREATE VIEW IF NOT EXISTS job_postings_full AS
+SELECT p.id, p.session_id, p.job_unique_id, p.job_title, p.job_link,
+    description_text(d.compressed, d.dictionary_id) AS job_description,
+    p.timestamp, p.description_status, p.employer, p.job_location, p.posting_key, p.duplicate_of, p.description_hash
+FROM job_postings p LEFT JOIN job_descriptions d ON d.content_hash = p.description_hash;
+
+CREATE VIEW IF NOT EXISTS job_search_source AS
+SELECT p.id, p.job_unique_id, p.job_title, p.employer, p.job_location,
+    description_text(d.compressed, d.dictionary_id) AS job_description, t.details
+FROM job_postings p
+LEFT JOIN job_descriptions d ON d.content_hash = p.description_hash
+LEFT JOIN job_details_text t ON t.job_unique_id = p.job_unique_id;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS job_search USING fts5(
+    job_unique_id UNINDEXED,
+    job_title,
+    employer,
+    job_location,
+    job_description,
+    details,
+    content = 'job_search_source',
+    content_rowid = 'id',
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+
+INSERT INTO job_search (job_search) VALUES ('rebuild');
+
+/* An external content index is updated by deleting a row with exactly the values it was indexed with, then
+   inserting the new ones. The posting triggers read both from job_search_source, before and after the change. */
+CREATE TRIGGER IF NOT EXISTS job_search_insert
+AFTER INSERT ON job_postings
+BEGIN
+    INSERT INTO job_search (rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    SELECT id, job_unique_id, job_title, employer, job_location, job_description, details
+    FROM job_search_source WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_before_update
+BEFORE UPDATE OF job_unique_id, job_title, employer, job_location, description_hash ON job_postings
+BEGIN
+    INSERT INTO job_search (job_search, rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    SELECT 'delete', id, job_unique_id, job_title, employer, job_location, job_description, details
+    FROM job_search_source WHERE id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_update
+AFTER UPDATE OF job_unique_id, job_title, employer, job_location, description_hash ON job_postings
+BEGIN
+    INSERT INTO job_search (rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    SELECT id, job_unique_id, job_title, employer, job_location, job_description, details
+    FROM job_search_source WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_delete
+BEFORE DELETE ON job_postings
+BEGIN
+    INSERT INTO job_search (job_search, rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    SELECT 'delete', id, job_unique_id, job_title, employer, job_location, job_description, details
+    FROM job_search_source WHERE id = old.id;
+END;
+
+/* job_details is upserted, and an upsert that hits an existing row fires the update triggers but not the
+   insert ones. So these run after the change and rebuild the old details text from old.*, the same way
+   job_details_text does. */
+CREATE TRIGGER IF NOT EXISTS job_search_details_insert
+AFTER INSERT ON job_details
+BEGIN
+    INSERT INTO job_search (job_search, rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    SELECT 'delete', id, job_unique_id, job_title, employer, job_location, job_description, NULL
+    FROM job_search_source WHERE job_unique_id = new.job_unique_id;
+    INSERT INTO job_search (rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    SELECT id, job_unique_id, job_title, employer, job_location, job_description, details
+    FROM job_search_source WHERE job_unique_id = new.job_unique_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_details_update
+AFTER UPDATE ON job_details
+BEGIN
+    INSERT INTO job_search (job_search, rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    SELECT 'delete', id, job_unique_id, job_title, employer, job_location, job_description,
+        COALESCE(old.position_summary, '') || ' ' || COALESCE(old.salary, '') || ' ' || COALESCE(old.location, '') || ' ' ||
+        COALESCE(old.employer, '') || ' ' || COALESCE(old.education, '') || ' ' || COALESCE(old.key_skills, '') || ' ' ||
+        COALESCE(old.employment_type, '') || ' ' || COALESCE(old.work_environment, '') || ' ' ||
+        COALESCE(old.experience_level, '') || ' ' || COALESCE(old.responsibilities, '') || ' ' ||
+        COALESCE(old.benefits, '') || ' ' || COALESCE(old.industry, '')
+    FROM job_search_source WHERE job_unique_id = old.job_unique_id;
+    INSERT INTO job_search (rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    SELECT id, job_unique_id, job_title, employer, job_location, job_description, details
+    FROM job_search_source WHERE job_unique_id = new.job_unique_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_details_delete
+AFTER DELETE ON job_details
+BEGIN
+    INSERT INTO job_search (job_search, rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    SELECT 'delete', id, job_unique_id, job_title, employer, job_location, job_description,
+        COALESCE(old.position_summary, '') || ' ' || COALESCE(old.salary, '') || ' ' || COALESCE(old.location, '') || ' ' ||
+        COALESCE(old.employer, '') || ' ' || COALESCE(old.education, '') || ' ' || COALESCE(old.key_skills, '') || ' ' ||
+        COALESCE(old.employment_type, '') || ' ' || COALESCE(old.work_environment, '') || ' ' ||
+        COALESCE(old.experience_level, '') || ' ' || COALESCE(old.responsibilities, '') || ' ' ||
+        COALESCE(old.benefits, '') || ' ' || COALESCE(old.industry, '')
+    FROM job_search_source WHERE job_unique_id = old.job_unique_id;
+    INSERT INTO job_search (rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    SELECT id, job_unique_id, job_title, employer, job_location, job_description, details
+    FROM job_search_source WHERE job_unique_id = old.job_unique_id;
+END;
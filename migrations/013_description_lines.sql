@@ -0,0 +1,6 @@
+/* How many exported descriptions each line of 8+ words appears in, by llm_export.line_key. The lines many
+   postings share are dropped from the LLM export as boilerplate. */
+CREATE TABLE IF NOT EXISTS description_lines (
+    line_hash INTEGER PRIMARY KEY,
+    documents INTEGER NOT NULL
+);
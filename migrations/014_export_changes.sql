@@ -0,0 +1,97 @@
+/* The Parquet export follows each row instead of an id watermark: changed_at is when the row was last
+   inserted or updated (unix seconds), exported is cleared by every change and set once the row is written to
+   Parquet. A row held back (a posting waiting for its description, a running search) keeps exported = 0 and
+   goes out with a later export, without holding back the rows after it. */
+ALTER TABLE search_sessions ADD COLUMN changed_at REAL;
+ALTER TABLE search_sessions ADD COLUMN exported INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE job_postings ADD COLUMN changed_at REAL;
+ALTER TABLE job_postings ADD COLUMN exported INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE job_details ADD COLUMN changed_at REAL;
+ALTER TABLE job_details ADD COLUMN exported INTEGER NOT NULL DEFAULT 0;
+
+/* Rows up to the old watermark were exported already */
+UPDATE search_sessions SET changed_at = (julianday('now') - 2440587.5) * 86400.0,
+    exported = id <= COALESCE((SELECT last_id FROM export_watermarks WHERE table_name = 'search_sessions'), 0);
+UPDATE job_postings SET changed_at = (julianday('now') - 2440587.5) * 86400.0,
+    exported = id <= COALESCE((SELECT last_id FROM export_watermarks WHERE table_name = 'job_postings'), 0);
+UPDATE job_details SET changed_at = (julianday('now') - 2440587.5) * 86400.0,
+    exported = id <= COALESCE((SELECT last_id FROM export_watermarks WHERE table_name = 'job_details'), 0);
+
+CREATE INDEX IF NOT EXISTS idx_search_sessions_unexported ON search_sessions(id) WHERE exported = 0;
+CREATE INDEX IF NOT EXISTS idx_job_postings_unexported ON job_postings(id) WHERE exported = 0;
+CREATE INDEX IF NOT EXISTS idx_job_details_unexported ON job_details(id) WHERE exported = 0;
+
+/* The update triggers skip the exporter's own updates, which only set exported. changed_at always moves
+   forward, so the exporter can tell whether a row changed again after it read it. */
+CREATE TRIGGER IF NOT EXISTS search_sessions_changed_insert
+AFTER INSERT ON search_sessions
+BEGIN
+    UPDATE search_sessions SET changed_at = (julianday('now') - 2440587.5) * 86400.0 WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_sessions_changed_update
+AFTER UPDATE ON search_sessions
+WHEN new.exported IS old.exported AND new.changed_at IS old.changed_at
+BEGIN
+    UPDATE search_sessions
+    SET changed_at = MAX((julianday('now') - 2440587.5) * 86400.0, COALESCE(old.changed_at, 0) + 0.001), exported = 0
+    WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_postings_changed_insert
+AFTER INSERT ON job_postings
+BEGIN
+    UPDATE job_postings SET changed_at = (julianday('now') - 2440587.5) * 86400.0 WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_postings_changed_update
+AFTER UPDATE ON job_postings
+WHEN new.exported IS old.exported AND new.changed_at IS old.changed_at
+BEGIN
+    UPDATE job_postings
+    SET changed_at = MAX((julianday('now') - 2440587.5) * 86400.0, COALESCE(old.changed_at, 0) + 0.001), exported = 0
+    WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_details_changed_insert
+AFTER INSERT ON job_details
+BEGIN
+    UPDATE job_details SET changed_at = (julianday('now') - 2440587.5) * 86400.0 WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_details_changed_update
+AFTER UPDATE ON job_details
+WHEN new.exported IS old.exported AND new.changed_at IS old.changed_at
+BEGIN
+    UPDATE job_details
+    SET changed_at = MAX((julianday('now') - 2440587.5) * 86400.0, COALESCE(old.changed_at, 0) + 0.001), exported = 0
+    WHERE id = new.id;
+END;
+
+DROP VIEW IF EXISTS job_postings_full;
+CREATE VIEW job_postings_full AS
+SELECT p.id, p.session_id, p.job_unique_id, p.job_title, p.job_link,
+    description_text(d.compressed, d.dictionary_id) AS job_description,
+    p.timestamp, p.description_status, p.employer, p.job_location, p.posting_key, p.duplicate_of, p.description_hash,
+    p.changed_at, p.exported
+FROM job_postings p LEFT JOIN job_descriptions d ON d.content_hash = p.description_hash;
+
+/* job_search_details_update ran on any update of job_details, so it would now reindex a posting every time
+   the row is exported. It only needs to run when the details text changes. */
+DROP TRIGGER IF EXISTS job_search_details_update;
+CREATE TRIGGER job_search_details_update
+AFTER UPDATE OF job_unique_id, position_summary, salary, location, employer, education, key_skills, employment_type,
+    work_environment, experience_level, responsibilities, benefits, industry ON job_details
+BEGIN
+    INSERT INTO job_search (job_search, rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    SELECT 'delete', id, job_unique_id, job_title, employer, job_location, job_description,
+        COALESCE(old.position_summary, '') || ' ' || COALESCE(old.salary, '') || ' ' || COALESCE(old.location, '') || ' ' ||
+        COALESCE(old.employer, '') || ' ' || COALESCE(old.education, '') || ' ' || COALESCE(old.key_skills, '') || ' ' ||
+        COALESCE(old.employment_type, '') || ' ' || COALESCE(old.work_environment, '') || ' ' ||
+        COALESCE(old.experience_level, '') || ' ' || COALESCE(old.responsibilities, '') || ' ' ||
+        COALESCE(old.benefits, '') || ' ' || COALESCE(old.industry, '')
+    FROM job_search_source WHERE job_unique_id = old.job_unique_id;
+    INSERT INTO job_search (rowid, job_unique_id, job_title, employer, job_location, job_description, details)
+    SELECT id, job_unique_id, job_title, employer, job_location, job_description, details
+    FROM job_search_source WHERE job_unique_id = new.job_unique_id;
+END;
@@ -0,0 +1,82 @@
+/* The job_search triggers read descriptions through description_text(), so writing postings or job_details from
+   a connection without it (the sqlite3 shell, a plain sqlite3.connect) failed with "no such function". The
+   triggers now only queue the postings that changed, with the values they were indexed with, which needs no
+   functions. DatabaseTools.sync_search_index applies the queue before every search.
+
+   A posting is queued once until the next sync: later changes keep the first row, the one matching the index.
+   indexed is 0 for a posting that isn't in the index yet. */
+CREATE TABLE IF NOT EXISTS job_search_queue (
+    posting_id INTEGER PRIMARY KEY,
+    indexed INTEGER NOT NULL,
+    job_unique_id TEXT,
+    job_title TEXT,
+    employer TEXT,
+    job_location TEXT,
+    description_hash TEXT,  -- the old description stays in job_descriptions until the queue is synced
+    details TEXT
+);
+
+DROP TRIGGER IF EXISTS job_search_insert;
+DROP TRIGGER IF EXISTS job_search_before_update;
+DROP TRIGGER IF EXISTS job_search_update;
+DROP TRIGGER IF EXISTS job_search_delete;
+DROP TRIGGER IF EXISTS job_search_details_insert;
+DROP TRIGGER IF EXISTS job_search_details_update;
+DROP TRIGGER IF EXISTS job_search_details_delete;
+
+CREATE TRIGGER IF NOT EXISTS job_search_insert
+AFTER INSERT ON job_postings
+BEGIN
+    INSERT OR IGNORE INTO job_search_queue (posting_id, indexed) VALUES (new.id, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_update
+BEFORE UPDATE OF job_unique_id, job_title, employer, job_location, description_hash ON job_postings
+BEGIN
+    INSERT OR IGNORE INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT old.id, 1, old.job_unique_id, old.job_title, old.employer, old.job_location, old.description_hash,
+        (SELECT details FROM job_details_text WHERE job_unique_id = old.job_unique_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_delete
+BEFORE DELETE ON job_postings
+BEGIN
+    INSERT OR IGNORE INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT old.id, 1, old.job_unique_id, old.job_title, old.employer, old.job_location, old.description_hash,
+        (SELECT details FROM job_details_text WHERE job_unique_id = old.job_unique_id);
+END;
+
+/* job_details is upserted, which fires the update triggers when the row exists, so these run before the change
+   and read the details text as it was indexed */
+CREATE TRIGGER IF NOT EXISTS job_search_details_insert
+BEFORE INSERT ON job_details
+BEGIN
+    INSERT OR IGNORE INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT p.id, 1, p.job_unique_id, p.job_title, p.employer, p.job_location, p.description_hash,
+        (SELECT t.details FROM job_details_text t WHERE t.job_unique_id = p.job_unique_id)
+    FROM job_postings p WHERE p.job_unique_id = new.job_unique_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_details_update
+BEFORE UPDATE OF job_unique_id, position_summary, salary, location, employer, education, key_skills, employment_type,
+    work_environment, experience_level, responsibilities, benefits, industry ON job_details
+BEGIN
+    INSERT OR IGNORE INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT p.id, 1, p.job_unique_id, p.job_title, p.employer, p.job_location, p.description_hash,
+        (SELECT t.details FROM job_details_text t WHERE t.job_unique_id = p.job_unique_id)
+    FROM job_postings p WHERE p.job_unique_id IN (old.job_unique_id, new.job_unique_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_details_delete
+BEFORE DELETE ON job_details
+BEGIN
+    INSERT OR IGNORE INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT p.id, 1, p.job_unique_id, p.job_title, p.employer, p.job_location, p.description_hash,
+        (SELECT t.details FROM job_details_text t WHERE t.job_unique_id = p.job_unique_id)
+    FROM job_postings p WHERE p.job_unique_id = old.job_unique_id;
+END;
@@ -0,0 +1,73 @@
+/* The job_search_queue triggers used INSERT OR IGNORE to keep a posting's first queued row. Inside an upsert
+   (INSERT ... ON CONFLICT DO UPDATE, as upsert_job_details writes job_details) the outer statement's conflict
+   handling replaces the trigger's OR IGNORE, so upserting the details of a posting that was already queued failed
+   with "UNIQUE constraint failed: job_search_queue.posting_id". The triggers now skip queued postings with
+   NOT EXISTS instead. */
+DROP TRIGGER IF EXISTS job_search_insert;
+DROP TRIGGER IF EXISTS job_search_update;
+DROP TRIGGER IF EXISTS job_search_delete;
+DROP TRIGGER IF EXISTS job_search_details_insert;
+DROP TRIGGER IF EXISTS job_search_details_update;
+DROP TRIGGER IF EXISTS job_search_details_delete;
+
+CREATE TRIGGER IF NOT EXISTS job_search_insert
+AFTER INSERT ON job_postings
+BEGIN
+    INSERT INTO job_search_queue (posting_id, indexed)
+    SELECT new.id, 0 WHERE NOT EXISTS (SELECT 1 FROM job_search_queue WHERE posting_id = new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_update
+BEFORE UPDATE OF job_unique_id, job_title, employer, job_location, description_hash ON job_postings
+BEGIN
+    INSERT INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT old.id, 1, old.job_unique_id, old.job_title, old.employer, old.job_location, old.description_hash,
+        (SELECT details FROM job_details_text WHERE job_unique_id = old.job_unique_id)
+    WHERE NOT EXISTS (SELECT 1 FROM job_search_queue WHERE posting_id = old.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_delete
+BEFORE DELETE ON job_postings
+BEGIN
+    INSERT INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT old.id, 1, old.job_unique_id, old.job_title, old.employer, old.job_location, old.description_hash,
+        (SELECT details FROM job_details_text WHERE job_unique_id = old.job_unique_id)
+    WHERE NOT EXISTS (SELECT 1 FROM job_search_queue WHERE posting_id = old.id);
+END;
+
+/* These run before the change and read the details text as it was indexed */
+CREATE TRIGGER IF NOT EXISTS job_search_details_insert
+BEFORE INSERT ON job_details
+BEGIN
+    INSERT INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT p.id, 1, p.job_unique_id, p.job_title, p.employer, p.job_location, p.description_hash,
+        (SELECT t.details FROM job_details_text t WHERE t.job_unique_id = p.job_unique_id)
+    FROM job_postings p WHERE p.job_unique_id = new.job_unique_id
+        AND NOT EXISTS (SELECT 1 FROM job_search_queue q WHERE q.posting_id = p.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_details_update
+BEFORE UPDATE OF job_unique_id, position_summary, salary, location, employer, education, key_skills, employment_type,
+    work_environment, experience_level, responsibilities, benefits, industry ON job_details
+BEGIN
+    INSERT INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT p.id, 1, p.job_unique_id, p.job_title, p.employer, p.job_location, p.description_hash,
+        (SELECT t.details FROM job_details_text t WHERE t.job_unique_id = p.job_unique_id)
+    FROM job_postings p WHERE p.job_unique_id IN (old.job_unique_id, new.job_unique_id)
+        AND NOT EXISTS (SELECT 1 FROM job_search_queue q WHERE q.posting_id = p.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_search_details_delete
+BEFORE DELETE ON job_details
+BEGIN
+    INSERT INTO job_search_queue (posting_id, indexed, job_unique_id, job_title, employer, job_location,
+        description_hash, details)
+    SELECT p.id, 1, p.job_unique_id, p.job_title, p.employer, p.job_location, p.description_hash,
+        (SELECT t.details FROM job_details_text t WHERE t.job_unique_id = p.job_unique_id)
+    FROM job_postings p WHERE p.job_unique_id = old.job_unique_id
+        AND NOT EXISTS (SELECT 1 FROM job_search_queue q WHERE q.posting_id = p.id);
+END;
@@ -0,0 +1,21 @@
+/* The LLM export tracks each posting instead of an export_watermarks id: the description a posting's lines were
+   counted from and the one it was exported with. A posting waiting for its description no longer holds back the
+   ones after it, and a description that changes is counted and exported again. */
+CREATE TABLE IF NOT EXISTS llm_export_rows (
+    posting_id INTEGER PRIMARY KEY,
+    counted_hash TEXT,  -- description_hash whose lines are in description_lines
+    exported_hash TEXT,  -- description_hash last written to a shard
+    FOREIGN KEY (posting_id) REFERENCES job_postings(id)
+);
+
+/* Postings up to the old watermarks were counted and exported already */
+INSERT INTO llm_export_rows (posting_id, counted_hash, exported_hash)
+SELECT p.id,
+    CASE WHEN p.id <= COALESCE((SELECT last_id FROM export_watermarks WHERE table_name = 'description_lines'), 0)
+        THEN p.description_hash END,
+    CASE WHEN p.id <= COALESCE((SELECT last_id FROM export_watermarks WHERE table_name = 'llm_export'), 0)
+        THEN p.description_hash END
+FROM job_postings p
+WHERE p.description_status = 'done' AND p.duplicate_of IS NULL
+AND p.id <= MAX(COALESCE((SELECT last_id FROM export_watermarks WHERE table_name = 'description_lines'), 0),
+                COALESCE((SELECT last_id FROM export_watermarks WHERE table_name = 'llm_export'), 0));
@@ -0,0 +1,2 @@
+/* Neither export pages by id any more (see 014 and 017), export_watermarks only keeps the row counts */
+ALTER TABLE export_watermarks DROP COLUMN last_id;
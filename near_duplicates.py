@@ -0,0 +1,202 @@
+# Packages
+import hashlib
+import itertools
+import logging
+import re
+import zlib
+import numpy as np
+
+# Custom code
+from database_tools import DatabaseTools, description_status
+
+# Smallest prime above 2^32. Shingle hashes and the a, b coefficients are below 2^32, so a * x + b fits in a uint64.
+PRIME = 4294967311
+
+# Markdown link targets, emphasis and table characters, which differ between reposts of the same text
+MARKDOWN_NOISE = re.compile(r'\]\([^)]*\)|[^\w\s]')
+
+
+def shingles(text: str, size: int = 5):
+    """Returns the set of crc32 hashes of every run of size words in text, ignoring case and markdown."""
+    words = MARKDOWN_NOISE.sub(' ', text.lower()).split()
+    if len(words) <= size:
+        return {zlib.crc32(' '.join(words).encode('utf-8'))}
+    return {zlib.crc32(' '.join(words[i:i + size]).encode('utf-8')) for i in range(len(words) - size + 1)}
+
+
+class DuplicateIndex:
+    """MinHash/LSH index over stored job descriptions (the minhash_signatures and minhash_bands tables).
+
+    Each description gets a num_perm value MinHash signature, split into bands. Descriptions that share a
+    band are candidates, and a candidate whose estimated Jaccard similarity is at least threshold is a
+    near-duplicate. New postings are matched against older ones and their duplicate_of is set to the
+    first posting of the role.
+    """
+
+    def __init__(self,
+                 db: DatabaseTools = None,
+                 num_perm: int = 128,
+                 bands: int = 16,  # 16 bands of 8 rows finds most pairs above ~0.7 similarity
+                 threshold: float = 0.8,
+                 shingle_size: int = 5,
+                 seed: int = 1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.db = db or DatabaseTools()
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        # The seed fixes the hash functions, signatures stored by an earlier run must use the same ones
+        random_state = np.random.RandomState(seed)
+        self.a = random_state.randint(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self.b = random_state.randint(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+
+    """Signatures"""
+
+    def signature(self, text: str):
+        hashes = np.fromiter(shingles(text, self.shingle_size), dtype=np.uint64)
+        # One row per shingle, one column per hash function, keep the smallest value of each column
+        values = (np.outer(hashes, self.a) + self.b) % np.uint64(PRIME)
+        return values.min(axis=0).astype(np.uint32)
+
+    def _buckets(self, signature):
+        buckets = []
+        for band in range(self.bands):
+            digest = hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8).digest()
+            buckets.append((band, int.from_bytes(digest, 'big', signed=True)))
+        return buckets
+
+    def _candidates(self, cursor, signature, exclude=None):
+        """Returns [(job_unique_id, similarity)] of indexed descriptions that share a band with signature, best first."""
+        buckets = self._buckets(signature)
+        values = ', '.join(['(?, ?)' for _ in buckets])
+        cursor.execute(f'''
+            SELECT s.job_unique_id, s.signature FROM minhash_signatures s
+            WHERE s.job_unique_id IN (
+                SELECT job_unique_id FROM minhash_bands WHERE (band, bucket) IN (VALUES {values})
+            )
+        ''', [value for bucket in buckets for value in bucket])
+        matches = []
+        for job_unique_id, blob in cursor.fetchall():
+            if job_unique_id == exclude:
+                continue
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == signature))
+            matches.append((job_unique_id, similarity))
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+
+    """Main Functions"""
+
+    def add(self, descriptions):
+        """Indexes a batch of (job_unique_id, description) pairs and marks the ones that repeat an indexed posting.
+
+        Placeholder and missing descriptions are skipped. Returns the number of near-duplicates found.
+        """
+        n_duplicates = 0
+        with self.db.transaction(stage='db_duplicate_index') as cursor:
+            for job_unique_id, description in descriptions:
+                if description_status(description) != 'done':
+                    continue
+                signature = self.signature(description)
+                matches = [match for match in self._candidates(cursor, signature, exclude=job_unique_id)
+                           if match[1] >= self.threshold]
+                cursor.execute('DELETE FROM minhash_bands WHERE job_unique_id = ?', (job_unique_id,))
+                cursor.execute('INSERT OR REPLACE INTO minhash_signatures (job_unique_id, signature) VALUES (?, ?)',
+                               (job_unique_id, signature.tobytes()))
+                cursor.executemany('INSERT OR IGNORE INTO minhash_bands (band, bucket, job_unique_id) VALUES (?, ?, ?)',
+                                   [(band, bucket, job_unique_id) for band, bucket in self._buckets(signature)])
+                if matches:
+                    self._mark_duplicate(cursor, job_unique_id, matches[0][0])
+                    n_duplicates += 1
+        if n_duplicates:
+            logging.info(f'Found {n_duplicates} near-duplicate job descriptions.')
+        return n_duplicates
+
+    def _mark_duplicate(self, cursor, job_unique_id, original_id):
+        # Point at the first posting of the role, not at another duplicate
+        cursor.execute('''
+            UPDATE job_postings
+            SET duplicate_of = COALESCE((SELECT duplicate_of FROM job_postings WHERE job_unique_id = ?), ?)
+            WHERE job_unique_id = ? AND duplicate_of IS NULL
+        ''', (original_id, original_id, job_unique_id))
+
+    def update(self, chunk_size: int = 500):
+        """Indexes every stored description that isn't in the index yet, e.g. ones saved before it existed."""
+        n_indexed = 0
+        last_id = 0
+        while True:
+            rows = list(self.db.iter_query('''
+                SELECT p.id, p.job_unique_id, p.job_description FROM job_postings_full p
+                WHERE p.id > ? AND p.description_status = 'done'
+                AND NOT EXISTS (SELECT 1 FROM minhash_signatures s WHERE s.job_unique_id = p.job_unique_id)
+                ORDER BY p.id
+                LIMIT ?
+            ''', (last_id, chunk_size)))
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            self.add([(job_unique_id, description) for _, job_unique_id, description in rows])
+            n_indexed += len(rows)
+        if n_indexed:
+            logging.info(f'Added {n_indexed} job descriptions to the near-duplicate index.')
+        return n_indexed
+
+    def similar(self, job_unique_id: str = None, text: str = None, threshold: float = None, limit: int = 10):
+        """Returns [(job_unique_id, similarity)] of the postings most like a stored posting or a piece of text."""
+        threshold = self.threshold if threshold is None else threshold
+        if text is None:
+            text = self.db.get_description(job_unique_id)
+            if description_status(text) != 'done':
+                return []
+        self.db.connect()
+        matches = self._candidates(self.db.cursor, self.signature(text), exclude=job_unique_id)
+        return [match for match in matches if match[1] >= threshold][:limit]
+
+    def find_reposts(self, job_unique_ids):
+        """Returns {job_unique_id: (original_id, description)} for the postings whose title, employer and location
+        match an earlier posting that already has a description, so their page doesn't need fetching.
+        """
+        job_unique_ids = [x for x in job_unique_ids if x is not None]
+        if not job_unique_ids:
+            return {}
+        placeholders = ', '.join(['?' for _ in job_unique_ids])
+        rows = list(self.db.iter_query(f'''
+            SELECT p.job_unique_id, o.job_unique_id, o.job_description FROM job_postings p
+            JOIN job_postings_full o ON o.posting_key = p.posting_key AND o.job_unique_id != p.job_unique_id
+            WHERE p.job_unique_id IN ({placeholders}) AND o.description_status = 'done'
+            ORDER BY o.id DESC
+        ''', job_unique_ids))
+        # Ordered newest first, so the oldest original ends up in the dict
+        return {job_unique_id: (original_id, description) for job_unique_id, original_id, description in rows}
+
+    def mark_duplicates(self, pairs):
+        """Sets duplicate_of for a batch of (job_unique_id, original_id) pairs."""
+        with self.db.transaction() as cursor:
+            for job_unique_id, original_id in pairs:
+                self._mark_duplicate(cursor, job_unique_id, original_id)
+
+
+def skip_reposts(postings, task_queue, chunk_size: int = 100):
+    """Yields the (job_unique_id, job_link) postings that still need fetching.
+
+    Reposts of a role whose description is already stored are given a copy of it through task_queue.finish
+    instead of being fetched again.
+    """
+    index = DuplicateIndex(task_queue.db)
+    postings = iter(postings)
+    n_skipped = 0
+    while True:
+        chunk = list(itertools.islice(postings, chunk_size))
+        if not chunk:
+            break
+        reposts = index.find_reposts([job_unique_id for job_unique_id, _ in chunk])
+        if reposts:
+            task_queue.finish([(job_unique_id, description) for job_unique_id, (_, description) in reposts.items()])
+            index.mark_duplicates([(job_unique_id, original_id) for job_unique_id, (original_id, _) in reposts.items()])
+            n_skipped += len(reposts)
+        for job_unique_id, job_link in chunk:
+            if job_unique_id not in reposts:
+                yield job_unique_id, job_link
+    if n_skipped:
+        print(f'Skipped {n_skipped} reposted jobs, their descriptions were copied from the original posting.')
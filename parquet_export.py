@@ -0,0 +1,166 @@
+# Packages
+import logging
+import os
+import time
+import uuid
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Custom code
+from database_tools import DatabaseTools
+
+EXPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports')
+
+# SQLite declared type -> Arrow type. DATETIME columns hold 'YYYY-MM-DD HH:MM:SS' text and are parsed.
+ARROW_TYPES = {'INTEGER': pa.int64(), 'REAL': pa.float64(), 'TEXT': pa.string(), 'DATETIME': pa.timestamp('s')}
+# Declared INTEGER in ddl.sql but holding Indeed's text ids
+TEXT_COLUMNS = {'job_unique_id'}
+
+# The per-row flag of migrations/014_export_changes.sql, kept out of the files
+EXPORT_FLAG = 'exported'
+
+# What each table is exported with, and where its columns come from when that isn't the table itself. Rows that
+# changed since their last export are written, except those matching 'hold_back': postings still waiting for their
+# description, and searches that are still running. Those go out with a later export.
+EXPORTS = {
+    'search_sessions': {
+        'sql': 'SELECT {columns}, date(t.started_at) AS session_date FROM search_sessions t',
+        'hold_back': "t.ended_at IS NULL AND t.started_at > datetime('now', '-1 day')"
+    },
+    'job_postings': {
+        # With the descriptions decompressed
+        'columns_from': 'job_postings_full',
+        'sql': '''
+            SELECT {columns}, COALESCE(date(s.started_at), date(t.timestamp)) AS session_date
+            FROM job_postings_full t LEFT JOIN search_sessions s ON s.id = t.session_id
+        ''',
+        'hold_back': '''
+            EXISTS (SELECT 1 FROM description_tasks d
+                    WHERE d.job_unique_id = t.job_unique_id AND d.state IN ('pending', 'leased'))
+        '''
+    },
+    'job_details': {
+        'sql': '''
+            SELECT {columns}, COALESCE(date(s.started_at), date(t.timestamp)) AS session_date
+            FROM job_details t
+            LEFT JOIN job_postings p ON p.job_unique_id = t.job_unique_id
+            LEFT JOIN search_sessions s ON s.id = p.session_id
+        ''',
+        'hold_back': None
+    },
+}
+
+
+class ParquetExporter:
+    """Streams tables out of SQLite into Parquet files partitioned by session date (exports/<table>/session_date=...).
+
+    Rows go through Arrow record batches of batch_size rows, so memory stays bounded however big the tables
+    get. Each run appends the rows inserted or updated since they were last exported, as new part files (one per
+    batch and session date), so a row can be in several parts: load_export keeps its latest version (by changed_at).
+    """
+
+    def __init__(self, db: DatabaseTools = None, export_path: str = EXPORT_PATH, batch_size: int = 10000):
+        self.db = db or DatabaseTools()
+        self.export_path = export_path
+        self.batch_size = batch_size
+
+    def _schema(self, table_name):
+        fields = []
+        for _, name, declared_type, *_ in self.db.run_sql(f'PRAGMA table_info({table_name})'):
+            if name == EXPORT_FLAG:
+                continue
+            arrow_type = pa.string() if name in TEXT_COLUMNS else ARROW_TYPES.get(declared_type.upper(), pa.string())
+            fields.append(pa.field(name, arrow_type))
+        return pa.schema(fields + [pa.field('session_date', pa.string())])
+
+    def _record_batch(self, rows, schema):
+        columns = []
+        for i, field in enumerate(schema):
+            values = [row[i] for row in rows]
+            if pa.types.is_timestamp(field.type):
+                array = pc.strptime(pa.array(values, pa.string()), format='%Y-%m-%d %H:%M:%S', unit='s', error_is_null=True)
+            else:
+                array = pa.array(values, field.type)
+            columns.append(array)
+        return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+    def _mark_exported(self, cursor, table_name, exported):
+        """Sets the export flag of the (changed_at, id) rows written, unless they changed again since they were read."""
+        cursor.executemany(f'UPDATE {table_name} SET {EXPORT_FLAG} = 1 WHERE id = ? AND changed_at IS ?', exported)
+        cursor.execute('''
+            INSERT INTO export_watermarks (table_name, rows_exported, exported_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(table_name) DO UPDATE SET
+                rows_exported = rows_exported + excluded.rows_exported, exported_at = CURRENT_TIMESTAMP
+        ''', (table_name, len(exported)))
+
+    def _write_parts(self, table_name, batch):
+        """Writes a record batch as one new part file per session date in it."""
+        part_name = f'part-{time.strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}.parquet'
+        dates = batch.column('session_date')
+        for session_date in pc.unique(dates).to_pylist():
+            mask = pc.is_null(dates) if session_date is None else pc.equal(dates, session_date)
+            directory = os.path.join(self.export_path, table_name, f'session_date={session_date or "unknown"}')
+            os.makedirs(directory, exist_ok=True)
+            # Renamed into place once complete, so a crash never leaves a half-written part
+            path = os.path.join(directory, part_name)
+            pq.write_table(pa.Table.from_batches([batch.filter(mask).drop_columns(['session_date'])]), f'{path}.tmp',
+                           compression='zstd')
+            os.replace(f'{path}.tmp', path)
+
+    def export_table(self, table_name):
+        """Appends the rows of table_name inserted or updated since their last export. Returns the number of rows written.
+
+        Rows are read batch_size at a time by keyset paging on id. Each batch is written to its own part files and
+        then flagged in a transaction of its own, so an interrupted export keeps the batches it finished. At worst
+        a batch is exported twice, which load_export takes care of.
+        """
+        export = EXPORTS[table_name]
+        schema = self._schema(export.get('columns_from', table_name))
+        sql = export['sql'].format(columns=', '.join(f't.{name}' for name in schema.names if name != 'session_date'))
+        sql += f' WHERE t.{EXPORT_FLAG} = 0 AND t.id > ?'
+        if export['hold_back']:
+            sql += f" AND NOT ({export['hold_back']})"
+        sql += ' ORDER BY t.id LIMIT ?'
+
+        n_rows = 0
+        last_id = 0
+        id_index, changed_index = schema.get_field_index('id'), schema.get_field_index('changed_at')
+        while True:
+            rows = list(self.db.iter_query(sql, (last_id, self.batch_size)))
+            if not rows:
+                break
+            last_id = rows[-1][id_index]
+            self._write_parts(table_name, self._record_batch(rows, schema))
+            with self.db.transaction(stage='db_mark_exported') as cursor:
+                self._mark_exported(cursor, table_name, [(row[id_index], row[changed_index]) for row in rows])
+            n_rows += len(rows)
+        logging.info(f'Exported {n_rows} new or updated rows of {table_name} to Parquet.')
+        return n_rows
+
+    def export_all(self):
+        """Exports every table in EXPORTS and returns {table_name: rows written}."""
+        started = time.perf_counter()
+        counts = {table_name: self.export_table(table_name) for table_name in EXPORTS}
+        print(f'Exported {counts} new rows to {self.export_path} in {time.perf_counter() - started:.1f}s.')
+        return counts
+
+
+def load_export(table_name: str, columns=None, filters=None, export_path: str = EXPORT_PATH):
+    """Reads an exported table into a DataFrame, only reading the given columns and the partitions that match filters.
+
+    A row exported more than once (it was updated in between) comes back once, as its latest version.
+    e.g. load_export('job_postings', columns=['job_title', 'employer'], filters=ds.field('session_date') >= '2024-06-01')
+    """
+    dataset = ds.dataset(os.path.join(export_path, table_name), format='parquet', partitioning='hive')
+    # Parts written before rows had changed_at lack the column, so the schema is taken from every part
+    schema = pa.unify_schemas([dataset.schema] + [fragment.physical_schema for fragment in dataset.get_fragments()])
+    dataset = ds.dataset(os.path.join(export_path, table_name), schema=schema, format='parquet', partitioning='hive')
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + ['id', 'changed_at']))
+    df = dataset.to_table(columns=read_columns, filter=filters).to_pandas()
+    # Those parts have it null, and are older than any that do
+    df = df.sort_values('changed_at', na_position='first', kind='stable').drop_duplicates('id', keep='last')
+    df = df.sort_values('id').reset_index(drop=True)
+    return df if columns is None else df[list(columns)]
@@ -0,0 +1,450 @@
+# Packages
+import asyncio
+import functools
+import itertools
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+
+# Custom code
+from database_tools import DatabaseTools
+from description_store import compact_descriptions
+from html_cache import HtmlCache
+from http_fetcher import HttpJobFetcher
+from indeed_parsers import parse_mosaic_job_cards, requires_browser
+from indeed_scraper import IndeedScraper, EXTRACT_JOB_CARDS_JS, JOB_PAGE_HTML_JS, VERIFICATION_JS, DESCRIPTION_STATE_JS
+from job_details_extractor import extract_new_details
+from markdown_pipeline import MarkdownConverter
+from metrics import LatencyHistogram, report_run
+from near_duplicates import skip_reposts
+from rate_control import shared_rate_controller
+from selenium_base import Browsers, SeleniumScraper
+from task_queue import DescriptionQueue
+
+# Browsers value -> (Playwright browser type, channel). Chrome and Edge run the installed browser, like Selenium does.
+PLAYWRIGHT_BROWSERS = {
+    Browsers.FIREFOX: ('firefox', None),
+    Browsers.CHROME: ('chromium', 'chrome'),
+    Browsers.EDGE: ('chromium', 'msedge'),
+}
+
+# Requests the performance profile aborts. Only text and scripts are needed to scrape.
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font', 'stylesheet'}
+
+
+def as_function(script: str):
+    """Wraps a Selenium execute_script body (which `return`s its result) for Playwright's evaluate."""
+    return f'() => {{{script}}}'
+
+
+# True once the job page shows anything but a blank, loading page
+DESCRIPTION_LOADED_JS = f'() => (function () {{{DESCRIPTION_STATE_JS}}})() !== null'
+
+
+class Tab:
+    """A page of the shared browser context, replaced with a fresh one after recycle_after_pages loads."""
+
+    def __init__(self, page):
+        self.page = page
+        self.loads = 0
+
+
+class PlaywrightScraper:
+    """asyncio backend with the same search_for_jobs / get_job_html surface as IndeedScraper.
+
+    Everything runs in one browser process: `tabs` pages share one context (cookies and cache), and each
+    keeps a page load in flight, so one process does the work of `tabs` Selenium browsers in far less memory.
+    Page loads take slots from the shared RateController like the Selenium ones do. There is no one to click
+    through a verification page in a background tab, so those are reported to the rate controller and left
+    for a later attempt.
+    """
+
+    SortBy = IndeedScraper.SortBy
+    Country = IndeedScraper.Country
+    build_query_url = IndeedScraper.build_query_url
+
+    def __init__(self,
+                 browser: str = Browsers.FIREFOX,
+                 tabs: int = 8,
+                 wait_timeouts: dict = None,
+                 performance_profile: bool = False,
+                 html_cache: HtmlCache = None,
+                 rate_controller=None,
+                 recycle_after_pages: int = 200,
+                 capture_json: bool = True):
+        if browser not in PLAYWRIGHT_BROWSERS:
+            raise ValueError(f"Unsupported browser: {browser}")
+        self.browser = browser
+        self.tabs = tabs
+        # Same waits as the Selenium scraper, plus how long page.goto may take
+        self.wait_timeouts = {**SeleniumScraper.DEFAULT_WAIT_TIMEOUTS, 'navigation': 30, **(wait_timeouts or {})}
+        # Headless, no images/fonts/css
+        self.performance_profile = performance_profile
+        self.html_cache = html_cache
+        self.rate_controller = rate_controller or shared_rate_controller()
+        self.recycle_after_pages = recycle_after_pages
+        # Read job cards from the inline JSON in the results page response, see IndeedScraper.extract_job_cards
+        self.capture_json = capture_json
+        self.latency = LatencyHistogram()
+        self.database = None
+        self.session_id = None
+        self.url = None
+        self.playwright = None
+        self.browser_process = None
+        self.context = None
+        # The description run's sqlite work (claims, saved descriptions) runs here, off the event loop. One thread,
+        # because its connection can't be shared between threads.
+        self.db_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='playwright-db')
+
+    async def __aenter__(self):
+        await self.open_browser()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close_browser()
+        self.db_thread.shutdown()
+
+    async def in_db_thread(self, function, *args):
+        """Runs function(*args) on the database thread without blocking the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(self.db_thread, functools.partial(function, *args))
+
+    """BROWSER ACTIONS"""
+
+    async def open_browser(self):
+        with self.latency.time('open_browser'):
+            print(f'Opening {self.browser} browser with Playwright...')
+            engine, channel = PLAYWRIGHT_BROWSERS[self.browser]
+            self.playwright = await async_playwright().start()
+            self.browser_process = await getattr(self.playwright, engine).launch(
+                headless=self.performance_profile, channel=channel)
+            self.context = await self.browser_process.new_context(viewport={'width': 1280, 'height': 800})
+            if self.performance_profile:
+                await self.context.route('**/*', self._block_resources)
+
+    async def _block_resources(self, route):
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def close_browser(self):
+        if self.context is not None:
+            await self.context.close()
+            await self.browser_process.close()
+            await self.playwright.stop()
+        self.context = self.browser_process = self.playwright = None
+
+    async def new_tab(self):
+        return Tab(await self.context.new_page())
+
+    async def go_to_url(self, tab: Tab, url: str):
+        """Loads url on tab and returns the Playwright response of the page."""
+        if self.recycle_after_pages and tab.loads >= self.recycle_after_pages:
+            await tab.page.close()
+            tab.page = await self.context.new_page()
+            tab.loads = 0
+        with self.latency.time('rate_wait'):
+            await self.rate_controller.acquire_async(url)
+        outcome = 'error'
+        try:
+            with self.latency.time('go_to_url'):
+                response = await tab.page.goto(url, wait_until='domcontentloaded',
+                                               timeout=self.wait_timeouts['navigation'] * 1000)
+            # One outcome per page, a verification page is pushback rather than a success
+            outcome = 'challenge' if await self.is_verification_page(tab) else 'ok'
+        finally:
+            self.rate_controller.release(url, outcome)
+        tab.loads += 1
+        self.url = url
+        return response
+
+    async def wait_for_job_cards(self, tab: Tab):
+        with self.latency.time('cards_present'):
+            try:
+                return await tab.page.wait_for_selector('.cardOutline', timeout=self.wait_timeouts['page_load'] * 1000)
+            except PlaywrightTimeoutError:
+                print(f'Timed out after {self.wait_timeouts["page_load"]}s waiting for cards_present')
+                return None
+
+    async def close_popup(self, tab: Tab):
+        button = tab.page.locator('button[aria-label="close"]')
+        if await button.count():
+            try:
+                await button.first.click()
+                await button.first.wait_for(state='hidden', timeout=self.wait_timeouts['popup'] * 1000)
+            except PlaywrightTimeoutError:
+                pass
+
+    async def is_verification_page(self, tab: Tab):
+        return bool(await tab.page.evaluate(as_function(VERIFICATION_JS)))
+
+    """Parsing Functions"""
+
+    async def get_filter_items(self, tab: Tab):
+        """Returns the list of filter tags from an in Indeed job search results list."""
+        menu_items = []
+        for dropdown in await tab.page.locator('.yosegi-FilterPill-dropdownPillContainer').all():
+            button = dropdown.locator('button').first
+            if ((await button.get_attribute('id')) or '').startswith('filter'):
+                await button.click()
+                options = await dropdown.locator('.yosegi-FilterPill-dropdownListItemLink').all_inner_texts()
+                menu_items.append({'name': await button.inner_text(), 'options': options})
+        logging.log(logging.INFO, f'Filter items found: {menu_items}')
+        return menu_items
+
+    async def extract_job_cards(self, tab: Tab, response=None):
+        """Job cards from the inline job data in the page's network response, or from the card elements without it."""
+        with self.latency.time('extract_cards'):
+            cards = None
+            if self.capture_json and response is not None:
+                try:
+                    cards = parse_mosaic_job_cards(await response.text(), base_url=tab.page.url)
+                except Exception as e:
+                    logging.info(f'Could not read the results page response: {e}')
+            if not cards:
+                cards = await tab.page.evaluate(as_function(EXTRACT_JOB_CARDS_JS))
+        logging.log(logging.INFO, f'Job cards found: {len(cards)}')
+        return cards
+
+    """Main Functions"""
+
+    async def search_for_jobs(self, max_pages=2, incremental=False, known_ratio=0.9, on_new_postings=None, resume=True,
+                              **search_params):
+        """IndeedScraper.search_for_jobs on one tab, with the same sessions, checkpoints and incremental stop.
+
+        A verification page stops the search without ending its session, so the next run resumes it.
+        """
+        current_page = 0
+        new_postings = 0
+        seen_postings = 0
+        session_id = None
+        # Timings are reported per search session
+        started = time.perf_counter()
+        self.latency = LatencyHistogram()
+        if incremental and search_params.get('sort_by') != self.SortBy.DATE:
+            print('Incremental search works best sorted by date, results sorted by relevance are not chronological.')
+
+        if self.database is None:
+            self.database = DatabaseTools()
+        self.database.latency = LatencyHistogram()
+        search_key = json.dumps(search_params, sort_keys=True)
+        checkpoint = self.database.find_resumable_session(search_key)
+        if checkpoint is not None and resume and checkpoint[1] < max_pages:
+            session_id, current_page, new_postings, seen_postings = checkpoint
+            print(f'Resuming session {session_id} after page {current_page}.')
+        elif checkpoint is not None:
+            # Restarted, or it already has the pages asked for: a new session takes over, so end this one
+            self.database.end_session(checkpoint[0])
+            print(f'Ended unfinished session {checkpoint[0]} after page {checkpoint[1]}, starting a new one.')
+
+        interrupted = False
+        tab = await self.new_tab()
+        try:
+            while current_page < max_pages:
+                print(f'Page {current_page+1} of {max_pages}')
+                page_started = time.perf_counter()
+                url = self.build_query_url(page_number=current_page+1, **search_params)
+                response = await self.go_to_url(tab, url)
+                await self.wait_for_job_cards(tab)
+                if await self.is_verification_page(tab):
+                    print('Human verification required, stopping the search here. The next run resumes it.')
+                    interrupted = True
+                    break
+                await self.close_popup(tab)
+
+                if session_id is None:
+                    # create a new search session record in the database
+                    filter_items = await self.get_filter_items(tab)
+                    session_id = self.database.start_new_session(
+                        terms=search_params['keywords'],
+                        location=search_params['location'],
+                        filter_tags=str(json.dumps(filter_items)),
+                        n_pages=max_pages,
+                        search_params=search_key
+                    )
+                    self.session_id = session_id
+
+                page_postings = [{**card, 'session_id': session_id} for card in await self.extract_job_cards(tab, response)]
+                if on_new_postings is not None:
+                    known = self.database.known_job_ids([card['job_unique_id'] for card in page_postings])
+                    new_cards = [card for card in page_postings if card['job_unique_id'] not in known]
+
+                # Write the whole page in one transaction, duplicates are ignored and not counted as new
+                page_new = self.database.insert_job_postings(page_postings)
+                if on_new_postings is not None:
+                    on_new_postings(new_cards)
+                page_seen = len(page_postings) - page_new
+                new_postings += page_new
+                seen_postings += page_seen
+
+                current_page += 1
+                # Checkpoint, a crash from here on resumes with the next page
+                self.database.update_session_counts(session_id, current_page, new_postings, seen_postings, last_url=url)
+                self.latency.observe('results_page', time.perf_counter() - page_started)
+
+                if incremental and page_postings and page_seen / len(page_postings) >= known_ratio:
+                    print(f'{page_seen} of {len(page_postings)} postings on page {current_page} were already known. Stopping.')
+                    break
+        finally:
+            await tab.page.close()
+
+        if session_id is None:
+            return
+        print(f'Session {session_id}: {new_postings} new and {seen_postings} already known postings over {current_page} pages.')
+        if not interrupted:
+            self.database.end_session(session_id)
+        self.latency.merge(self.database.latency)
+        report_run('search', self.latency, time.perf_counter() - started, pages=current_page,
+                   jobs=new_postings + seen_postings, db=self.database, session_id=session_id)
+
+    """Obtaining the job description from the job page."""
+
+    async def get_job_html(self, url: str, job_unique_id: str = None, tab: Tab = None):
+        """Returns the job description HTML for url, loaded on tab, or None if the page showed a verification check.
+        Cached pages are returned without loading the page, like IndeedScraper.get_job_html."""
+        with self.latency.time('get_job_html'):
+            return await self._get_job_html(url, job_unique_id, tab)
+
+    async def _get_job_html(self, url, job_unique_id, tab):
+        if self.html_cache is not None and job_unique_id is not None:
+            cached_html = await asyncio.to_thread(self.html_cache.get, job_unique_id)
+            if cached_html is not None:
+                return cached_html
+
+        await self.go_to_url(tab, url)
+        with self.latency.time('description_ready'):
+            try:
+                await tab.page.wait_for_function(DESCRIPTION_LOADED_JS, polling=100,
+                                                 timeout=self.wait_timeouts['page_load'] * 1000)
+            except PlaywrightTimeoutError:
+                print(f'Timed out after {self.wait_timeouts["page_load"]}s waiting for description_ready')
+
+        # The job component and its JSON-LD job data, or the whole page when the job links out to a different website
+        description_html = await tab.page.evaluate(as_function(JOB_PAGE_HTML_JS))
+        if await self.is_verification_page(tab):
+            logging.info(f'Human verification required for {url}')
+            return None
+        if description_html is None:
+            logging.info(f'No job description found on {url}')
+            return None
+
+        if (self.html_cache is not None and job_unique_id is not None
+                and description_html is not None and not requires_browser(description_html)):
+            await asyncio.to_thread(self.html_cache.put, job_unique_id, description_html)
+        return description_html
+
+    async def fetch_descriptions(self, postings, converter: MarkdownConverter, use_http: bool = False,
+                                 chunk_size: int = 100):
+        """Fetches the job page of every (job_unique_id, job_link) on all tabs at once and hands the HTML to converter.
+
+        With use_http, each chunk is tried over plain HTTP first and only the pages that need a browser go to the tabs.
+        postings is read and converter is fed on the database thread (see in_db_thread), since both may write to
+        sqlite: iter_claims leases tasks and the converter's sink saves descriptions.
+        """
+        tasks = asyncio.Queue(maxsize=self.tabs * 2)
+        fetcher = HttpJobFetcher(rate_controller=self.rate_controller) if use_http else None
+        stats = {'fetched': 0, 'failed': 0}
+        started = time.perf_counter()
+
+        async def produce():
+            remaining = iter(postings)
+            while True:
+                chunk = await self.in_db_thread(lambda: list(itertools.islice(remaining, chunk_size)))
+                if not chunk:
+                    break
+                if fetcher is not None:
+                    fetched, chunk = await fetcher.fetch_all(chunk)
+                    for job_unique_id, job_html in fetched:
+                        if self.html_cache is not None:
+                            await asyncio.to_thread(self.html_cache.put, job_unique_id, job_html)
+                        await self.in_db_thread(converter.add, job_unique_id, job_html)
+                    stats['fetched'] += len(fetched)
+                for posting in chunk:
+                    await tasks.put(posting)
+            for _ in range(self.tabs):
+                await tasks.put(None)
+
+        async def work(tab):
+            while True:
+                posting = await tasks.get()
+                if posting is None:
+                    break
+                job_unique_id, job_link = posting
+                try:
+                    job_html = await self.get_job_html(job_link, job_unique_id, tab)
+                except Exception as e:
+                    logging.warning(f'Failed to fetch {job_link}: {e}')
+                    job_html = None
+                # Converted and saved in batches, a failed fetch (None) is retried by a later run
+                await self.in_db_thread(converter.add, job_unique_id, job_html)
+                stats['failed' if job_html is None else 'fetched'] += 1
+
+        tabs = [await self.new_tab() for _ in range(self.tabs)]
+        try:
+            await asyncio.gather(produce(), *(work(tab) for tab in tabs))
+        finally:
+            for tab in tabs:
+                await tab.page.close()
+        print(f'Fetched {stats["fetched"]} job pages ({stats["failed"]} failed) on {self.tabs} tabs '
+              f'in {time.perf_counter() - started:.1f}s.')
+        return stats
+
+
+async def run(max_pages=15, dont_search=False, dont_update_job_descriptions=False, description_batch_size=25, tabs=8,
+              use_http=False, performance_profile=False, incremental=False, use_html_cache=True, fetch_reposts=False,
+              resume=True, browser=Browsers.FIREFOX, **search_params):
+    """indeed_scraper.main on the Playwright backend: one browser, searched on one tab and backfilled on `tabs` tabs."""
+    html_cache = HtmlCache() if use_html_cache else None
+    async with PlaywrightScraper(browser=browser, tabs=tabs, performance_profile=performance_profile,
+                                 html_cache=html_cache) as scraper:
+        if dont_search:
+            print(f'Skipping search. Only updating job descriptions.')
+        else:
+            print(f'Searching for {max_pages} pages of job postings.')
+            await scraper.search_for_jobs(max_pages=max_pages, incremental=incremental, resume=resume, **search_params)
+
+        if dont_update_job_descriptions:
+            print('Skipping job description updates.')
+            return
+
+        def open_queue():
+            # On the database thread, which keeps the connection for the whole description run
+            db = DatabaseTools()
+            task_queue = DescriptionQueue(db)
+            task_queue.enqueue_pending()
+            print(f'Description tasks: {task_queue.counts()}')
+            task_queue.duplicate_index.update()
+            postings = task_queue.iter_claims(description_batch_size)
+            if not fetch_reposts:
+                postings = skip_reposts(postings, task_queue)
+            return db, task_queue, postings
+
+        db, task_queue, postings = await scraper.in_db_thread(open_queue)
+        # Timings for the description run, separate from the search's
+        scraper.latency = LatencyHistogram()
+        started = time.perf_counter()
+        converter = MarkdownConverter(sink=task_queue.finish, batch_size=description_batch_size, latency=scraper.latency)
+        try:
+            await scraper.fetch_descriptions(postings, converter, use_http=use_http)
+        finally:
+            await scraper.in_db_thread(converter.close)
+            await scraper.in_db_thread(task_queue.release)
+        scraper.latency.merge(db.latency)
+        await scraper.in_db_thread(functools.partial(report_run, 'descriptions', scraper.latency,
+                                                     time.perf_counter() - started, jobs=converter.converted, db=db))
+        await scraper.in_db_thread(db.close)
+
+    if html_cache is not None:
+        html_cache.log_stats()
+    print('All job postings updated.')
+    # Trains a compression dictionary once enough descriptions are stored
+    compact_descriptions()
+    # Fill job_details for the postings that just got a description
+    extract_new_details(html_cache=html_cache)
+
+
+def main(**kwargs):
+    """Synchronous entry point for run, takes the same arguments."""
+    asyncio.run(run(**kwargs))
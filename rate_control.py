@@ -0,0 +1,264 @@
+# Packages
+import asyncio
+import atexit
+import functools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Custom code
+from database_tools import DatabaseTools
+
+
+def domain_of(url: str):
+    """www.indeed.com -> indeed.com, ca.indeed.com stays ca.indeed.com (it is rate limited on its own)."""
+    host = urlparse(url).hostname or url
+    return host[4:] if host.startswith('www.') else host
+
+
+class DomainState:
+    def __init__(self, concurrency, delay):
+        self.concurrency = concurrency  # float, only its integer part is used as the limit
+        self.delay = delay  # seconds between the start of two requests
+        self.in_flight = 0
+        self.last_start = 0.0
+        self.paused_until = 0.0
+        self.pauses = 0  # pauses in a row, each one is twice as long as the last
+        self.successes = 0  # since the last increase
+        self.outcomes = deque()  # the last `window` outcomes: 'ok', 'challenge' or 'error'
+
+
+class RateController:
+    """Per-domain AIMD control of how many requests run at once and how far apart they start.
+
+    One controller is shared by every scraper in the process (see shared_rate_controller). Each round of
+    successful requests adds one to the concurrency and takes delay_step off the delay. A verification
+    challenge halves the concurrency and doubles the delay, an error takes a quarter off. When challenges
+    make up challenge_threshold of the recent window the domain is paused, and resumes on its own.
+    Every change is logged and saved to the rate_decisions table by a background thread, so a busy database
+    never holds up the threads (or the event loop) waiting for a request slot.
+    """
+
+    def __init__(self,
+                 initial_concurrency: int = 4,
+                 min_concurrency: int = 1,
+                 max_concurrency: int = 16,
+                 min_delay: float = 0.0,
+                 max_delay: float = 30.0,
+                 delay_step: float = 0.25,
+                 window: int = 20,
+                 challenge_threshold: float = 0.3,
+                 pause_seconds: float = 60.0,
+                 max_pause_seconds: float = 900.0,
+                 db_name: str = 'indeed.db',
+                 database_factory=None,  # called once on the decision writer thread, defaults to DatabaseTools(db_name)
+                 save_decisions: bool = True):
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay_step = delay_step
+        self.window = window
+        self.challenge_threshold = challenge_threshold
+        self.pause_seconds = pause_seconds
+        self.max_pause_seconds = max_pause_seconds
+        # The database is already set up by the scrapers, so the writer doesn't rerun the DDL and migrations
+        self.database_factory = database_factory or functools.partial(DatabaseTools, setup=False, db_name=db_name)
+        self.save_decisions = save_decisions
+        self.domains = {}
+        self.condition = threading.Condition()
+        # Decisions are made under self.condition and saved by the writer thread, outside of it
+        self.decisions = queue.Queue()
+        self.writer = None
+
+    def _state(self, domain):
+        if domain not in self.domains:
+            self.domains[domain] = DomainState(self.initial_concurrency, self.min_delay)
+        return self.domains[domain]
+
+    """Taking and giving back request slots"""
+
+    def _try_acquire(self, domain):
+        """Takes a slot if domain allows another request now. Returns 0 if it did, or how long to wait before trying again."""
+        now = time.time()
+        state = self._state(domain)
+        if state.paused_until > now:
+            return state.paused_until - now
+        if state.paused_until:
+            state.paused_until = 0.0
+            self._decide(domain, state, 'resume', 'pause over')
+        if state.in_flight >= int(state.concurrency):
+            return 0.05
+        wait = state.last_start + state.delay - now
+        if wait > 0:
+            return wait
+        state.in_flight += 1
+        state.last_start = now
+        return 0
+
+    def acquire(self, url: str):
+        """Blocks until url's domain allows another request, and takes a slot."""
+        domain = domain_of(url)
+        with self.condition:
+            while True:
+                wait = self._try_acquire(domain)
+                if not wait:
+                    return
+                self.condition.wait(timeout=wait)
+
+    async def acquire_async(self, url: str):
+        """acquire for coroutines, sleeping on the event loop instead of blocking it."""
+        domain = domain_of(url)
+        while True:
+            with self.condition:
+                wait = self._try_acquire(domain)
+            if not wait:
+                return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def release(self, url: str, outcome: str = 'ok'):
+        """Gives the slot back and records how the request went: 'ok', 'challenge' or 'error'.
+
+        Each page gets one outcome, so callers check for a verification page before releasing as 'ok'.
+        """
+        domain = domain_of(url)
+        with self.condition:
+            state = self._state(domain)
+            state.in_flight = max(0, state.in_flight - 1)
+            self._record(domain, state, outcome)
+            self.condition.notify_all()
+
+    @contextmanager
+    def request(self, url: str):
+        """Holds a slot for the enclosed request. An exception counts as an error."""
+        self.acquire(url)
+        try:
+            yield
+        except Exception:
+            self.release(url, 'error')
+            raise
+        self.release(url, 'ok')
+
+    """AIMD"""
+
+    def _record(self, domain, state, outcome):
+        state.outcomes.append(outcome)
+        while len(state.outcomes) > self.window:
+            state.outcomes.popleft()
+
+        if outcome == 'ok':
+            state.successes += 1
+            # One round of successes at the current concurrency earns one more slot
+            if state.successes >= max(1, int(state.concurrency)):
+                state.successes = 0
+                if state.concurrency < self.max_concurrency or state.delay > self.min_delay:
+                    state.concurrency = min(self.max_concurrency, state.concurrency + 1)
+                    state.delay = max(self.min_delay, state.delay - self.delay_step)
+                    state.pauses = 0
+                    self._decide(domain, state, 'increase', 'round of successful requests')
+            return
+
+        state.successes = 0
+        if outcome == 'challenge':
+            state.concurrency = max(self.min_concurrency, state.concurrency / 2)
+            state.delay = min(self.max_delay, max(state.delay * 2, 1.0))
+            challenges = state.outcomes.count('challenge')
+            if challenges >= 3 and challenges / len(state.outcomes) >= self.challenge_threshold:
+                seconds = min(self.max_pause_seconds, self.pause_seconds * 2 ** state.pauses)
+                state.pauses += 1
+                state.outcomes.clear()
+                self.pause(domain, seconds, f'{challenges} challenges in the last {self.window} requests')
+            else:
+                self._decide(domain, state, 'decrease', 'verification challenge')
+        else:
+            state.concurrency = max(self.min_concurrency, state.concurrency * 0.75)
+            state.delay = min(self.max_delay, state.delay + self.delay_step)
+            self._decide(domain, state, 'decrease', 'request error')
+
+    def pause(self, domain: str, seconds: float, reason: str = 'manual'):
+        """Stops new requests to domain for seconds. Requests already running finish normally."""
+        with self.condition:
+            state = self._state(domain)
+            state.paused_until = time.time() + seconds
+            self._decide(domain, state, 'pause', f'{reason}, for {seconds:.0f}s')
+            self.condition.notify_all()
+
+    def resume(self, domain: str):
+        with self.condition:
+            state = self._state(domain)
+            if state.paused_until:
+                state.paused_until = 0.0
+                self._decide(domain, state, 'resume', 'manual')
+            self.condition.notify_all()
+
+    def _decide(self, domain, state, decision, reason):
+        n_outcomes = len(state.outcomes) or 1
+        challenge_rate = state.outcomes.count('challenge') / n_outcomes
+        error_rate = state.outcomes.count('error') / n_outcomes
+        logging.info(f'Rate control {domain}: {decision} ({reason}), concurrency={int(state.concurrency)} '
+                     f'delay={state.delay:.2f}s challenge_rate={challenge_rate:.0%} error_rate={error_rate:.0%}')
+        if not self.save_decisions:
+            return
+        self.decisions.put((domain, decision, reason, int(state.concurrency), state.delay, challenge_rate, error_rate))
+        if self.writer is None:
+            self.writer = threading.Thread(target=self._write_decisions, name='rate-decision-writer', daemon=True)
+            self.writer.start()
+
+    def _write_decisions(self):
+        db = None
+        while True:
+            decision = self.decisions.get()
+            if decision is None:
+                self.decisions.task_done()
+                break
+            try:
+                if db is None:
+                    db = self.database_factory()
+                db.save_rate_decision(*decision)
+            except Exception as e:
+                logging.warning(f'Could not save rate control decision: {e}')
+            finally:
+                self.decisions.task_done()
+        if db is not None:
+            db.close()
+
+    def flush(self):
+        """Waits until every decision made so far is saved."""
+        self.decisions.join()
+
+    def close(self):
+        """Saves the decisions still queued and stops the writer thread. The writer is a daemon, anything it hasn't
+        saved when the process exits is lost, so the shared controller is closed at exit."""
+        with self.condition:
+            writer, self.writer = self.writer, None
+        if writer is not None:
+            self.decisions.put(None)
+            writer.join()
+
+    def snapshot(self):
+        """Returns the current limits of every domain, e.g. for logging."""
+        with self.condition:
+            return {domain: {'concurrency': int(state.concurrency), 'delay': state.delay, 'in_flight': state.in_flight,
+                             'paused_for': max(0.0, state.paused_until - time.time())}
+                    for domain, state in self.domains.items()}
+
+
+_shared_controller = None
+_shared_lock = threading.Lock()
+
+
+def shared_rate_controller(**kwargs):
+    """The RateController every scraper in this process uses by default. kwargs only apply to the first call,
+    which creates it, e.g. shared_rate_controller(db_name='benchmark.db').
+    """
+    global _shared_controller
+    with _shared_lock:
+        if _shared_controller is None:
+            _shared_controller = RateController(**kwargs)
+            atexit.register(_shared_controller.close)
+        return _shared_controller
@@ -0,0 +1,160 @@
+# Packages
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Custom code
+from database_tools import DatabaseTools
+from description_workers import DescriptionWorkerPool
+from indeed_scraper import IndeedScraper
+from near_duplicates import skip_reposts
+from selenium_base import Browsers
+from task_queue import DescriptionQueue
+
+
+def load_job_spec(path: str):
+    """Reads a job spec file (.json, .yaml or .yml) and returns the list of searches it describes.
+
+    The file has optional "defaults" shared by every search and a list of "searches". A search can give
+    lists of keywords and locations, which are expanded into every keyword x location combination:
+
+        {
+            "defaults": {"country": "USA", "sort_by": "date", "max_pages": 5, "incremental": true},
+            "searches": [
+                {"keywords": ["Data Analyst", "Data Engineer"], "location": ["Remote", "New York"]},
+                {"keywords": "Engineering", "location": "Toronto", "country": "CANADA", "sort_by": "relevance"}
+            ]
+        }
+    """
+    with open(path, 'r') as f:
+        if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+            import yaml  # only needed for YAML specs
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    defaults = {'country': 'USA', 'sort_by': 'date', 'max_pages': 5, 'incremental': False}
+    defaults.update(spec.get('defaults', {}))
+
+    searches = []
+    for entry in spec['searches']:
+        entry = {**defaults, **entry}
+        keywords = entry['keywords'] if isinstance(entry['keywords'], list) else [entry['keywords']]
+        locations = entry['location'] if isinstance(entry['location'], list) else [entry['location']]
+        for keyword in keywords:
+            for location in locations:
+                searches.append({
+                    'keywords': keyword,
+                    'location': location,
+                    'country': getattr(IndeedScraper.Country, entry['country'].upper()),
+                    'sort_by': getattr(IndeedScraper.SortBy, entry['sort_by'].upper()),
+                    'max_pages': entry['max_pages'],
+                    'incremental': entry['incremental']
+                })
+    return searches
+
+
+class SearchScheduler:
+    """Runs many searches at once on a bounded number of browsers, fetching descriptions as results come in.
+
+    search_browsers browsers run the searches and description_workers browsers fetch the descriptions of
+    new postings while the searches are still paging. Postings found by more than one search are only
+    fetched once.
+    """
+
+    def __init__(self,
+                 search_browsers: int = 2,
+                 description_workers: int = 2,
+                 browser: str = Browsers.FIREFOX,
+                 performance_profile: bool = False,
+                 description_batch_size: int = 25,
+                 html_cache=None):
+        self.search_browsers = search_browsers
+        self.browser = browser
+        self.performance_profile = performance_profile
+        self.description_batch_size = description_batch_size
+        # Leases the pending descriptions of earlier runs, so the pool's writer may close and renew them
+        self.task_owner = DescriptionQueue.new_owner()
+        self.description_pool = DescriptionWorkerPool(
+            workers=description_workers,
+            browser=browser,
+            batch_size=description_batch_size,
+            performance_profile=performance_profile,
+            html_cache=html_cache,
+            task_owner=self.task_owner
+        )
+        self.queued_ids = set()
+        self.queued_lock = threading.Lock()
+        self.thread_state = threading.local()
+        # Every search thread's scraper, so their browsers can be closed once all searches are done
+        self.scrapers = []
+
+    def _scraper(self):
+        # One scraper per search thread. Its sqlite connection can only be used on the thread that made it.
+        # The browser stays open between the thread's searches.
+        if not hasattr(self.thread_state, 'scraper'):
+            self.thread_state.scraper = IndeedScraper(browser=self.browser, performance_profile=self.performance_profile)
+            with self.queued_lock:
+                self.scrapers.append(self.thread_state.scraper)
+        return self.thread_state.scraper
+
+    def _task_queue(self):
+        # Used to copy descriptions to reposts, on the search thread's own connection
+        if not hasattr(self.thread_state, 'task_queue'):
+            self.thread_state.task_queue = DescriptionQueue(self._scraper().database)
+        return self.thread_state.task_queue
+
+    def _queue_descriptions(self, postings):
+        """Hands postings to the description workers, skipping any another search already queued."""
+        with self.queued_lock:
+            postings = [(job_unique_id, job_link) for job_unique_id, job_link in postings
+                        if job_unique_id is not None and job_link is not None and job_unique_id not in self.queued_ids]
+            self.queued_ids.update(job_unique_id for job_unique_id, _ in postings)
+        for job_unique_id, job_link in postings:
+            self.description_pool.submit(job_unique_id, job_link)
+
+    def _run_search(self, search):
+        search = dict(search)
+        print(f'Searching for {search["keywords"]} jobs in {search["location"]}.')
+        self._scraper().search_for_jobs(
+            on_new_postings=lambda cards: self._queue_descriptions(list(skip_reposts(
+                ((card['job_unique_id'], card['job_link']) for card in cards), self._task_queue()))),
+            **search
+        )
+
+    def run(self, searches):
+        started = time.perf_counter()
+        self.description_pool.start()
+
+        # Postings left pending by earlier runs can be fetched while the first searches load. They are claimed
+        # like main.py does, so another process doesn't fetch them too.
+        db = DatabaseTools()
+        task_queue = DescriptionQueue(db, owner=self.task_owner, index_duplicates=False)
+        task_queue.enqueue_pending()
+        self._queue_descriptions(task_queue.iter_claims(self.description_batch_size))
+
+        with ThreadPoolExecutor(max_workers=self.search_browsers, thread_name_prefix='search') as executor:
+            futures = {executor.submit(self._run_search, search): search for search in searches}
+            for future in as_completed(futures):
+                search = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f'Search for {search["keywords"]} in {search["location"]} failed: {e}')
+                    print(f'Search for {search["keywords"]} in {search["location"]} failed: {e}')
+        for scraper in self.scrapers:
+            try:
+                scraper.close_browser()
+            except Exception as e:
+                logging.warning(f'Could not close a search browser: {e}')
+
+        stats = self.description_pool.close()
+        # Anything still leased wasn't fetched, hand it back for the next run
+        task_queue.release()
+        db.close()
+        print(f'Ran {len(searches)} searches and fetched {stats["fetched"]} descriptions '
+              f'in {time.perf_counter() - started:.1f}s.')
+        return stats
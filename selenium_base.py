@@ -8,10 +8,17 @@ from selenium.webdriver.firefox.options import Options as FirefoxOptions
 from webdriver_manager.microsoft import EdgeChromiumDriverManager
 from webdriver_manager.chrome import ChromeDriverManager
 from webdriver_manager.firefox import GeckoDriverManager
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+import json
+import os
+import threading
 import time
 
 # Database tools
 from database_tools import DatabaseTools
+from metrics import LatencyHistogram
+from rate_control import shared_rate_controller
 
 
 class Browsers:
@@ -20,29 +27,97 @@ class Browsers:
     FIREFOX = 'firefox'
 
 
+# Resolved driver executables, so webdriver_manager is only asked once per browser.
+DRIVER_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.driver_cache.json')
+driver_cache_lock = threading.Lock()
+
+# Resources the performance profile stops the browser from downloading. Only text and scripts are needed to scrape.
+BLOCKED_URL_PATTERNS = ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+                        '*.css', '*.woff', '*.woff2', '*.ttf', '*.otf']
+
+
+def cached_driver_path(browser, install):
+    """Returns the cached driver path for browser, calling install() (a webdriver_manager install) only on a miss."""
+    with driver_cache_lock:
+        cache = {}
+        if os.path.exists(DRIVER_CACHE_PATH):
+            with open(DRIVER_CACHE_PATH, 'r') as f:
+                cache = json.load(f)
+        path = cache.get(browser)
+        if path and os.path.exists(path):
+            return path
+        path = install()
+        cache[browser] = path
+        with open(DRIVER_CACHE_PATH, 'w') as f:
+            json.dump(cache, f, indent=4)
+        return path
+
+
 class SeleniumScraper:
+
+    # Seconds to wait for each kind of condition before giving up. Override any of them with wait_timeouts.
+    DEFAULT_WAIT_TIMEOUTS = {
+        'page_load': 10,  # results or job page content showing up
+        'popup': 2,  # a closed popup disappearing
+        'verification': 15,  # the human verification page clearing
+        'element': 5,  # anything else
+    }
     
-    def __init__(self, browser:str=Browsers.CHROME, use_database:bool = False):
-        self.database = DatabaseTools().setup() if use_database else None
+    def __init__(self, browser:str=Browsers.CHROME, use_database:bool = False, wait_timeouts:dict = None,
+                 performance_profile:bool = False, rate_controller = None, recycle_after_pages:int = 200):
+        self.database = DatabaseTools() if use_database else None
         self.browser = browser
+        # Headless, no images/fonts/css, eager page loads. Note human verification clicks need a visible window.
+        self.performance_profile = performance_profile
         self.options = None
         self.service = None
+        self.driver = None
+        # One browser is kept open across searches and description fetches, and replaced after this many
+        # page loads, since its memory keeps growing. 0 or None never replaces it.
+        self.recycle_after_pages = recycle_after_pages
+        self.pages_since_open = 0
         self.current_url = None
         self.previous_url = None 
+        self.wait_timeouts = {**self.DEFAULT_WAIT_TIMEOUTS, **(wait_timeouts or {})}
+        self.latency = LatencyHistogram()
+        # Page loads wait for a slot from the RateController, shared with every other scraper in the process
+        self.rate_controller = rate_controller or shared_rate_controller()
     
     """BROWSER SETUP"""
     def __setup_chrome(self):
-        self.service = ChromeService(executable_path=ChromeDriverManager().install())
+        self.service = ChromeService(executable_path=cached_driver_path(self.browser, lambda: ChromeDriverManager().install()))
         self.options = ChromeOptions()
 
     def __setup_edge(self):
-        self.service = EdgeService(executable_path=EdgeChromiumDriverManager().install())
+        self.service = EdgeService(executable_path=cached_driver_path(self.browser, lambda: EdgeChromiumDriverManager().install()))
         self.options = EdgeOptions()
 
     def __setup_firefox(self):
-        self.service = FirefoxService(executable_path=GeckoDriverManager().install())
+        self.service = FirefoxService(executable_path=cached_driver_path(self.browser, lambda: GeckoDriverManager().install()))
         self.options = FirefoxOptions()
 
+    def __performance_profile_chromium(self):
+        self.options.add_argument('--headless=new')
+        self.options.add_argument('--disable-gpu')
+        self.options.add_argument('--window-size=1280,800')
+        self.options.add_argument('--blink-settings=imagesEnabled=false')
+        self.options.add_argument('--disable-remote-fonts')
+        self.options.add_argument('--disable-extensions')
+        self.options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+            'profile.managed_default_content_settings.stylesheets': 2,
+        })
+
+    def __performance_profile_firefox(self):
+        self.options.add_argument('-headless')
+        self.options.add_argument('--width=1280')
+        self.options.add_argument('--height=800')
+        self.options.set_preference('permissions.default.image', 2)
+        self.options.set_preference('permissions.default.stylesheet', 2)
+        self.options.set_preference('browser.display.use_document_fonts', 0)
+        self.options.set_preference('gfx.downloadable_fonts.enabled', False)
+        self.options.set_preference('layers.acceleration.disabled', True)
+
     def _setup_browser(self):
         print(f'Setting up {self.browser} browser...')
         browser_methods = {
@@ -61,6 +136,14 @@ class SeleniumScraper:
             self.options.add_experimental_option("excludeSwitches", ["enable-logging"])
         except:
             pass
+
+        if self.performance_profile:
+            # Return from driver.get once the DOM is ready instead of waiting for every resource
+            self.options.page_load_strategy = 'eager'
+            if self.browser == Browsers.FIREFOX:
+                self.__performance_profile_firefox()
+            else:
+                self.__performance_profile_chromium()
     
     def __open_chrome(self):
         self.driver = webdriver.Chrome(service=self.service, options=self.options)
@@ -73,28 +156,89 @@ class SeleniumScraper:
     
     """BROWSER ACTIONS"""
     def open_browser(self, wait_seconds=0):
-        self._setup_browser()
-        print(f'Opening {self.browser} browser...')
-        browser_methods = {
-            'chrome': self.__open_chrome,
-            'edge': self.__open_edge,
-            'firefox': self.__open_firefox
-        }
-        open_method = browser_methods.get(self.browser)
-        if open_method:
-            open_method()
-        else:
-            raise ValueError(f"Unsupported browser: {self.browser}")
+        if self.driver is not None:
+            self.close_browser()
+        with self.latency.time('open_browser'):
+            self._setup_browser()
+            print(f'Opening {self.browser} browser...')
+            browser_methods = {
+                'chrome': self.__open_chrome,
+                'edge': self.__open_edge,
+                'firefox': self.__open_firefox
+            }
+            open_method = browser_methods.get(self.browser)
+            if open_method:
+                open_method()
+            else:
+                raise ValueError(f"Unsupported browser: {self.browser}")
+            if self.performance_profile and self.browser != Browsers.FIREFOX:
+                # Chromium can drop requests at the network layer, which also catches fonts and css the prefs miss
+                self.driver.execute_cdp_cmd('Network.enable', {})
+                self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+        self.pages_since_open = 0
         if wait_seconds > 0:
             time.sleep(wait_seconds)
     
+    def ensure_browser(self):
+        """Opens the browser if it isn't open yet, otherwise keeps using the warm one (cookies and cache intact)."""
+        if self.driver is None:
+            self.open_browser()
+
+    def recycle_browser(self):
+        """Replaces the browser with a fresh one, giving back the memory the old one built up."""
+        print(f'Recycling the {self.browser} browser after {self.pages_since_open} pages...')
+        self.open_browser()
+
     def go_to_url(self, url):
+        self.ensure_browser()
+        if self.recycle_after_pages and self.pages_since_open >= self.recycle_after_pages:
+            self.recycle_browser()
         self.previous_url = self.current_url
-        self.driver.get(url)
+        with self.latency.time('rate_wait'):
+            self.rate_controller.acquire(url)
+        try:
+            with self.latency.time('go_to_url'):
+                self.driver.get(url)
+            # One outcome per page, a verification page is pushback rather than a success
+            outcome = 'challenge' if self.is_verification_page() else 'ok'
+        except Exception:
+            self.rate_controller.release(url, 'error')
+            raise
+        self.rate_controller.release(url, outcome)
+        self.pages_since_open += 1
         self.current_url = url
+
+    def is_verification_page(self):
+        """Whether the loaded page is a bot check. Site scrapers override this, see IndeedScraper."""
+        return False
+
+    def wait_for(self, condition, stage:str, timeout_name:str = 'element'):
+        """Waits until condition(driver) is truthy and returns its value, or None if it times out.
+
+        The time spent waiting is recorded under stage in self.latency.
+        """
+        timeout = self.wait_timeouts[timeout_name]
+        with self.latency.time(stage):
+            try:
+                return WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(condition)
+            except TimeoutException:
+                print(f'Timed out after {timeout}s waiting for {stage}')
+                return None
     
     def close_browser(self):
-        self.driver.close()
+        # quit, not close: close only closes the window and leaves the driver process running
+        if self.driver is None:
+            return
+        try:
+            self.driver.quit()
+        finally:
+            self.driver = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close_browser()
     
     def scroll_to_bottom(self):
         self.driver.execute_script("window.scrollTo(0,1000000)")
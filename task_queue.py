@@ -0,0 +1,215 @@
+# Packages
+import logging
+import os
+import socket
+import time
+import uuid
+
+# Custom code
+from database_tools import DatabaseTools, description_status
+from near_duplicates import DuplicateIndex
+
+
+class DescriptionQueue:
+    """SQLite-backed work queue of postings that need a description (the description_tasks table).
+
+    Workers claim tasks in batches. A claimed task is leased to its owner until lease_seconds pass, after
+    which any process may claim it again, so a crashed run's work is picked up where it stopped. The owner
+    renews its leases while it works through them (see renew), and results for a task another owner has
+    since claimed are dropped rather than overwriting its work. Failed tasks are retried with exponential
+    backoff until max_attempts, then left as 'failed'.
+
+    The queue is shared by processes on one host. It relies on SQLite's WAL locking, which doesn't work
+    on network filesystems.
+    """
+
+    def __init__(self,
+                 db: DatabaseTools = None,
+                 owner: str = None,  # identifies this process in lease_owner, defaults to host:pid:random
+                 lease_seconds: int = 600,
+                 max_attempts: int = 5,
+                 backoff_seconds: int = 60,
+                 index_duplicates: bool = True):  # add finished descriptions to the near-duplicate index
+        self.db = db or DatabaseTools()
+        self.owner = owner or self.new_owner()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.renewed_at = time.time()
+        self.duplicate_index = DuplicateIndex(self.db) if index_duplicates else None
+
+    @staticmethod
+    def new_owner():
+        """A lease owner unique to this process: host:pid:random."""
+        return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    def enqueue_pending(self):
+        """Queues every pending posting that isn't queued yet, and re-opens done tasks whose description is pending again."""
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                INSERT OR IGNORE INTO description_tasks (job_unique_id, job_link)
+                SELECT job_unique_id, job_link FROM job_postings
+                WHERE description_status = 'pending' AND job_link IS NOT NULL AND job_unique_id IS NOT NULL
+            ''')
+            cursor.execute('''
+                UPDATE description_tasks SET state = 'pending', attempts = 0, next_attempt_at = 0
+                WHERE state = 'done' AND job_unique_id IN (
+                    SELECT job_unique_id FROM job_postings WHERE description_status = 'pending'
+                )
+            ''')
+
+    def claim(self, n: int = 25):
+        """Atomically leases up to n tasks that are due, returning them as (job_unique_id, job_link) pairs."""
+        now = time.time()
+        with self.db.transaction(immediate=True, stage='db_claim') as cursor:
+            # Leases that ran out on their last allowed attempt are given up on
+            cursor.execute('''
+                UPDATE description_tasks SET state = 'failed', last_error = 'lease expired', updated_at = CURRENT_TIMESTAMP
+                WHERE state = 'leased' AND lease_expires_at < ? AND attempts >= ?
+            ''', (now, self.max_attempts))
+            cursor.execute('''
+                SELECT job_unique_id, job_link FROM description_tasks
+                WHERE (state = 'pending' AND next_attempt_at <= ?) OR (state = 'leased' AND lease_expires_at < ?)
+                ORDER BY next_attempt_at
+                LIMIT ?
+            ''', (now, now, n))
+            tasks = cursor.fetchall()
+            cursor.executemany('''
+                UPDATE description_tasks
+                SET state = 'leased', lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE job_unique_id = ?
+            ''', [(self.owner, now + self.lease_seconds, job_unique_id) for job_unique_id, _ in tasks])
+        return tasks
+
+    def iter_claims(self, batch_size: int = 25):
+        """Yields claimed tasks one at a time, claiming the next batch only when the last one is used up."""
+        while True:
+            tasks = self.claim(batch_size)
+            self.renewed_at = time.time()
+            if not tasks:
+                break
+            for task in tasks:
+                self.renew_if_due()
+                yield task
+
+    def renew(self):
+        """Pushes back the expiry of every lease this owner holds, including ones that ran out but weren't reclaimed."""
+        now = time.time()
+        with self.db.transaction(stage='db_renew') as cursor:
+            cursor.execute('''
+                UPDATE description_tasks SET lease_expires_at = ?
+                WHERE state = 'leased' AND lease_owner = ?
+            ''', (now + self.lease_seconds, self.owner))
+        self.renewed_at = now
+
+    def renew_if_due(self):
+        # A third of the lease, so a slow batch or browser fallback doesn't run past it
+        if time.time() - self.renewed_at > self.lease_seconds / 3:
+            self.renew()
+
+    def _owned(self, cursor, job_unique_ids, include_done: bool = False):
+        """The job_unique_ids whose task this owner may close: leased to it, or not leased to anyone.
+
+        Tasks handed out without a claim (the search scheduler) are pending, a done task was finished by someone else
+        and only counts with include_done.
+        """
+        states = ('pending', 'failed', 'done') if include_done else ('pending', 'failed')
+        owned = set()
+        for i in range(0, len(job_unique_ids), 500):
+            chunk = job_unique_ids[i:i + 500]
+            placeholders = ', '.join(['?' for _ in chunk])
+            cursor.execute(f'''
+                SELECT job_unique_id FROM description_tasks
+                WHERE job_unique_id IN ({placeholders})
+                AND (state IN ({', '.join(['?' for _ in states])}) OR (state = 'leased' AND lease_owner = ?))
+            ''', chunk + list(states) + [self.owner])
+            owned.update(job_unique_id for (job_unique_id,) in cursor.fetchall())
+        return owned
+
+    def finish(self, results, rewrite_done: bool = False):
+        """Saves a batch of (job_unique_id, description) results and closes their tasks.
+
+        A usable description marks the task done. A missing description (None) or a verification / JavaScript
+        page is a failed attempt, retried after a backoff. With rewrite_done (reconverting cached pages) the
+        postings whose task is already done are rewritten too, and unusable results are skipped instead.
+        """
+        if rewrite_done:
+            results = [(job_unique_id, description) for job_unique_id, description in results
+                       if description_status(description) == 'done']
+        if not results:
+            return
+        # The ownership check, the descriptions and the done tasks are one transaction, so a task can't change hands in between
+        with self.db.transaction(immediate=True, stage='db_update_descriptions') as cursor:
+            owned = self._owned(cursor, [job_unique_id for job_unique_id, _ in results], include_done=rewrite_done)
+            if len(owned) < len(results):
+                logging.warning(f'Dropped {len(results) - len(owned)} description results whose task is leased to '
+                                f'another worker or already done.')
+            results = [(job_unique_id, description) for job_unique_id, description in results if job_unique_id in owned]
+            self.db.write_job_posting_descriptions(
+                cursor, [(job_unique_id, description) for job_unique_id, description in results if description is not None])
+            done = [job_unique_id for job_unique_id, description in results if description_status(description) == 'done']
+            self._complete(cursor, done)
+        failed = [job_unique_id for job_unique_id, description in results if description_status(description) != 'done']
+        if self.duplicate_index is not None:
+            self.duplicate_index.add(results)
+        for job_unique_id in failed:
+            self.fail(job_unique_id, 'no usable description')
+        self.renew_if_due()
+
+    def complete(self, job_unique_ids):
+        with self.db.transaction(stage='db_complete') as cursor:
+            self._complete(cursor, job_unique_ids)
+
+    def _complete(self, cursor, job_unique_ids):
+        cursor.executemany('''
+            UPDATE description_tasks
+            SET state = 'done', lease_owner = NULL, lease_expires_at = NULL, last_error = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE job_unique_id = ? AND (state != 'leased' OR lease_owner = ?)
+        ''', [(job_unique_id, self.owner) for job_unique_id in job_unique_ids])
+
+    def fail(self, job_unique_id, error: str):
+        """Records a failed attempt. The task is retried after backoff_seconds * 2^(attempts - 1), or marked failed."""
+        with self.db.transaction() as cursor:
+            cursor.execute('SELECT attempts, state, lease_owner FROM description_tasks WHERE job_unique_id = ?',
+                           (job_unique_id,))
+            row = cursor.fetchone()
+            # Another worker has claimed the task since, its attempt is the one that counts
+            if row is None or (row[1] == 'leased' and row[2] != self.owner):
+                return
+            # Claims count as attempts, tasks handed out without a claim (the scheduler) count here
+            attempts = row[0] if row[1] == 'leased' else row[0] + 1
+            if attempts >= self.max_attempts:
+                state, next_attempt_at = 'failed', 0
+                logging.warning(f'Giving up on {job_unique_id} after {attempts} attempts: {error}')
+            else:
+                state, next_attempt_at = 'pending', time.time() + self.backoff_seconds * 2 ** (attempts - 1)
+            cursor.execute('''
+                UPDATE description_tasks
+                SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ?,
+                    lease_owner = NULL, lease_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE job_unique_id = ?
+            ''', (state, attempts, next_attempt_at, error, job_unique_id))
+
+    def release(self, job_unique_ids=None):
+        """Hands back the tasks this owner still has leased (only job_unique_ids, if given) without counting an
+        attempt, e.g. on a clean shutdown."""
+        sql = '''
+            UPDATE description_tasks
+            SET state = 'pending', attempts = MAX(attempts - 1, 0), lease_owner = NULL, lease_expires_at = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE state = 'leased' AND lease_owner = ?
+        '''
+        with self.db.transaction() as cursor:
+            if job_unique_ids is None:
+                cursor.execute(sql, (self.owner,))
+                released = cursor.rowcount
+            else:
+                cursor.executemany(f'{sql} AND job_unique_id = ?',
+                                   [(self.owner, job_unique_id) for job_unique_id in job_unique_ids])
+                released = cursor.rowcount
+        if released:
+            logging.info(f'Released {released} unfinished description tasks.')
+
+    def counts(self):
+        """Returns the number of tasks in each state."""
+        return dict(self.db.run_sql('SELECT state, COUNT(*) FROM description_tasks GROUP BY state'))
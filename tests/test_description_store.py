@@ -0,0 +1,41 @@
+import pytest
+
+from database_tools import DatabaseTools
+from description_store import content_hash
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseTools(db_name=str(tmp_path / 'test.db'))
+    yield db
+    db.close()
+
+
+def put(db, texts):
+    with db.transaction() as cursor:
+        return db.descriptions.put_many(cursor, texts)
+
+
+def test_round_trip(db):
+    texts = ['Build dashboards in Power BI.', 'Café • Zürich — 50 000 CHF', '', None, 'Build dashboards in Power BI.']
+    hashes = put(db, texts)
+    assert hashes == [None if text is None else content_hash(text) for text in texts]
+    # Stored once per distinct text
+    assert db.run_sql('SELECT COUNT(*) FROM job_descriptions') == [(3,)]
+    assert db.descriptions.get_many(hashes) == {h: text for h, text in zip(hashes, texts) if h is not None}
+    assert db.descriptions.get(content_hash('not stored')) is None
+
+
+def test_round_trip_with_dictionary(db):
+    texts = [f'Posting {i}: we are hiring a Data Analyst to build dashboards in Power BI and write SQL. Salary {i}k.'
+             for i in range(200)]
+    hashes = put(db, texts)
+    dictionary_id = db.descriptions.train_dictionary(dict_size=4096)
+    assert dictionary_id is not None
+    assert db.run_sql('SELECT DISTINCT dictionary_id FROM job_descriptions') == [(dictionary_id,)]
+    # New text is compressed with the dictionary too, and the SQL function reads both
+    hashes += put(db, ['Posting 200: we are hiring a Data Engineer.'])
+    texts.append('Posting 200: we are hiring a Data Engineer.')
+    assert db.descriptions.get_many(hashes) == dict(zip(hashes, texts))
+    assert db.run_sql(f"SELECT description_text(compressed, dictionary_id) FROM job_descriptions "
+                      f"WHERE content_hash = '{hashes[-1]}'") == [(texts[-1],)]
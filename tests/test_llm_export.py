@@ -0,0 +1,48 @@
+import pytest
+
+from database_tools import DatabaseTools
+from llm_export import LlmExporter, load_shards
+from task_queue import DescriptionQueue
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseTools(db_name=str(tmp_path / 'test.db'))
+    yield db
+    db.close()
+
+
+def add_postings(db, *job_unique_ids):
+    db.insert_job_postings([{'job_unique_id': job_unique_id, 'job_title': 'Data Analyst', 'job_link': f'https://example.com/{job_unique_id}',
+                             'session_id': None, 'employer': 'Northwind Traders', 'job_location': 'Remote'}
+                            for job_unique_id in job_unique_ids])
+
+
+def finish(db, *results):
+    DescriptionQueue(db, index_duplicates=False).finish(results)
+
+
+def export(db, tmp_path):
+    LlmExporter(db, str(tmp_path / 'llm'), processes=1).export()
+    return [(record['job_unique_id'], record['text']) for record in load_shards(str(tmp_path / 'llm'))]
+
+
+def test_pending_posting_does_not_hold_back_later_ones(db, tmp_path):
+    add_postings(db, 'j1', 'j2')
+    finish(db, ('j2', 'Build dashboards in Power BI.'))
+    assert export(db, tmp_path) == [('j2', 'Build dashboards in Power BI.')]
+    # j1 goes out once its task is done
+    finish(db, ('j1', 'Write SQL reports.'))
+    assert export(db, tmp_path) == [('j2', 'Build dashboards in Power BI.'), ('j1', 'Write SQL reports.')]
+    assert export(db, tmp_path) == [('j2', 'Build dashboards in Power BI.'), ('j1', 'Write SQL reports.')]
+
+
+def test_changed_description_is_exported_again(db, tmp_path):
+    add_postings(db, 'j1')
+    finish(db, ('j1', 'Build dashboards in Power BI and present them to the team weekly.'))
+    export(db, tmp_path)
+    db.update_job_posting_descriptions([('j1', 'Build reports in Tableau and present them to the team weekly.')])
+    assert export(db, tmp_path) == [('j1', 'Build dashboards in Power BI and present them to the team weekly.'),
+                                    ('j1', 'Build reports in Tableau and present them to the team weekly.')]
+    # The old description's lines are no longer counted
+    assert db.run_sql('SELECT COUNT(*), SUM(documents) FROM description_lines WHERE documents > 0') == [(1, 1)]
@@ -0,0 +1,42 @@
+import os
+import re
+import sqlite3
+
+from database_tools import DatabaseTools
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_schema.sql')
+
+
+def schema(db):
+    """Columns of every table, and the normalized SQL of every index, view and trigger."""
+    objects = {}
+    for object_type, name, sql in db.run_sql('SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL'):
+        if object_type == 'table':
+            objects[(object_type, name)] = db.run_sql(f"PRAGMA table_info('{name}')")
+        else:
+            objects[(object_type, name)] = ' '.join(re.sub(r'\bIF NOT EXISTS ', '', sql).split())
+    return objects
+
+
+def test_baseline_migrates_to_ddl(tmp_path):
+    """A database created with the original ddl ends up with the same schema as a new one."""
+    with open(BASELINE_PATH, 'r') as f:
+        baseline = f.read()
+    conn = sqlite3.connect(tmp_path / 'baseline.db')
+    conn.executescript(baseline)
+    conn.execute("INSERT INTO job_postings (job_unique_id, job_title, job_link, job_description) "
+                 "VALUES ('j1', 'Data Analyst', 'https://example.com/j1', 'Build dashboards in Power BI.')")
+    conn.commit()
+    conn.close()
+
+    migrated = DatabaseTools(db_name=str(tmp_path / 'baseline.db'))
+    new = DatabaseTools(db_name=str(tmp_path / 'new.db'))
+    try:
+        latest = max(version for version, _ in new.migrations())
+        assert migrated.run_sql('PRAGMA user_version') == new.run_sql('PRAGMA user_version') == [(latest,)]
+        assert schema(migrated) == schema(new)
+        assert migrated.get_descriptions(['j1']) == {'j1': 'Build dashboards in Power BI.'}
+        assert list(migrated.search('dashboards')['job_unique_id']) == ['j1']
+    finally:
+        migrated.close()
+        new.close()
@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from database_tools import DatabaseTools
+from parquet_export import ParquetExporter, load_export
+from task_queue import DescriptionQueue
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseTools(db_name=str(tmp_path / 'test.db'))
+    yield db
+    db.close()
+
+
+def add_postings(db, *job_unique_ids):
+    db.insert_job_postings([{'job_unique_id': job_unique_id, 'job_title': 'Data Analyst', 'job_link': f'https://example.com/{job_unique_id}',
+                             'session_id': None, 'employer': 'Northwind Traders', 'job_location': 'Remote'}
+                            for job_unique_id in job_unique_ids])
+
+
+def test_export_in_batches(db, tmp_path):
+    """Each batch is flagged on its own, held back rows don't stop the ones after them, and updates go out again."""
+    add_postings(db, 'j1', 'j2', 'j3')
+    DescriptionQueue(db, index_duplicates=False).finish([('j1', 'Build dashboards.'), ('j3', 'Write SQL.')])
+    exporter = ParquetExporter(db, export_path=str(tmp_path / 'exports'), batch_size=1)
+    assert exporter.export_table('job_postings') == 2
+    assert db.run_sql('SELECT job_unique_id FROM job_postings WHERE exported = 0') == [('j2',)]
+    assert db.run_sql("SELECT rows_exported FROM export_watermarks WHERE table_name = 'job_postings'") == [(2,)]
+
+    db.update_job_posting_descriptions([('j1', 'Build reports.')])
+    assert exporter.export_table('job_postings') == 1
+    df = load_export('job_postings', columns=['job_unique_id', 'job_description'], export_path=str(tmp_path / 'exports'))
+    assert df.values.tolist() == [['j1', 'Build reports.'], ['j3', 'Write SQL.']]
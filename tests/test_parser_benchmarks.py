@@ -0,0 +1,31 @@
+# Timings of the offline parsers over the fixtures, with the same checks as test_parsers so a faster but broken
+# parser fails. Needs pytest-benchmark: python -m pytest tests/test_parser_benchmarks.py --benchmark-only
+import pytest
+
+import indeed_parsers
+from test_parsers import BACKENDS, load
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_bench_job_cards(benchmark, backend):
+    cards = benchmark(indeed_parsers.parse_job_cards, load('search_results.html'), parser=backend)
+    assert len(cards) == 15 and all(card['job_title'] and card['employer'] for card in cards)
+
+
+def test_bench_mosaic_job_cards(benchmark):
+    cards = benchmark(indeed_parsers.parse_mosaic_job_cards, load('search_results.html'))
+    assert len(cards) == 15 and cards[0]['salary_min'] == 65000.0
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_bench_job_detail(benchmark, backend):
+    detail = benchmark(indeed_parsers.parse_job_detail, load('job_detail.html'), parser=backend)
+    assert detail['job_title'] == 'Data Analyst' and detail['job_posting']['salary_max'] == 80000
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_bench_extract_job_component(benchmark, backend):
+    component = benchmark(indeed_parsers.extract_job_component, load('job_detail.html'), parser=backend)
+    assert 'id="jobDescriptionText"' in component
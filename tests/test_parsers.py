@@ -0,0 +1,150 @@
+import importlib.util
+import os
+
+import pytest
+
+import indeed_parsers
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+BACKENDS = [backend for backend, module in [('html.parser', None), ('lxml', 'lxml')]
+            if module is None or importlib.util.find_spec(module) is not None]
+
+
+def load(name):
+    with open(os.path.join(FIXTURES_PATH, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.fixture(scope='module')
+def search_page():
+    return load('search_results.html')
+
+
+"""Search results"""
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_dom_job_cards(search_page, backend):
+    cards = indeed_parsers.parse_job_cards(search_page, parser=backend)
+    assert len(cards) == 15
+    assert len({card['job_unique_id'] for card in cards}) == 15
+    assert cards[0] == {
+        'job_unique_id': 'job_a4c123b1612dd272',
+        'job_title': 'Data Analyst',
+        'job_link': 'https://www.indeed.com/rc/clk?jk=a4c123b1612dd272&from=vj&pos=0',
+        'employer': 'Northwind Traders',
+        'job_location': 'Remote',
+        'salary_text': '$65,000 - $80,000 a year',
+        'employment_type': 'Full-time',
+        'source': 'dom',
+    }
+    assert cards[2]['job_location'] == 'Hybrid remote in Chicago, IL'
+    assert cards[2]['salary_text'] is None
+    for card in cards:
+        assert card['job_title'] and card['employer'] and card['job_location']
+        assert card['job_link'].startswith('https://www.indeed.com/')
+
+
+def test_mosaic_job_cards(search_page):
+    cards = indeed_parsers.parse_mosaic_job_cards(search_page)
+    assert len(cards) == 15
+    assert cards[0] == {
+        'job_unique_id': 'job_a4c123b1612dd272',
+        'job_title': 'Data Analyst',
+        'job_link': 'https://www.indeed.com/rc/clk?jk=a4c123b1612dd272&from=vj&pos=0',
+        'employer': 'Northwind Traders',
+        'job_location': 'Remote',
+        'salary_text': '$65,000 - $80,000 a year',
+        'salary_min': 65000.0,
+        'salary_max': 80000.0,
+        'salary_period': 'year',
+        'employment_type': 'Full-time',
+        'snippet': 'Work with the Northwind Traders team on reporting and analysis.',
+        'company_rating': None,
+        'remote': 1,
+        'posted_at': '2024-06-10 06:13:20',
+        'source': 'mosaic',
+    }
+    assert (cards[1]['salary_min'], cards[1]['salary_max'], cards[1]['salary_period']) == (45.0, 55.0, 'hour')
+    assert cards[2]['salary_min'] is None and cards[2]['remote'] == 0
+
+
+def test_mosaic_matches_dom(search_page):
+    """The inline JSON and the rendered cards describe the same postings."""
+    fields = ['job_unique_id', 'job_title', 'job_link', 'employer', 'job_location', 'salary_text', 'employment_type']
+    dom = indeed_parsers.parse_job_cards(search_page)
+    mosaic = indeed_parsers.parse_mosaic_job_cards(search_page)
+    assert [{field: card[field] for field in fields} for card in mosaic] == \
+           [{field: card[field] for field in fields} for card in dom]
+
+
+def test_mosaic_missing():
+    # None rather than [], so the caller falls back to the DOM cards
+    assert indeed_parsers.parse_mosaic_job_cards('<html><body>No results</body></html>') is None
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_filter_items(search_page, backend):
+    filters = {item['name']: item['options'] for item in indeed_parsers.parse_filter_items(search_page, parser=backend)}
+    assert list(filters) == ['Date posted', 'Remote', 'Pay', 'Job type', 'Experience level']
+    assert filters['Remote'] == ['Remote', 'Hybrid work']
+    assert filters['Job type'][0] == 'Full-time'
+
+
+"""Job pages"""
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_job_detail(backend):
+    detail = indeed_parsers.parse_job_detail(load('job_detail.html'), parser=backend)
+    assert detail['requires_browser'] is False
+    assert detail['job_title'] == 'Data Analyst'
+    assert detail['employer'] == 'Northwind Traders'
+    assert detail['location'] == 'Remote'
+    assert 'Northwind Traders is looking for a Data Analyst' in detail['description_html']
+    assert 'Build and maintain dashboards in Power BI' in detail['description_html']
+
+
+def test_job_detail_json_ld():
+    job_posting = indeed_parsers.parse_job_detail(load('job_detail.html'))['job_posting']
+    assert job_posting == {
+        'salary_min': 65000,
+        'salary_max': 80000,
+        'salary_period': 'year',
+        'employment_type': 'Full-time',
+        'remote': 1,
+        'date_posted': '2024-06-10',
+        'valid_through': '2024-07-10',
+        'industry': 'Retail',
+        'employer': 'Northwind Traders',
+        'location': None,
+    }
+
+
+def test_external_job_page():
+    detail = indeed_parsers.parse_job_detail(load('job_detail_external.html'))
+    assert detail['requires_browser'] is False
+    assert detail['job_title'] is None and detail['job_posting'] == {}
+    assert 'Contoso is hiring a Reporting Analyst' in detail['description_html']
+    assert indeed_parsers.extract_job_component(load('job_detail_external.html')) is None
+
+
+@pytest.mark.parametrize('name', ['job_detail_verification.html', 'job_detail_javascript.html'])
+def test_pages_that_need_a_browser(name):
+    html = load(name)
+    assert indeed_parsers.requires_browser(html)
+    detail = indeed_parsers.parse_job_detail(html)
+    assert detail['requires_browser'] is True
+    assert detail['description_html'] is None
+    assert indeed_parsers.extract_job_component(html) is None
+
+
+def test_verification_marker():
+    assert indeed_parsers.VERIFICATION_MARKER in load('job_detail_verification.html')
+    assert indeed_parsers.VERIFICATION_MARKER not in load('job_detail_javascript.html')
+
+
+def test_extract_job_component():
+    component = indeed_parsers.extract_job_component(load('job_detail.html'))
+    assert component.lstrip().startswith('<div class="jobsearch-InfoHeaderContainer">')
+    assert 'id="jobDescriptionText"' in component
@@ -0,0 +1,23 @@
+from rate_control import RateController
+
+
+class DecisionLog:
+    def __init__(self):
+        self.decisions = []
+
+    def save_rate_decision(self, *decision):
+        self.decisions.append(decision)
+
+    def close(self):
+        pass
+
+
+def test_close_saves_queued_decisions():
+    log = DecisionLog()
+    controller = RateController(initial_concurrency=2, max_delay=0.0, database_factory=lambda: log)
+    for _ in range(3):
+        controller.acquire('https://www.indeed.com/viewjob?jk=1')
+        controller.release('https://www.indeed.com/viewjob?jk=1', 'challenge')
+    controller.close()
+    assert [decision[1] for decision in log.decisions] == ['decrease', 'decrease', 'pause']
+    assert controller.writer is None
@@ -0,0 +1,41 @@
+import pytest
+
+from job_details_extractor import parse_salary
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('$50-60k a year', (50000.0, 60000.0, 'year')),
+    ('$50K-$60K per year', (50000.0, 60000.0, 'year')),
+    ('$45,000-60k a year', (45000.0, 60000.0, 'year')),
+])
+def test_thousands(text, expected):
+    assert parse_salary(text)[1:] == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('$65,000 - $80,000 a year', ('$65,000 - $80,000 a year', 65000.0, 80000.0, 'year')),
+    ('$65,000 – $80,000 a year', ('$65,000 – $80,000 a year', 65000.0, 80000.0, 'year')),
+    ('$25.50 to $30 an hour', ('$25.50 to $30 an hour', 25.5, 30.0, 'hour')),
+    ('$4,000 per month', ('$4,000 per month', 4000.0, 4000.0, 'month')),
+    ('Pay: $52,000 annually', ('$52,000 annually', 52000.0, 52000.0, 'year')),
+    ('Starting at $18/hr', ('Starting at $18/hr', 18.0, None, 'hour')),
+])
+def test_ranges_and_periods(text, expected):
+    assert parse_salary(text) == expected
+
+
+def test_from_is_only_a_minimum():
+    assert parse_salary('From $20 an hour')[1:] == (20.0, None, 'hour')
+
+
+def test_up_to_is_only_a_maximum():
+    assert parse_salary('Up to $70,000 a year')[1:] == (None, 70000.0, 'year')
+
+
+def test_first_range_wins():
+    assert parse_salary('$30 an hour, or $60,000 a year salaried')[1:] == (30.0, 30.0, 'hour')
+
+
+@pytest.mark.parametrize('text', [None, '', 'Competitive pay', '$500 signing bonus', '401(k) with 4% match'])
+def test_no_salary(text):
+    assert parse_salary(text) == (None, None, None, None)
@@ -0,0 +1,54 @@
+import pytest
+
+from database_tools import DatabaseTools
+from job_details_extractor import extract_new_details
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseTools(db_name=str(tmp_path / 'test.db'))
+    yield db
+    db.close()
+
+
+def add_postings(db, *postings):
+    db.insert_job_postings([{'job_unique_id': job_unique_id, 'job_title': job_title, 'job_link': f'https://example.com/{job_unique_id}',
+                             'session_id': None, 'employer': 'Northwind Traders', 'job_location': 'Remote'}
+                            for job_unique_id, job_title in postings])
+
+
+def test_details_upsert_of_a_queued_posting(db):
+    """Re-extracting details upserts job_details rows whose posting is already waiting in job_search_queue."""
+    add_postings(db, ('j1', 'Data Analyst'))
+    db.update_job_posting_descriptions([('j1', 'Build dashboards in Power BI. Requires SQL and Python.')])
+    assert extract_new_details(db) == 1
+    db.update_job_posting_descriptions([('j1', 'Build reports in Tableau. Requires SQL and Python.')])
+    assert extract_new_details(db, force=True) == 1
+    assert list(db.search('tableau')['job_unique_id']) == ['j1']
+    assert db.search('power').empty
+
+
+def test_insert_update_delete(db):
+    add_postings(db, ('j1', 'Data Analyst'), ('j2', 'Data Engineer'))
+    assert sorted(db.search('data')['job_unique_id']) == ['j1', 'j2']
+    db.update_job_posting_descriptions([('j1', 'Build dashboards in Power BI.')])
+    assert list(db.search('dashboards')['job_unique_id']) == ['j1']
+    db.update_job_posting_descriptions([('j1', 'Build reports in Tableau.')])
+    assert db.search('dashboards').empty
+    assert list(db.search('tableau')['job_unique_id']) == ['j1']
+    with db.transaction() as cursor:
+        cursor.execute("DELETE FROM job_postings WHERE job_unique_id = 'j2'")
+    assert list(db.search('data')['job_unique_id']) == ['j1']
+    assert db.run_sql('SELECT COUNT(*) FROM job_search_queue') == [(0,)]
+
+
+def test_details_upsert(db):
+    add_postings(db, ('j1', 'Data Analyst'))
+    db.upsert_job_details([{'job_unique_id': 'j1', 'key_skills': ['SQL', 'Python']}])
+    assert list(db.search('python')['job_unique_id']) == ['j1']
+    # None keeps the skills, a new value replaces them
+    db.upsert_job_details([{'job_unique_id': 'j1', 'key_skills': None}])
+    assert list(db.search('python')['job_unique_id']) == ['j1']
+    db.upsert_job_details([{'job_unique_id': 'j1', 'key_skills': ['Excel']}])
+    assert db.search('python').empty
+    assert list(db.search('excel')['job_unique_id']) == ['j1']
@@ -0,0 +1,74 @@
+import pytest
+
+from database_tools import DatabaseTools
+from task_queue import DescriptionQueue
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseTools(db_name=str(tmp_path / 'test.db'))
+    yield db
+    db.close()
+
+
+def add_postings(db, *job_unique_ids):
+    db.insert_job_postings([{'job_unique_id': job_unique_id, 'job_title': 'Data Analyst', 'job_link': f'https://example.com/{job_unique_id}',
+                             'session_id': None, 'employer': 'Northwind Traders', 'job_location': 'Remote'}
+                            for job_unique_id in job_unique_ids])
+
+
+def task_states(db):
+    return dict(db.run_sql('SELECT job_unique_id, state FROM description_tasks'))
+
+
+def test_rewrite_done(db):
+    """Reconverted pages rewrite done postings and close open tasks, but leave tasks leased to someone else."""
+    add_postings(db, 'j1', 'j2', 'j3')
+    queue = DescriptionQueue(db, owner='reconvert', index_duplicates=False)
+    queue.finish([('j1', 'Build dashboards in Power BI.')])
+    other = DescriptionQueue(db, owner='scraper', index_duplicates=False)
+    assert other.claim(1) == [('j2', 'https://example.com/j2')]
+    queue.finish([('j1', 'Build reports in Tableau.'), ('j2', 'Write SQL.'), ('j3', 'Clean data in Python.')],
+                 rewrite_done=True)
+    assert db.get_descriptions(['j1', 'j2', 'j3']) == {'j1': 'Build reports in Tableau.', 'j3': 'Clean data in Python.'}
+    assert task_states(db) == {'j1': 'done', 'j2': 'leased', 'j3': 'done'}
+
+
+def test_claim_finish_release(db):
+    add_postings(db, 'j1', 'j2', 'j3')
+    a = DescriptionQueue(db, owner='a', index_duplicates=False)
+    b = DescriptionQueue(db, owner='b', index_duplicates=False)
+    assert [job_unique_id for job_unique_id, _ in a.claim(2)] == ['j1', 'j2']
+    assert [job_unique_id for job_unique_id, _ in b.claim(5)] == ['j3']
+    assert b.claim(5) == []
+    # Only the owner of a lease can finish it
+    b.finish([('j1', 'Build dashboards in Power BI.')])
+    assert db.get_descriptions(['j1']) == {}
+    a.finish([('j1', 'Build dashboards in Power BI.')])
+    assert db.get_descriptions(['j1']) == {'j1': 'Build dashboards in Power BI.'}
+    # A release hands the task back without counting the attempt, and only the owner's leases
+    b.release(['j2'])
+    a.release(['j2'])
+    assert task_states(db) == {'j1': 'done', 'j2': 'pending', 'j3': 'leased'}
+    assert db.run_sql("SELECT attempts FROM description_tasks WHERE job_unique_id = 'j2'") == [(0,)]
+    assert b.claim(5) == [('j2', 'https://example.com/j2')]
+
+
+def test_lease_expiry(db):
+    add_postings(db, 'j1')
+    a = DescriptionQueue(db, owner='a', index_duplicates=False)
+    b = DescriptionQueue(db, owner='b', index_duplicates=False, max_attempts=2)
+    a.claim(1)
+    with db.transaction() as cursor:
+        cursor.execute("UPDATE description_tasks SET lease_expires_at = 0 WHERE job_unique_id = 'j1'")
+    # An expired lease can be claimed by anyone, and the old owner can no longer renew or finish it
+    assert b.claim(1) == [('j1', 'https://example.com/j1')]
+    a.renew()
+    a.finish([('j1', 'Build dashboards in Power BI.')])
+    assert db.run_sql('SELECT state, lease_owner, attempts FROM description_tasks') == [('leased', 'b', 2)]
+    assert db.get_descriptions(['j1']) == {}
+    # A lease that runs out on the last allowed attempt is given up on
+    with db.transaction() as cursor:
+        cursor.execute("UPDATE description_tasks SET lease_expires_at = 0 WHERE job_unique_id = 'j1'")
+    assert b.claim(1) == []
+    assert task_states(db) == {'j1': 'failed'}